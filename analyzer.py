@@ -0,0 +1,667 @@
+"""Analyzer for Mal forms.
+
+The analyzer walks a form produced by the reader once and turns it into a tree
+of Python closures. Each closure takes an environment and returns the value of
+the form it was created from, so evaluating an analyzed form does not have to
+dispatch on special forms, expand macros or rebuild argument lists again.
+
+Function bodies are analyzed in tail position. A call to a Mal function in
+tail position does not call the function but returns a TailCall object, which
+is run by the loop in apply(), so tail calls do not grow the Python stack.
+
+Symbols bound by 'fn*', 'let*' and 'catch*' are resolved during analysis.
+Their values are kept in frames, Python lists holding the enclosing
+environment, the global environment and one slot per local, and a local
+variable is read by going up a fixed number of frames and indexing a fixed
+slot. Only top-level forms are evaluated in a MalEnv, which also holds all
+global definitions.
+
+"""
+import mal_types as mal
+import profiler
+
+
+# Layout of a frame: [outer environment, global environment, slot, ...]
+FIRST_SLOT = 2
+
+# Value of a slot that has not been bound yet.
+UNBOUND = object()
+
+# Incremented whenever a global symbol is bound to a macro or a macro is
+# redefined, so that calls analyzed before are checked again.
+macro_generation = 0
+
+
+class Scope():
+    """Compile-time description of a frame.
+
+    NAMES holds the names of the locals in the frame, in slot order. The
+    indices in UNBOUND are those of locals that can be read before they are
+    bound: 'let*' bindings and local 'def!' definitions. The indices in
+    BOUND are those of locals in UNBOUND known to be bound in the code
+    analyzed with this scope.
+
+    """
+
+    def __init__(self, names=[], outer=None):
+        self.names = list(names)
+        self.outer = outer
+        self.unbound = set()
+        self.bound = frozenset()
+
+    def binding(self, indices):
+        """Return a view of the scope in which the locals INDICES are bound.
+
+        The view shares the locals of the scope, so that locals added to
+        either are added to both.
+
+        """
+        scope = Scope(outer=self.outer)
+        scope.names = self.names
+        scope.unbound = self.unbound
+        scope.bound = frozenset(indices)
+        return scope
+
+    def add(self, name):
+        """Add a local NAME that is not bound yet and return its slot."""
+        self.names.append(name)
+        self.unbound.add(len(self.names) - 1)
+        return len(self.names) - 1 + FIRST_SLOT
+
+
+class TailCall():
+    """A call to a Mal function in tail position that is yet to be run."""
+
+    def __init__(self, fn, args):
+        self.fn = fn
+        self.args = args
+
+
+def run(ast, env):
+    """Analyze AST and evaluate it in ENV."""
+    return analyze(ast)(env)
+
+
+def analyze(ast, scope=None, tail=False):
+    """Turn AST into a closure that evaluates it in an environment.
+
+    SCOPE describes the frame the closure is evaluated in. If SCOPE is None,
+    the closure is evaluated in a MalEnv. If TAIL is True, AST is in tail
+    position, and a call to a Mal function returns a TailCall instead of the
+    function's value.
+
+    """
+    if type(ast) is mal.Symbol:
+        return analyze_symbol(ast, scope)
+
+    elif type(ast) is mal.List:
+        if len(ast) == 0:
+            return constant(ast)
+        if type(ast[0]) is mal.Symbol:
+            if ast[0].name in special_forms:
+                return special_forms[ast[0].name](ast, scope, tail)
+            return analyze_macro_call(ast, scope, tail)
+        return analyze_application(ast, scope, tail)
+
+    elif type(ast) is mal.Vector:
+        return analyze_vector(ast, scope)
+
+    elif type(ast) is mal.Hash:
+        return analyze_hash(ast, scope)
+
+    else:  # other atoms and comments (None)
+        return constant(ast)
+
+
+def constant(value):
+    """Return a closure that always returns VALUE."""
+    def constant_node(env):
+        return value
+
+    return constant_node
+
+
+def error(error_type, descr):
+    """Return a closure that raises an error.
+
+    This is used for special forms with invalid arguments, which are errors
+    when they are evaluated, not when they are analyzed.
+
+    """
+    def error_node(env):
+        raise mal.MalError(error_type, descr)
+
+    return error_node
+
+
+def analyze_symbol(ast, scope):
+    return symbol_node(ast.name, scope)
+
+
+def symbol_node(name, scope, depth=0, limit=None):
+    """Return a closure looking up the symbol NAME.
+
+    SCOPE describes the frame DEPTH levels up from the environment the closure
+    is evaluated in. If LIMIT is given, only the first LIMIT locals of SCOPE
+    are considered.
+
+    """
+    while scope is not None:
+        if limit is None:
+            limit = len(scope.names)
+        for i in range(limit - 1, -1, -1):
+            if scope.names[i] == name:
+                slot = i + FIRST_SLOT
+                if i in scope.unbound and i not in scope.bound:
+                    # If the local is not bound yet, look further out.
+                    fallback = symbol_node(name, scope, depth, i)
+                    return unbound_local_node(depth, slot, fallback)
+                return local_node(depth, slot)
+        scope = scope.outer
+        depth += 1
+        limit = None
+
+    if depth == 0:  # evaluated in a MalEnv
+        def global_node(env):
+            return env.get(name)
+    else:
+        def global_node(env):
+            return env[1].get(name)
+
+    return global_node
+
+
+def local_node(depth, slot):
+    if depth == 0:
+        def local_node(env):
+            return env[slot]
+    elif depth == 1:
+        def local_node(env):
+            return env[0][slot]
+    elif depth == 2:
+        def local_node(env):
+            return env[0][0][slot]
+    else:
+        def local_node(env):
+            for i in range(depth):
+                env = env[0]
+            return env[slot]
+
+    return local_node
+
+
+def unbound_local_node(depth, slot, fallback):
+    def unbound_local_node(env):
+        frame = env
+        for i in range(depth):
+            frame = frame[0]
+        if slot < len(frame):
+            value = frame[slot]
+            if value is not UNBOUND:
+                return value
+        return fallback(env)
+
+    return unbound_local_node
+
+
+def analyze_vector(ast, scope):
+    nodes = [analyze(elem, scope) for elem in ast]
+
+    def vector_node(env):
+        return mal.Vector([node(env) for node in nodes])
+
+    return vector_node
+
+
+def analyze_hash(ast, scope):
+    nodes = [(key, analyze(val, scope)) for key, val in ast.items()]
+
+    def hash_node(env):
+        return mal.Hash({key: node(env) for key, node in nodes})
+
+    return hash_node
+
+
+def analyze_application(ast, scope, tail):
+    fn_node = analyze(ast[0], scope)
+    arg_nodes = [analyze(arg, scope) for arg in ast[1:]]
+
+    # Calls with one or two arguments call builtins without collecting the
+    # arguments in a list.
+    if len(arg_nodes) == 1:
+        arg_node = arg_nodes[0]
+
+        def application_node1(env):
+            try:
+                fn = fn_node(env)
+                arg = arg_node(env)
+                if type(fn) is mal.Builtin:
+                    return fn.fn1(arg)
+                if tail and type(fn) is mal.Function:
+                    return TailCall(fn, [arg])
+                return apply(fn, [arg])
+            except mal.MalError as err:
+                mal.locate(err, ast)
+                raise
+
+        return application_node1
+
+    if len(arg_nodes) == 2:
+        first_node, second_node = arg_nodes
+
+        def application_node2(env):
+            try:
+                fn = fn_node(env)
+                first = first_node(env)
+                second = second_node(env)
+                if type(fn) is mal.Builtin:
+                    return fn.fn2(first, second)
+                if tail and type(fn) is mal.Function:
+                    return TailCall(fn, [first, second])
+                return apply(fn, [first, second])
+            except mal.MalError as err:
+                mal.locate(err, ast)
+                raise
+
+        return application_node2
+
+    def application_node(env):
+        try:
+            fn = fn_node(env)
+            args = [node(env) for node in arg_nodes]
+            if tail and type(fn) is mal.Function:
+                return TailCall(fn, args)
+            return apply(fn, args)
+        except mal.MalError as err:
+            mal.locate(err, ast)
+            raise
+
+    return application_node
+
+
+def analyze_macro_call(ast, scope, tail):
+    """Analyze AST, a list starting with a symbol that is not a special form.
+
+    Whether the symbol names a macro can only be decided when the call is
+    first evaluated, because the macro may be defined by an earlier form in
+    the same 'do'. At that point, the call is expanded and analyzed, or
+    analyzed as an application, and the result is reused until a macro is
+    (re)defined. The symbol is then looked up again, and the call is analyzed
+    anew if it no longer refers to the same macro.
+
+    """
+    head = analyze_symbol(ast[0], scope)
+    # The analyzed call, the macro it was expanded from and macro_generation
+    # at the time it was last checked.
+    cache = [None, None, -1]
+
+    def macro_call_node(env):
+        if cache[2] != macro_generation:
+            try:
+                fn = head(env)
+            except mal.SymbolError:
+                # An unbound symbol may still be defined as a macro later.
+                return analyze_application(ast, scope, tail)(env)
+            if not (type(fn) is mal.Function and fn.is_macro):
+                fn = None
+            if cache[0] is None or fn is not cache[1]:
+                if fn is None:
+                    node = analyze_application(ast, scope, tail)
+                else:
+                    node = analyze(fn.fn(*ast[1:]), scope, tail)
+                cache[0] = node
+                cache[1] = fn
+            cache[2] = macro_generation
+        return cache[0](env)
+
+    return macro_call_node
+
+
+def apply(fn, args):
+    """Apply FN to ARGS.
+
+    Tail calls returned by the body of a Mal function are run here, until a
+    value is produced.
+
+    """
+    while True:
+        if type(fn) is mal.Builtin:
+            return fn.fn(*args)
+        if type(fn) is not mal.Function:
+            raise mal.MalError("ApplyError",
+                               "'{}' is not callable".format(fn))
+        if fn.code is None:  # not created by the analyzer
+            return fn.fn(*args)
+        if profiler.current is not None:
+            profiler.current.count(fn)
+        value = fn.code(fn.env, args)
+        if type(value) is not TailCall:
+            return value
+        fn = value.fn
+        args = value.args
+
+
+profiler.frame_functions[apply.__code__] = lambda frame: frame.f_locals['fn']
+
+
+def define_node(ast, scope, is_macro):
+    """Analyze AST, a 'def!' or 'defmacro!' form.
+
+    At the top level, the symbol is defined in the MalEnv. Inside a frame, a
+    local slot is set instead, just like 'def!' sets the symbol in the
+    innermost environment.
+
+    """
+    name = ast[1].name
+
+    if scope is None:
+        value = analyze(ast[2], scope)
+
+        def define_node(env):
+            global macro_generation
+            evalled = value(env)
+            if is_macro and type(evalled) is mal.Function:
+                evalled.is_macro = True
+            old = env.data.get(name)
+            if is_macro or (type(old) is mal.Function and old.is_macro):
+                macro_generation += 1
+            env.set(name, evalled)
+            return evalled
+
+        return define_node
+
+    if name in scope.names:
+        slot = len(scope.names) - scope.names[::-1].index(name) - 1
+        slot += FIRST_SLOT
+    else:
+        slot = scope.add(name)
+    # The value is analyzed after the slot is added, so that a local function
+    # can call itself.
+    value = analyze(ast[2], scope)
+
+    def define_local_node(env):
+        evalled = value(env)
+        if is_macro and type(evalled) is mal.Function:
+            evalled.is_macro = True
+        if slot >= len(env):
+            env.extend([UNBOUND] * (slot + 1 - len(env)))
+        env[slot] = evalled
+        return evalled
+
+    return define_local_node
+
+
+# Special forms
+def analyze_def(ast, scope, tail):
+    if len(ast) != 3:
+        return error("ArgError",
+                     "'def!' requires 2 arguments, "
+                     "received {}".format(len(ast) - 1))
+    return define_node(ast, scope, False)
+
+
+def analyze_defmacro(ast, scope, tail):
+    if len(ast) != 3:
+        return error("ArgError",
+                     "'defmacro!' requires 2 arguments, "
+                     "received {}".format(len(ast) - 1))
+    return define_node(ast, scope, True)
+
+
+def analyze_try(ast, scope, tail):
+    body = analyze(ast[1], scope)
+    catch = ast[2]
+    if not (catch[0].name == "catch*"):
+        return error("TryError", "Failing 'catch*' clause")
+    handler = analyze(catch[2], Scope([catch[1].name], scope), tail)
+    toplevel = scope is None
+
+    def try_node(env):
+        try:
+            return body(env)
+        except mal.MalError as err:
+            # The error is bound as a HandledError, a normal value.
+            return handler([env, env if toplevel else env[1],
+                            mal.HandledError(err)])
+
+    return try_node
+
+
+def analyze_let(ast, scope, tail):
+    bindings = ast[1]
+    if not isinstance(bindings, (mal.List, mal.Vector)):
+        return error("LetError", "Invalid bind form")
+    if (len(bindings) % 2 != 0):
+        return error("LetError", "Insufficient bind forms")
+
+    # All names are added before the values are analyzed, so that closures
+    # in a value can refer to locals bound after it.
+    let_scope = Scope(outer=scope)
+    slots = []
+    for i in range(0, len(bindings), 2):
+        if type(bindings[i]) is not mal.Symbol:
+            return error("LetError", "Attempt to bind to non-symbol")
+        slots.append(let_scope.add(bindings[i].name))
+    # Each value is analyzed in a view of the scope in which the locals
+    # before it are bound, so that they are read from their slots directly.
+    # Macro calls are analyzed when they are first run, so the views are
+    # kept apart.
+    indices = [slot - FIRST_SLOT for slot in slots]
+    values = [analyze(bindings[i], let_scope.binding(indices[:i // 2]))
+              for i in range(1, len(bindings), 2)]
+    body = analyze(ast[2], let_scope.binding(indices), tail)
+    bindings = list(zip(slots, values))
+    size = len(slots)
+    toplevel = scope is None
+
+    def let_node(env):
+        frame = [env, env if toplevel else env[1]] + [UNBOUND] * size
+        for slot, value in bindings:
+            frame[slot] = value(frame)
+        return body(frame)
+
+    return let_node
+
+
+def analyze_do(ast, scope, tail):
+    nodes = [analyze(form, scope) for form in ast[1:-1]]
+    last = analyze(ast[-1], scope, tail)
+
+    def do_node(env):
+        for node in nodes:
+            node(env)
+        return last(env)
+
+    return do_node
+
+
+def analyze_if(ast, scope, tail):
+    if len(ast) < 3:
+        return error("ArgError",
+                     "'if' requires 2-3 arguments, "
+                     "received {}".format(len(ast) - 1))
+    test = analyze(ast[1], scope)
+    then = analyze(ast[2], scope, tail)
+    if len(ast) == 4:
+        otherwise = analyze(ast[3], scope, tail)
+    else:
+        otherwise = constant(mal.NIL)
+
+    def if_node(env):
+        condition = test(env)
+        if condition is not mal.NIL and condition is not mal.FALSE:
+            return then(env)
+        else:
+            return otherwise(env)
+
+    return if_node
+
+
+def analyze_fn(ast, scope, tail):
+    params = ast[1]
+    names = [param.name for param in params]
+    if '&' in names and names.index('&') != len(names) - 2:
+        return error("BindsError", "Illegal binds list")
+    body_ast = ast[2]
+    code, body_scope = function_code(params, body_ast, scope)
+
+    def fn_node(env):
+        return make_function(params, body_ast, env, code, body_scope)
+
+    return fn_node
+
+
+def function_code(params, body_ast, scope):
+    """Analyze the body of a function with PARAMS in SCOPE.
+
+    Return the code of the function, which takes the environment of the
+    function and its arguments, and the scope of its body.
+
+    """
+    names = [param.name for param in params]
+    variadic = '&' in names
+    if variadic:
+        del names[-2]
+    nfixed = len(names) - 1 if variadic else len(names)
+    body_scope = Scope(names, scope)
+    body = analyze(body_ast, body_scope, tail=True)
+    toplevel = scope is None
+
+    def code(outer, args):
+        """Bind ARGS in a new frame and evaluate the function body."""
+        frame = [outer, outer if toplevel else outer[1]]
+        nargs = len(args)
+        if nargs == nfixed:
+            frame.extend(args)
+        elif nargs > nfixed:
+            frame.extend(args[:nfixed])
+        else:
+            frame.extend(args)
+            frame.extend([mal.NIL] * (nfixed - nargs))
+        if variadic:
+            frame.append(mal.List(args[nfixed:]))
+        return body(frame)
+
+    return code, body_scope
+
+
+def make_function(params, body_ast, env, code, scope):
+    """Return a Mal function running CODE in ENV.
+
+    SCOPE is the scope of the function's body.
+
+    """
+    function = mal.Function(None, params, body_ast, env, code=code,
+                            scope=scope)
+
+    def mal_closure(*args):
+        return apply(function, args)
+
+    function.fn = mal_closure
+    return function
+
+
+def analyze_quote(ast, scope, tail):
+    return constant(ast[1])
+
+
+def analyze_quasiquote(ast, scope, tail):
+    return analyze(mal_quasiquote(ast[1]), scope, tail)
+
+
+def analyze_macroexpand(ast, scope, tail):
+    form = ast[1]
+    toplevel = scope is None
+
+    def macroexpand_node(env):
+        return macroexpand(form, env if toplevel else env[1])
+
+    return macroexpand_node
+
+
+special_forms = {"def!":        analyze_def,
+                 "defmacro!":   analyze_defmacro,
+                 "try*":        analyze_try,
+                 "let*":        analyze_let,
+                 "do":          analyze_do,
+                 "if":          analyze_if,
+                 "fn*":         analyze_fn,
+                 "quote":       analyze_quote,
+                 "quasiquote":  analyze_quasiquote,
+                 "macroexpand": analyze_macroexpand}
+
+
+# Macro and quasiquote expansion, shared with the evaluator in pymal.py
+def is_pair(arg):
+    """Return True if ARG is a non-empty list or vector."""
+
+    if isinstance(arg, (mal.List, mal.Vector)) and len(arg) > 0:
+        return True
+    else:
+        return False
+
+
+def mal_quasiquote(ast):
+    # not a list (or empty list)
+    if not is_pair(ast):
+        return mal.List((mal.Symbol("quote"), ast))
+
+    # unquote
+    elif type(ast[0]) is mal.Symbol and ast[0].name == "unquote":
+        return ast[1]
+
+    # splice-unquote
+    elif (is_pair(ast[0]) and
+          type(ast[0][0]) is mal.Symbol and
+          ast[0][0].name == "splice-unquote"):
+        first = mal.Symbol("concat")
+        second = ast[0][1]
+        rest = mal_quasiquote(mal.List(ast[1:]))
+        return mal.List((first, second, rest))
+
+    # otherwise
+    else:
+        first = mal.Symbol("cons")
+        second = mal_quasiquote(ast[0])
+        rest = mal_quasiquote(mal.List(ast[1:]))
+        return mal.List((first, second, rest))
+
+
+def get_macro(ast, env):
+    """Return the macro called by AST in ENV, or None if AST is no macro call.
+
+    """
+    if type(ast) is not mal.List or len(ast) == 0:
+        return None
+    if type(ast[0]) is not mal.Symbol:
+        return None
+
+    name = ast[0].name
+    found = env.find(name)
+    if found is None:
+        return None
+    fn = found.data[name]
+    if type(fn) is mal.Function and fn.is_macro:
+        return fn
+    else:
+        return None
+
+
+def macroexpand(ast, env):
+    """Expand AST as long as it is a macro call.
+
+    The expansion of a call is stored in the call's list together with the
+    macro that produced it, and is reused as long as the symbol still names
+    the same macro. Redefining the macro makes the call expand again.
+
+    """
+    fn = get_macro(ast, env)
+    while fn is not None:
+        if ast.expansion is not None and ast.expansion[0] is fn:
+            ast = ast.expansion[1]
+        else:
+            expansion = fn.fn(*ast[1:])
+            ast.expansion = (fn, expansion)
+            ast = expansion
+        fn = get_macro(ast, env)
+    return ast
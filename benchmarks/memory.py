@@ -0,0 +1,63 @@
+"""Memory used by the forms read from a large generated Mal source.
+
+Generates a source of DEFINITIONS function definitions, reads it and reports
+the memory allocated for the forms, per node: per list, vector or hash and
+per element of any type in them.
+
+Usage: python benchmarks/memory.py [DEFINITIONS]
+
+"""
+import io
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import reader  # noqa: E402
+import mal_types as mal  # noqa: E402
+
+
+def generate(definitions):
+    """Return Mal source with DEFINITIONS function definitions."""
+    forms = []
+    for i in range(definitions):
+        forms.append('(def! f{0} (fn* (a b & more)\n'
+                     '  (let* [x (+ a {0}) y {{:k{1} (list b "s{0}")}}]\n'
+                     '    (if (< x b) (f{1} x y) (cons :done more)))))\n'
+                     .format(i, i % 100))
+    return ''.join(forms)
+
+
+def count_nodes(form):
+    """Return the number of nodes in FORM."""
+    if isinstance(form, (mal.List, mal.Vector)):
+        return 1 + sum(count_nodes(elem) for elem in form)
+    if isinstance(form, mal.Hash):
+        return 1 + sum(count_nodes(key) + count_nodes(value)
+                       for key, value in form.items())
+    return 1
+
+
+def measure(source):
+    """Return the forms read from SOURCE and the bytes allocated for them."""
+    tracemalloc.start()
+    forms = list(reader.read_stream(io.StringIO(source)))
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return forms, size
+
+
+def main(args):
+    definitions = int(args[0]) if args else 20000
+    source = generate(definitions)
+    forms, size = measure(source)
+    nodes = sum(count_nodes(form) for form in forms)
+    print("source:         {:>12,} bytes".format(len(source)))
+    print("nodes:          {:>12,}".format(nodes))
+    print("forms:          {:>12,} bytes".format(size))
+    print("bytes per node: {:>12.1f}".format(size / nodes))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,300 @@
+"""Benchmarks of the reader, the evaluators, the builtins and the prelude.
+
+Each benchmark runs a fixed workload, once to warm up and then REPEAT times,
+and reports the best wall time, the operations per second for that time and
+the peak memory allocated during a separate run, measured with tracemalloc.
+An operation is the unit of work of a benchmark, such as a function call or
+a list element, so that the numbers are comparable when workloads change.
+
+The results can be written as JSON with --json, together with the git commit
+and the evaluator they were measured with, and compared with an earlier JSON
+file with --compare to track regressions across commits.
+
+Usage: python benchmarks/run.py [--analyze | --stack] [--repeat REPEAT]
+                                [--json FILE] [--compare FILE] [NAME ...]
+
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+here = os.path.dirname(os.path.abspath(__file__))
+root = os.path.join(here, '..')
+sys.path.insert(0, root)
+
+import pymal  # noqa: E402
+import reader  # noqa: E402
+import malc  # noqa: E402
+import mal_env as menv  # noqa: E402
+import memory  # noqa: E402
+
+
+class Benchmark():
+    """A benchmark NAME doing OPS operations each time RUN is called.
+
+    SETUP is called once with a fresh global environment before RUN, and
+    RUN returns a value that is checked against EXPECTED, if it is not None.
+
+    """
+
+    def __init__(self, name, ops, setup, run, expected=None):
+        self.name = name
+        self.ops = ops
+        self.setup = setup
+        self.run = run
+        self.expected = expected
+
+
+def mal_benchmark(name, ops, setup, form, expected):
+    """Return a benchmark evaluating FORM after evaluating SETUP.
+
+    SETUP and FORM are Mal source. EXPECTED is the printed value of FORM.
+
+    """
+    state = {}
+
+    def setup_env(env):
+        state['env'] = env
+        state['ast'] = reader.read_str(form)
+        for ast in reader.read_stream(io.StringIO(setup)):
+            pymal.EVAL(ast, env)
+
+    def run():
+        return pymal.PRINT(pymal.EVAL(state['ast'], state['env']))
+
+    return Benchmark(name, ops, setup_env, run, expected)
+
+
+def parse_benchmark(name, definitions):
+    """Return a benchmark reading a generated file of DEFINITIONS forms."""
+    source = memory.generate(definitions)
+    state = {}
+
+    def setup(env):
+        state['source'] = source
+
+    def run():
+        return len(list(reader.read_stream(io.StringIO(state['source']))))
+
+    return Benchmark(name, len(source), setup, run, definitions)
+
+
+benchmarks = [
+    # Calls of fib.
+    mal_benchmark('fib', 21891, """
+        (def! fib (fn* [n]
+          (if (< n 2) n (+ (fib (- n 1)) (fib (- n 2))))))
+    """, '(fib 20)', '6765'),
+    # Calls of tak.
+    mal_benchmark('tak', 63609, """
+        (def! tak (fn* [x y z]
+          (if (< y x)
+            (tak (tak (- x 1) y z) (tak (- y 1) z x) (tak (- z 1) x y))
+            z)))
+    """, '(tak 18 12 6)', '7'),
+    # Calls of ack.
+    mal_benchmark('ackermann', 10307, """
+        (def! ack (fn* [m n]
+          (cond (= m 0) (+ n 1)
+                (= n 0) (ack (- m 1) 1)
+                :else (ack (- m 1) (ack m (- n 1))))))
+    """, '(ack 3 4)', '125'),
+    # Elements added to the list.
+    mal_benchmark('cons', 20000, """
+        (def! build (fn* [n acc]
+          (if (= n 0) acc (build (- n 1) (cons n acc)))))
+    """, '(count (build 20000 ()))', '20000'),
+    # Elements added to the vector.
+    mal_benchmark('conj', 20000, """
+        (def! build (fn* [n acc]
+          (if (= n 0) acc (build (- n 1) (conj acc n)))))
+    """, '(count (build 20000 []))', '20000'),
+    # Keys associated and looked up.
+    mal_benchmark('assoc', 10000, """
+        (def! fill (fn* [n m]
+          (if (= n 0) m (fill (- n 1) (assoc m (str "k" n) n)))))
+        (def! total (fn* [n m acc]
+          (if (= n 0) acc (total (- n 1) m (+ acc (get m (str "k" n)))))))
+        (def! assoc-loop (fn* [n] (total n (fill n {}) 0)))
+    """, '(assoc-loop 5000)', '12502500'),
+    # Elements reduced.
+    mal_benchmark('reduce', 100000, """
+        (def! range (fn* [n acc]
+          (if (= n 0) acc (range (- n 1) (cons (- n 1) acc)))))
+        (def! numbers (range 100000 ()))
+    """, '(reduce + 0 numbers)', '4999950000'),
+    # Elements passed through a pipeline of intermediate lists.
+    mal_benchmark('pipeline', 100000, """
+        (def! numbers (doall (range 100000)))
+        (def! double (fn* [x] (* 2 x)))
+    """, '(->> numbers (map inc) (map double) (reduce + 0))', '10000100000'),
+    # Elements passed through the same pipeline fused by transducers.
+    mal_benchmark('transduce', 100000, """
+        (def! numbers (doall (range 100000)))
+        (def! double (fn* [x] (* 2 x)))
+    """, '(transduce (comp (map inc) (map double)) + 0 numbers)',
+                  '10000100000'),
+    # Forms evaluated, each a new cond with threading macros to expand.
+    mal_benchmark('macros', 2000, """
+        (def! classify (fn* [n]
+          (eval `(cond (< ~n 10) (-> ~n (+ 1) (* 2))
+                       (< ~n 100) (->> ~n (- 1000) (* 3))
+                       :else (-> ~n inc inc)))))
+        (def! classify-loop (fn* [n acc]
+          (if (= n 0) acc (classify-loop (- n 1) (+ acc (classify n))))))
+    """, '(classify-loop 2000 0)', '2255245'),
+    # Characters read.
+    parse_benchmark('parse', 5000),
+    # Calls of fib in the evaluator written in Mal.
+    mal_benchmark('mal-in-mal', 465, """
+        (load-file "{}")
+        (EVAL '(def! fib (fn* [n]
+                 (if (< n 2) n (+ (fib (- n 1)) (fib (- n 2))))))
+              guest-env)
+    """.format(os.path.join(here, 'evaluator.mal')),
+                  "(EVAL '(fib 12) guest-env)", '144'),
+]
+
+
+def new_env():
+    """Return a global environment with the builtins and the prelude."""
+    env = menv.MalEnv()
+    for name, value in pymal.builtins().items():
+        env.set(name, value)
+    env.set("*host-language*", "Python3")
+    pymal.repl_env = env
+    pymal.mal_load_file(os.path.join(root, "prelude.mal"))
+    return env
+
+
+def measure(benchmark, repeat):
+    """Run BENCHMARK and return its results as a dictionary."""
+    benchmark.setup(new_env())
+    result = benchmark.run()
+    if benchmark.expected is not None and result != benchmark.expected:
+        raise AssertionError("{}: expected {}, got {}".format(
+            benchmark.name, benchmark.expected, result))
+
+    times = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        benchmark.run()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    benchmark.run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    best = min(times)
+    return {'name': benchmark.name,
+            'ops': benchmark.ops,
+            'times': times,
+            'seconds': best,
+            'ops_per_sec': benchmark.ops / best,
+            'peak_memory': peak}
+
+
+def commit():
+    """Return the git commit of the source tree, or None."""
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=root,
+                                       stderr=subprocess.DEVNULL,
+                                       universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def evaluator():
+    """Return the name of the evaluator in use."""
+    if pymal.use_analyzer:
+        return 'analyze'
+    if pymal.use_stack:
+        return 'stack'
+    return 'default'
+
+
+def run_suite(names=None, repeat=5, file=sys.stdout):
+    """Run the benchmarks in NAMES, or all of them, and return the results.
+
+    A line is printed to FILE for each benchmark as it finishes.
+
+    """
+    results = []
+    print("{:<12} {:>10} {:>14} {:>12}".format("benchmark", "seconds",
+                                              "ops/sec", "peak memory"),
+          file=file)
+    for benchmark in benchmarks:
+        if names and benchmark.name not in names:
+            continue
+        result = measure(benchmark, repeat)
+        results.append(result)
+        print("{:<12} {:>10.4f} {:>14,.0f} {:>12,}".format(
+            result['name'], result['seconds'], result['ops_per_sec'],
+            result['peak_memory']), file=file)
+    return {'commit': commit(),
+            'python': platform.python_version(),
+            'evaluator': evaluator(),
+            'repeat': repeat,
+            'benchmarks': results}
+
+
+def compare(results, baseline, file=sys.stdout):
+    """Print the speed of RESULTS relative to BASELINE to FILE."""
+    old = {result['name']: result for result in baseline['benchmarks']}
+    print(file=file)
+    print("compared with {} ({})".format(baseline['commit'],
+                                         baseline['evaluator']), file=file)
+    for result in results['benchmarks']:
+        if result['name'] not in old:
+            continue
+        speedup = result['ops_per_sec'] / old[result['name']]['ops_per_sec']
+        memory = (result['peak_memory'] /
+                  max(old[result['name']]['peak_memory'], 1))
+        print("{:<12} {:>8.2f}x speed {:>8.2f}x memory".format(
+            result['name'], speedup, memory), file=file)
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(prog="run.py",
+                                     description="Run the pymal benchmarks.")
+    parser.add_argument("--analyze", action="store_true",
+                        help="analyze forms before evaluating them")
+    parser.add_argument("--stack", action="store_true",
+                        help="evaluate forms on an explicit stack")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="number of timed runs of each benchmark")
+    parser.add_argument("--json", metavar="FILE",
+                        help="write the results to FILE as JSON")
+    parser.add_argument("--compare", metavar="FILE",
+                        help="compare the results with those in FILE")
+    parser.add_argument("names", nargs="*", metavar="NAME",
+                        help="benchmarks to run, all of them by default")
+    return parser.parse_args(args)
+
+
+def main(args):
+    options = parse_args(args)
+    pymal.use_analyzer = options.analyze
+    pymal.use_stack = options.stack and not options.analyze
+    malc.enabled = False
+    # The recursion of ackermann is deeper than Python allows by default.
+    sys.setrecursionlimit(10000)
+
+    results = run_suite(options.names, options.repeat)
+    if options.json is not None:
+        with open(options.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    if options.compare is not None:
+        with open(options.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
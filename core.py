@@ -1,4 +1,6 @@
+import concurrent.futures
 import copy
+import itertools
 import time
 import numbers
 
@@ -18,11 +20,18 @@ def mal_add(*args):
     try:
         res = sum(args)
     except TypeError:
-        return mal.Error("ArgError", "'+': Wrong type argument")
+        raise mal.MalError("ArgError", "'+': Wrong type argument")
 
     return res
 
 
+def mal_add2(a, b):
+    """Add A and B: '+' called with two arguments."""
+    if type(a) is int and type(b) is int:
+        return a + b
+    return mal_add(a, b)
+
+
 def mal_substract(*args):
     """Substract numbers.
 
@@ -40,11 +49,25 @@ def mal_substract(*args):
         for n in args:
             first -= n
     except TypeError:
-        return mal.Error("ArgError", "'-': Wrong type argument")
+        raise mal.MalError("ArgError", "'-': Wrong type argument")
 
     return first
 
 
+def mal_negate(n):
+    """Negate N: '-' called with one argument."""
+    if type(n) is int:
+        return -n
+    return mal_substract(n)
+
+
+def mal_substract2(a, b):
+    """Substract B from A: '-' called with two arguments."""
+    if type(a) is int and type(b) is int:
+        return a - b
+    return mal_substract(a, b)
+
+
 def mal_multiply(*args):
     """Multiply numbers.
 
@@ -62,11 +85,18 @@ def mal_multiply(*args):
         for n in args:
             first *= n
     except TypeError:
-        return mal.Error("ArgError", "'*': Wrong type argument")
+        raise mal.MalError("ArgError", "'*': Wrong type argument")
 
     return first
 
 
+def mal_multiply2(a, b):
+    """Multiply A and B: '*' called with two arguments."""
+    if type(a) is int and type(b) is int:
+        return a * b
+    return mal_multiply(a, b)
+
+
 def mal_divide(*args):
     """Divide numbers.
 
@@ -83,80 +113,146 @@ def mal_divide(*args):
         for n in args:
             first //= n
     except ZeroDivisionError:
-        return mal.Error("ArithmeticError", "Division by zero")
+        raise mal.MalError("ArithmeticError", "Division by zero")
     except TypeError:
-        return mal.Error("ArgError", "'/': Wrong type argument")
+        raise mal.MalError("ArgError", "'/': Wrong type argument")
 
     return first
 
 
+def mal_divide2(a, b):
+    """Divide A by B: '/' called with two arguments."""
+    if type(a) is int and type(b) is int and b != 0:
+        return a // b
+    return mal_divide(a, b)
+
+
+def mal_inc(n):
+    try:
+        return n + 1
+    except TypeError:
+        raise mal.MalError("ArgError", "'inc': Wrong type argument")
+
+
+def mal_dec(n):
+    try:
+        return n - 1
+    except TypeError:
+        raise mal.MalError("ArgError", "'dec': Wrong type argument")
+
+
 # comparison functions
 def mal_equal(*args):
     first = args[0]
     for arg in args[1:]:
         if arg != first:
-            return mal.Boolean(False)
+            return mal.FALSE
 
-    return mal.Boolean(True)
+    return mal.TRUE
+
+
+def mal_equal2(a, b):
+    if b != a:
+        return mal.FALSE
+    return mal.TRUE
 
 
 def mal_less(*args):
     for i in range(len(args) - 1):
         if not isinstance(args[i], numbers.Number):
-            return mal.Error("ArgError",
-                             "Wrong type argument: "
-                             "expected number, got {}".format(type(args[i])))
+            raise mal.MalError("ArgError",
+                               "Wrong type argument: "
+                               "expected number, got {}".format(type(args[i])))
         if not args[i] < args[i + 1]:
-            return mal.Boolean(False)
-    return mal.Boolean(True)
+            return mal.FALSE
+    return mal.TRUE
+
+
+def mal_less2(a, b):
+    if type(a) is int and type(b) is int:
+        return mal.TRUE if a < b else mal.FALSE
+    return mal_less(a, b)
 
 
 def mal_less_or_equal(*args):
     for i in range(len(args) - 1):
         if not isinstance(args[i], numbers.Number):
-            return mal.Error("ArgError",
-                             "'<=': Wrong type argument: "
-                             "expected number, got {}".format(type(args[i])))
+            raise mal.MalError("ArgError",
+                               "'<=': Wrong type argument: "
+                               "expected number, got {}".format(type(args[i])))
         if not args[i] <= args[i + 1]:
-            return mal.Boolean(False)
-    return mal.Boolean(True)
+            return mal.FALSE
+    return mal.TRUE
+
+
+def mal_less_or_equal2(a, b):
+    if type(a) is int and type(b) is int:
+        return mal.TRUE if a <= b else mal.FALSE
+    return mal_less_or_equal(a, b)
 
 
 def mal_greater(*args):
     for i in range(len(args) - 1):
         if not isinstance(args[i], numbers.Number):
-            return mal.Error("ArgError",
-                             "'>': Wrong type argument: "
-                             "expected number, got {}".format(type(args[i])))
+            raise mal.MalError("ArgError",
+                               "'>': Wrong type argument: "
+                               "expected number, got {}".format(type(args[i])))
         if not args[i] > args[i + 1]:
-            return mal.Boolean(False)
-    return mal.Boolean(True)
+            return mal.FALSE
+    return mal.TRUE
+
+
+def mal_greater2(a, b):
+    if type(a) is int and type(b) is int:
+        return mal.TRUE if a > b else mal.FALSE
+    return mal_greater(a, b)
 
 
 def mal_greater_or_equal(*args):
     for i in range(len(args) - 1):
         if not isinstance(args[i], numbers.Number):
-            return mal.Error("ArgError",
-                             "'>=': Wrong type argument: "
-                             "expected number, got {}".format(type(args[i])))
+            raise mal.MalError("ArgError",
+                               "'>=': Wrong type argument: "
+                               "expected number, got {}".format(type(args[i])))
         if not args[i] >= args[i + 1]:
-            return mal.Boolean(False)
-    return mal.Boolean(True)
+            return mal.FALSE
+    return mal.TRUE
+
+
+def mal_greater_or_equal2(a, b):
+    if type(a) is int and type(b) is int:
+        return mal.TRUE if a >= b else mal.FALSE
+    return mal_greater_or_equal(a, b)
 
 
 # list / vector functions
 def mal_cons(obj, lst):
-    if not isinstance(lst, list):
-        return mal.Error("ArgError", "'cons': Wrong type argument: "
-                         "expected list or vector, got {}".format(type(lst)))
-    return mal.List([obj] + lst)
+    if type(lst) is mal.LazySeq:
+        return mal.lazy_cons(obj, lst)
+    if not isinstance(lst, (mal.List, mal.Vector)):
+        raise mal.MalError("ArgError", "'cons': Wrong type argument: "
+                           "expected list or vector, got {}".format(type(lst)))
+    return mal.List(lst).cons(obj)
 
 
 def mal_concat(*args):
-    res = []
-    for arg in args:
-        res.extend(arg)
-    return mal.List(res)
+    """Concatenate lists and vectors.
+
+    The result shares its tail with the last argument if that is a list, so
+    only the elements of the other arguments are copied.
+
+    """
+    if len(args) == 0:
+        return mal.List([])
+    if any(type(arg) is mal.LazySeq for arg in args):
+        return mal.LazySeq(lambda: itertools.chain.from_iterable(
+            map(iterate_sequence, args)))
+
+    res = mal.List(args[-1])
+    for arg in reversed(args[:-1]):
+        for elem in reversed(list(arg)):
+            res = res.cons(elem)
+    return res
 
 
 def mal_conj(seq, *elems):
@@ -167,33 +263,45 @@ def mal_conj(seq, *elems):
 
     """
     if not isinstance(seq, (mal.List, mal.Vector)):
-        return mal.Error("ArgError", "'conj': Wrong type argument:"
-                         "expected list or vector, received {}".
-                         format(type(seq)))
+        raise mal.MalError("ArgError", "'conj': Wrong type argument:"
+                           "expected list or vector, received {}".
+                           format(type(seq)))
 
     if type(seq) is mal.List:
-        return mal.List(list(elems[::-1]) + seq)
+        res = mal.List(seq)
+        for elem in elems:
+            res = res.cons(elem)
+        return res
 
     if type(seq) is mal.Vector:
-        return mal.Vector(seq[:] + mal.Vector(elems))
+        return seq.conj(elems)
 
 
 def mal_nth(arg, index):
+    if type(arg) is mal.LazySeq:
+        if type(index) is not int or index < 0:
+            raise mal.MalError("IndexError", "Index out of range")
+        for elem in itertools.islice(arg.stream(), index, None):
+            return elem
+        raise mal.MalError("IndexError", "Index out of range")
     if not isinstance(arg, (mal.List, mal.Vector)):
-        return mal.Error("ArgError", "'nth': Wrong type argument:"
-                         "expected list or vector, received {}".
-                         format(type(arg)))
+        raise mal.MalError("ArgError", "'nth': Wrong type argument:"
+                           "expected list or vector, received {}".
+                           format(type(arg)))
     if index >= len(arg):
-        return mal.Error("IndexError", "Index out of range")
+        raise mal.MalError("IndexError", "Index out of range")
 
     return arg[index]
 
 
 def mal_first(arg):
+    if type(arg) is mal.LazySeq:
+        cell = arg.realize()
+        return mal.NIL if cell is mal.EMPTY else cell[0]
     if not isinstance(arg, (mal.List, mal.Vector, mal.Nil)):
-        return mal.Error("ArgError", "'nth': Wrong type argument:"
-                         "expected list or vector, received {}".
-                         format(type(arg)))
+        raise mal.MalError("ArgError", "'nth': Wrong type argument:"
+                           "expected list or vector, received {}".
+                           format(type(arg)))
 
     if arg == mal.NIL or len(arg) == 0:
         return mal.NIL
@@ -204,12 +312,21 @@ def mal_first(arg):
 def mal_rest(arg):
     if arg == mal.NIL:
         return mal.List([])
-    elif isinstance(arg, (mal.List, mal.Vector)):
-        return mal.List(arg[1:])
+    elif type(arg) is mal.List:
+        return arg.rest()
+    elif type(arg) is mal.Vector:
+        return mal.List(arg).rest()
+    elif type(arg) is mal.LazySeq:
+        cell = arg.realize()
+        if cell is mal.EMPTY:
+            return mal.List([])
+        if type(cell[1]) is mal.Vector:
+            return mal.List(cell[1])
+        return cell[1]
     else:
-        return mal.Error("ArgError", "'nth': Wrong type argument:"
-                         "expected list or vector, received {}".
-                         format(type(arg)))
+        raise mal.MalError("ArgError", "'nth': Wrong type argument:"
+                           "expected list or vector, received {}".
+                           format(type(arg)))
 
 
 def mal_list(*args):
@@ -218,29 +335,33 @@ def mal_list(*args):
 
 def mal_listp(arg):
     if type(arg) is mal.List:
-        return mal.Boolean(True)
+        return mal.TRUE
     else:
-        return mal.Boolean(False)
+        return mal.FALSE
 
 
 def mal_emptyp(arg):
+    if type(arg) is mal.LazySeq:
+        return mal.Boolean(arg.realize() is mal.EMPTY)
     if not isinstance(arg, (mal.List, mal.Vector)):
-        return mal.Error("ArgError",
-                         "'empty?': Wrong type argument: "
-                         "expected list or vector, got {}".format(type(arg)))
-    if arg == []:
-        return mal.Boolean(True)
+        raise mal.MalError("ArgError",
+                           "'empty?': Wrong type argument: "
+                           "expected list or vector, got {}".format(type(arg)))
+    if len(arg) == 0:
+        return mal.TRUE
     else:
-        return mal.Boolean(False)
+        return mal.FALSE
 
 
 def mal_count(arg):
     if arg == mal.NIL:
         return 0
+    if type(arg) is mal.LazySeq:
+        return sum(1 for elem in arg.stream())
     if not isinstance(arg, (mal.List, mal.Vector)):
-        return mal.Error("ArgError",
-                         "'count': Wrong type argument: "
-                         "expected list or vector, got {}".format(type(arg)))
+        raise mal.MalError("ArgError",
+                           "'count': Wrong type argument: "
+                           "expected list or vector, got {}".format(type(arg)))
     return len(arg)
 
 
@@ -264,13 +385,206 @@ def mal_println(*args):
 
 
 # file functions
-def mal_slurp(filename):
+
+# Text files are read and written as UTF-8. Bytes that are not valid UTF-8
+# are read as surrogate characters, which are written back as the same bytes.
+file_encoding = 'utf-8'
+file_errors = 'surrogateescape'
+
+file_modes = {"r", "w", "a", "rb", "wb", "ab"}
+
+
+def open_file(filename, mode='r'):
+    """Return the Python file object of FILENAME opened in MODE."""
+    if type(filename) is not str:
+        raise mal.MalError("TypeError", "Wrong type argument: "
+                           "expected string, received {}".format(filename))
     try:
-        f = open(filename, 'r')
-        conts = f.read()
+        if 'b' in mode:
+            return open(filename, mode)
+        return open(filename, mode, encoding=file_encoding,
+                    errors=file_errors)
     except FileNotFoundError:
-        return mal.Error("FileError", "File not found")
-    return conts
+        raise mal.MalError("FileError", "File not found")
+    except OSError as err:
+        raise mal.MalError("FileError", "{}: {}".format(err.strerror,
+                                                        filename))
+
+
+def check_file(name, f, binary):
+    """Raise an error if F is not an open file, binary if BINARY is True."""
+    if type(f) is not mal.File:
+        raise mal.MalError("TypeError", "'{}': Expected file,"
+                           " received {}".format(name, f))
+    if f.file.closed:
+        raise mal.MalError("FileError", "'{}': File is closed".format(name))
+    if binary is not None and f.is_binary() != binary:
+        raise mal.MalError("FileError", "'{}': Expected {} file".format(
+            name, "binary" if binary else "text"))
+
+
+def mal_slurp(filename):
+    """Return the contents of the file FILENAME, or the rest of a text file."""
+    if type(filename) is mal.File:
+        check_file('slurp', filename, False)
+        return filename.file.read()
+    with open_file(filename) as f:
+        return f.read()
+
+
+def mal_spit(filename, content, *options):
+    """Write CONTENT to the file FILENAME, replacing its contents.
+
+    CONTENT is written as str prints it. With the options ':append true',
+    CONTENT is added to the end of the file.
+
+    """
+    options = dict(zip(options[::2], options[1::2]))
+    append = is_true(options.get(mal.Keyword(':append'), mal.FALSE))
+    with open_file(filename, 'a' if append else 'w') as f:
+        f.write(printer.pr_str(content, False))
+    return mal.NIL
+
+
+def mal_open(filename, mode="r"):
+    """Open the file FILENAME in MODE and return it.
+
+    MODE is "r" to read, "w" to write, "a" to append, followed by "b" for
+    a binary file.
+
+    """
+    if mode not in file_modes:
+        raise mal.MalError("ArgError",
+                           "'open': Invalid mode {}".format(mode))
+    return mal.File(open_file(filename, mode), filename)
+
+
+def mal_close(f):
+    if type(f) is not mal.File:
+        raise mal.MalError("TypeError", "'close': Expected file,"
+                           " received {}".format(f))
+    f.file.close()
+    return mal.NIL
+
+
+def mal_with_open_call(f, fn):
+    """Call FN with the file F, and close F when FN returns or fails."""
+    try:
+        if not isinstance(fn, (mal.Builtin, mal.Function)):
+            raise mal.MalError("TypeError", "'with-open-call': Expected"
+                               " function, received {}".format(fn))
+        return fn.fn(f)
+    finally:
+        if type(f) is mal.File:
+            f.file.close()
+
+
+def mal_read_line(f):
+    """Return the next line of the text file F, or nil at its end."""
+    check_file('read-line', f, False)
+    line = f.file.readline()
+    if line == "":
+        return mal.NIL
+    return strip_newline(line)
+
+
+def mal_line_seq(f):
+    """Return a lazy sequence of the lines of F, a text file or a filename.
+
+    The lines are read as they are needed. Each pass over the sequence that
+    does not keep its elements, as count and reduce make, reads the lines
+    again: from the file FILENAME, which is opened for the pass and closed
+    at its end, or from the position F was at when the sequence was made.
+    Lines read from a file F that cannot seek are kept instead.
+
+    """
+    if type(f) is str:
+        def lines():
+            with open_file(f) as stream:
+                for line in stream:
+                    yield strip_newline(line)
+
+        return mal.LazySeq(lines)
+    check_file('line-seq', f, False)
+    if not f.file.seekable():
+        return mal.LazySeq(iterator=file_lines(f, None))
+    start = f.file.tell()
+    return mal.LazySeq(lambda: file_lines(f, start))
+
+
+def file_lines(f, start):
+    """Yield the lines of the file F, raising an error once F is closed.
+
+    The lines are read from the position START, or from the current
+    position of F if START is None.
+
+    """
+    if start is not None and not f.file.closed:
+        f.file.seek(start)
+    while True:
+        if f.file.closed:
+            raise mal.MalError("FileError", "'line-seq': File is closed")
+        line = f.file.readline()
+        if line == "":
+            return
+        yield strip_newline(line)
+
+
+def strip_newline(line):
+    if line.endswith('\n'):
+        return line[:-1]
+    return line
+
+
+def mal_read_bytes(f, n=-1):
+    """Return a vector of at most N bytes read from the binary file F.
+
+    Without N, read the rest of F. Return nil at the end of F.
+
+    """
+    check_file('read-bytes', f, True)
+    check_count('read-bytes', n)
+    data = f.file.read(n)
+    if not data and n != 0:
+        return mal.NIL
+    return mal.Vector(list(data))
+
+
+def mal_write(f, content):
+    """Write CONTENT to the file F.
+
+    CONTENT is written to a text file as str prints it. To a binary file, it
+    is written as a list or vector of bytes.
+
+    """
+    check_file('write', f, None)
+    if not f.is_binary():
+        f.file.write(printer.pr_str(content, False))
+        return mal.NIL
+    if not isinstance(content, (mal.List, mal.Vector)):
+        raise mal.MalError("TypeError", "'write': Expected list or vector"
+                           " of bytes, received {}".format(content))
+    try:
+        f.file.write(bytes(content))
+    except (TypeError, ValueError):
+        raise mal.MalError("TypeError", "'write': Expected list or vector"
+                           " of bytes, received {}".format(content))
+    return mal.NIL
+
+
+def mal_write_line(f, content):
+    """Write CONTENT and a newline to the text file F."""
+    check_file('write-line', f, False)
+    f.file.write(printer.pr_str(content, False))
+    f.file.write("\n")
+    return mal.NIL
+
+
+def mal_flush(f):
+    """Write out the data buffered for the file F."""
+    check_file('flush', f, None)
+    f.file.flush()
+    return mal.NIL
 
 
 # readline
@@ -289,74 +603,460 @@ def mal_atom(object):
 
 def mal_atomp(object):
     if type(object) is mal.Atom:
-        return mal.Boolean(True)
+        return mal.TRUE
     else:
-        return mal.Boolean(False)
+        return mal.FALSE
 
 
-def mal_deref(atom):
-    if type(atom) is not mal.Atom:
-        return mal.Error("TypeError",
-                         "Expected atom, received {}".format(type(atom)))
+def mal_deref(ref, *timeout):
+    """Return the value of REF, an atom or a future.
+
+    For a future, wait until its value has been computed. With the arguments
+    TIMEOUT-MS and TIMEOUT-VAL, wait at most TIMEOUT-MS milliseconds, and
+    return TIMEOUT-VAL if the value has not been computed by then.
+
+    """
+    if type(ref) is mal.Atom and not timeout:
+        return ref.value
+    elif type(ref) is mal.Future:
+        if not timeout:
+            return ref.future.result()
+        if len(timeout) != 2:
+            raise mal.MalError("ArgError",
+                               "'deref' requires 1 or 3 arguments, "
+                               "received {}".format(len(timeout) + 1))
+        try:
+            return ref.future.result(timeout[0] / 1000)
+        except concurrent.futures.TimeoutError:
+            return timeout[1]
     else:
-        return atom.value
+        raise mal.MalError("TypeError",
+                           "Expected atom or future, "
+                           "received {}".format(type(ref)))
 
 
 def mal_reset(atom, value):
     if type(atom) is not mal.Atom:
-        return mal.Error("TypeError",
-                         "Expected atom, received {}".format(type(atom)))
+        raise mal.MalError("TypeError",
+                           "Expected atom, received {}".format(type(atom)))
     else:
         atom.set(value)
         return value
 
 
+# futures
+
+# The threads running futures, started by the first future, and their number,
+# or None for the default of concurrent.futures.ThreadPoolExecutor.
+future_pool = None
+future_workers = None
+
+
+def mal_future_call(fn):
+    """Call FN without arguments in another thread.
+
+    Return a future of its value, which deref waits for. Errors raised by FN
+    are raised by deref.
+
+    """
+    global future_pool
+
+    if not isinstance(fn, (mal.Builtin, mal.Function)):
+        raise mal.MalError("TypeError", "'future-call': Expected function,"
+                           " received {}".format(fn))
+    if future_pool is None:
+        future_pool = concurrent.futures.ThreadPoolExecutor(future_workers)
+    return mal.Future(future_pool.submit(fn.fn))
+
+
+def mal_futurep(arg):
+    if type(arg) is mal.Future:
+        return mal.TRUE
+    else:
+        return mal.FALSE
+
+
+def mal_future_donep(future):
+    if type(future) is not mal.Future:
+        raise mal.MalError("TypeError",
+                           "Expected future, received {}".format(type(future)))
+    return mal.Boolean(future.future.done())
+
+
 # throw
 def mal_throw(arg):
-    return mal.Error("UserError", str(arg))
+    raise mal.MalError("UserError", str(arg))
 
 
 # functional functions
 def mal_apply(fn, *args):
     if not isinstance(fn, (mal.Builtin, mal.Function)):
-        return mal.Error("TypeError", "'apply': Expected function,"
-                         " received {}".format(fn))
+        raise mal.MalError("TypeError", "'apply': Expected function,"
+                           " received {}".format(fn))
 
     lastarg = args[-1]
-    if not isinstance(lastarg, (mal.List, mal.Vector)):
-        return mal.Error("TypeError", "'apply': Expected list or vector,"
-                         " received {}".format(args[-1]))
+    if not isinstance(lastarg, (mal.List, mal.Vector, mal.LazySeq)):
+        raise mal.MalError("TypeError", "'apply': Expected list or vector,"
+                           " received {}".format(args[-1]))
 
-    allargs = list(args[:-1]) + lastarg
+    allargs = list(args[:-1]) + list(lastarg)
 
     return fn.fn(*allargs)
 
 
-def mal_map(fn, lst):
-    if not isinstance(fn, (mal.Builtin, mal.Function)):
-        return mal.Error("TypeError", "'map': Expected function,"
-                         " received {}".format(fn))
+def mal_map(fn, lst=None):
+    """Return the values of FN on the elements of LST.
+
+    The values are returned as a list, or as a lazy sequence if LST is one.
+    Without LST, return a transducer applying FN to each element.
 
+    """
+    if not isinstance(fn, (mal.Builtin, mal.Function)):
+        raise mal.MalError("TypeError", "'map': Expected function,"
+                           " received {}".format(fn))
+
+    call = fn.fn1 if type(fn) is mal.Builtin else fn.fn
+    if lst is None:
+        return mal.Transducer(lambda elems: map(call, elems))
+    if type(lst) is mal.LazySeq:
+        return mal.LazySeq(lambda: map(call, lst.stream()))
     if not isinstance(lst, (mal.List, mal.Vector)):
-        return mal.Error("TypeError", "Expected list or vector,"
-                         " received {}".format(lst))
+        raise mal.MalError("TypeError", "Expected list or vector,"
+                           " received {}".format(lst))
+
+    return mal.List([call(elem) for elem in lst])
+
+
+def mal_filter(pred, lst=None):
+    """Return a lazy sequence of the elements of LST PRED is true of.
+
+    Without LST, return a transducer keeping those elements.
+
+    """
+    if not isinstance(pred, (mal.Builtin, mal.Function)):
+        raise mal.MalError("TypeError", "'filter': Expected function,"
+                           " received {}".format(pred))
+    call = pred.fn1 if type(pred) is mal.Builtin else pred.fn
+    if lst is None:
+        return mal.Transducer(lambda elems: filter_elements(call, elems))
+    check_sequence('filter', lst)
+
+    return mal.LazySeq(lambda: filter_elements(call, iterate_sequence(lst)))
+
+
+def filter_elements(call, elems):
+    """Iterate over the elements in ELEMS CALL returns a true value for."""
+    return (elem for elem in elems if is_true(call(elem)))
+
+
+def mal_take(n, lst=None):
+    """Return a lazy sequence of the first N elements of LST.
+
+    Without LST, return a transducer keeping the first N elements, which
+    takes no more elements from its input after them.
+
+    """
+    check_count('take', n)
+    if lst is None:
+        return mal.Transducer(
+            lambda elems: itertools.islice(elems, max(n, 0)))
+    check_sequence('take', lst)
+    return mal.LazySeq(lambda: itertools.islice(iterate_sequence(lst),
+                                                max(n, 0)))
+
+
+def mal_drop(n, lst=None):
+    """Return a lazy sequence of the elements of LST but the first N.
+
+    Without LST, return a transducer dropping the first N elements.
+
+    """
+    check_count('drop', n)
+    if lst is None:
+        return mal.Transducer(
+            lambda elems: itertools.islice(elems, max(n, 0), None))
+    check_sequence('drop', lst)
+    return mal.LazySeq(lambda: itertools.islice(iterate_sequence(lst),
+                                                max(n, 0), None))
+
+
+def mal_range(*args):
+    """Return a lazy sequence of numbers.
+
+    (range) counts up from 0 without end, (range END) from 0 up to END,
+    (range START END) from START up to END and (range START END STEP) by
+    STEP. END is not included.
+
+    """
+    for arg in args:
+        if not isinstance(arg, numbers.Number):
+            raise mal.MalError("ArgError", "'range': Wrong type argument: "
+                               "expected number, got {}".format(type(arg)))
+    if len(args) == 0:
+        return mal.LazySeq(itertools.count)
+    if len(args) > 3:
+        raise mal.MalError("ArgError",
+                           "'range' requires 0-3 arguments, "
+                           "received {}".format(len(args)))
+    if len(args) == 1:
+        args = (0,) + args
+    if len(args) == 3 and args[2] == 0:
+        raise mal.MalError("ArgError", "'range': Step must not be zero")
+    if all(type(arg) is int for arg in args):
+        return mal.LazySeq(lambda: iter(range(*args)))
+    return mal.LazySeq(lambda: number_range(*args))
+
+
+def number_range(start, end, step=1):
+    """Iterate over the numbers from START up to END by STEP."""
+    n = start
+    while (step > 0 and n < end) or (step < 0 and n > end):
+        yield n
+        n += step
+
+
+def mal_iterate(fn, x):
+    """Return the lazy sequence of X, (FN X), (FN (FN X)), etc."""
+    if not isinstance(fn, (mal.Builtin, mal.Function)):
+        raise mal.MalError("TypeError", "'iterate': Expected function,"
+                           " received {}".format(fn))
+    call = fn.fn1 if type(fn) is mal.Builtin else fn.fn
+
+    def iterate():
+        value = x
+        while True:
+            yield value
+            value = call(value)
+
+    return mal.LazySeq(iterate)
+
+
+def mal_lazy_seq_call(fn):
+    """Return a lazy sequence of the elements of the sequence FN returns.
+
+    FN is called without arguments when the first element is needed.
+
+    """
+    if not isinstance(fn, (mal.Builtin, mal.Function)):
+        raise mal.MalError("TypeError", "'lazy-seq-call': Expected function,"
+                           " received {}".format(fn))
+    return mal.LazySeq(thunk=fn.fn)
+
+
+def mal_doall(lst):
+    """Compute all elements of LST and return them as a list."""
+    if type(lst) is mal.LazySeq:
+        return mal.List(lst)
+    return lst
+
+
+def mal_comp(*fns):
+    """Compose FNS, functions or transducers.
+
+    The composition of functions calls the last one with the arguments and
+    each other one, from right to left, with the value of the one after it.
+    The composition of transducers passes the elements through the first
+    one first.
+
+    """
+    if fns and all(type(fn) is mal.Transducer for fn in fns):
+        def comp_xform(elems):
+            for fn in fns:
+                elems = fn.xform(elems)
+            return elems
+
+        return mal.Transducer(comp_xform)
+    for fn in fns:
+        if not isinstance(fn, (mal.Builtin, mal.Function)):
+            raise mal.MalError("TypeError", "'comp': Expected function,"
+                               " received {}".format(fn))
+    if not fns:
+        return ns['identity']
+
+    def composition(*args):
+        value = fns[-1].fn(*args)
+        for fn in reversed(fns[:-1]):
+            value = fn.fn(value)
+        return value
+
+    return mal.Builtin(composition)
+
+
+def mal_transduce(xform, fn, *args):
+    """Reduce a sequence with FN transformed by the transducer XFORM.
+
+    (transduce XFORM FN INIT COLL) starts with INIT, (transduce XFORM FN COLL)
+    with the value of FN called without arguments. The elements of COLL are
+    passed through XFORM in a single pass, without intermediate sequences.
+
+    """
+    check_transducer('transduce', xform)
+    if not isinstance(fn, (mal.Builtin, mal.Function)):
+        raise mal.MalError("TypeError", "'transduce': Expected function,"
+                           " received {}".format(fn))
+    if len(args) == 1:
+        init = fn.fn()
+        coll = args[0]
+    elif len(args) == 2:
+        init, coll = args
+    else:
+        raise mal.MalError("ArgError",
+                           "'transduce' requires 3-4 arguments, "
+                           "received {}".format(len(args) + 2))
+    check_sequence('transduce', coll)
+
+    call = fn.fn2 if type(fn) is mal.Builtin else fn.fn
+    acc = init
+    for elem in xform.xform(iterate_sequence(coll)):
+        acc = call(acc, elem)
+    return acc
+
+
+def mal_into(to, *args):
+    """Add the elements of a sequence to TO, as conj does.
+
+    (into TO COLL) adds the elements of COLL, (into TO XFORM COLL) those of
+    COLL passed through the transducer XFORM. The elements added to a hash
+    map are [key value] pairs.
+
+    """
+    if len(args) == 1:
+        coll = args[0]
+        check_sequence('into', coll)
+        elems = list(iterate_sequence(coll))
+    elif len(args) == 2:
+        xform, coll = args
+        check_transducer('into', xform)
+        check_sequence('into', coll)
+        elems = list(xform.xform(iterate_sequence(coll)))
+    else:
+        raise mal.MalError("ArgError",
+                           "'into' requires 2-3 arguments, "
+                           "received {}".format(len(args) + 1))
+
+    if to is mal.NIL:
+        to = mal.List([])
+    if type(to) is mal.Hash:
+        items = []
+        for pair in elems:
+            if not isinstance(pair, (mal.List, mal.Vector)) or len(pair) != 2:
+                raise mal.MalError("TypeError", "'into': Expected [key value]"
+                                   " pair, received {}".format(pair))
+            items.extend(pair)
+        return to.assoc(reader.hash_items(items))
+    return mal_conj(to, *elems)
+
+
+def mal_sequence(xform, coll):
+    """Return a lazy sequence of the elements of COLL passed through XFORM."""
+    check_transducer('sequence', xform)
+    check_sequence('sequence', coll)
+    return mal.LazySeq(lambda: xform.xform(iterate_sequence(coll)))
 
-    res = []
-    for elem in lst:
-        evalled = fn.fn(elem)
-        if type(evalled) is mal.Error:
-            return evalled
-        res.append(evalled)
 
-    return mal.List(res)
+def check_transducer(name, xform):
+    """Raise an error if XFORM is not a transducer."""
+    if type(xform) is not mal.Transducer:
+        raise mal.MalError("TypeError", "'{}': Expected transducer,"
+                           " received {}".format(name, xform))
+
+
+def check_sequence(name, lst):
+    """Raise an error if LST is not a sequence or nil."""
+    if not isinstance(lst, (mal.List, mal.Vector, mal.LazySeq, mal.Nil)):
+        raise mal.MalError("TypeError", "'{}': Expected sequence,"
+                           " received {}".format(name, lst))
+
+
+def check_count(name, n):
+    """Raise an error if N is not an integer."""
+    if type(n) is not int:
+        raise mal.MalError("ArgError", "'{}': Wrong type argument: "
+                           "expected integer, got {}".format(name, type(n)))
+
+
+def iterate_sequence(lst):
+    """Iterate over the elements of LST, a sequence or nil.
+
+    The cells of a lazy sequence realized on the way are not kept.
+
+    """
+    if lst is mal.NIL:
+        return iter(())
+    if type(lst) is mal.LazySeq:
+        return lst.stream()
+    return iter(lst)
+
+
+def mal_reduce(fn, init, lst):
+    """Reduce LST with FN, starting with INIT.
+
+    FN is called on INIT and the first element of LST, then on the result and
+    the second element, etc. If LST is empty or nil, INIT is returned.
+
+    """
+    if not isinstance(fn, (mal.Builtin, mal.Function)):
+        raise mal.MalError("TypeError", "'reduce': Expected function,"
+                           " received {}".format(fn))
+    if lst == mal.NIL:
+        return init
+    if not isinstance(lst, (mal.List, mal.Vector, mal.LazySeq)):
+        raise mal.MalError("TypeError", "'reduce': Expected list or vector,"
+                           " received {}".format(lst))
+
+    call = fn.fn2 if type(fn) is mal.Builtin else fn.fn
+    res = init
+    for elem in iterate_sequence(lst):
+        res = call(res, elem)
+    return res
+
+
+def mal_everyp(pred, lst):
+    if not isinstance(pred, (mal.Builtin, mal.Function)):
+        raise mal.MalError("TypeError", "'every?': Expected function,"
+                           " received {}".format(pred))
+    if lst == mal.NIL:
+        return mal.TRUE
+    if not isinstance(lst, (mal.List, mal.Vector, mal.LazySeq)):
+        raise mal.MalError("TypeError", "'every?': Expected list or vector,"
+                           " received {}".format(lst))
+
+    call = pred.fn1 if type(pred) is mal.Builtin else pred.fn
+    for elem in iterate_sequence(lst):
+        if not is_true(call(elem)):
+            return mal.FALSE
+    return mal.TRUE
+
+
+def mal_some(pred, lst):
+    """Return the first true value of PRED on an element of LST, or nil."""
+    if not isinstance(pred, (mal.Builtin, mal.Function)):
+        raise mal.MalError("TypeError", "'some': Expected function,"
+                           " received {}".format(pred))
+    if lst == mal.NIL:
+        return mal.NIL
+    if not isinstance(lst, (mal.List, mal.Vector, mal.LazySeq)):
+        raise mal.MalError("TypeError", "'some': Expected list or vector,"
+                           " received {}".format(lst))
+
+    call = pred.fn1 if type(pred) is mal.Builtin else pred.fn
+    for elem in iterate_sequence(lst):
+        res = call(elem)
+        if is_true(res):
+            return res
+    return mal.NIL
+
+
+def mal_identity(arg):
+    return arg
 
 
 # type functions
 def mal_symbol(arg):
     if type(arg) is not str:
-        return mal.Error("TypeError",
-                         "Wrong type argument: "
-                         "expected string, received {}".format(arg))
+        raise mal.MalError("TypeError",
+                           "Wrong type argument: "
+                           "expected string, received {}".format(arg))
     return mal.Symbol(arg)
 
 
@@ -364,9 +1064,9 @@ def mal_keyword(arg):
     if type(arg) is mal.Keyword:
         return arg
     if type(arg) is not str:
-        return mal.Error("TypeError",
-                         "Wrong type argument: "
-                         "expected string, received {}".format(type(arg)))
+        raise mal.MalError("TypeError",
+                           "Wrong type argument: "
+                           "expected string, received {}".format(type(arg)))
     return mal.Keyword(arg)
 
 
@@ -378,13 +1078,19 @@ def mal_seq(arg):
     """Turn ARG into a list.
 
     If ARG is nil or an empty list, vector or string, return nil. If ARG is a
-    non-empty list, return it unchanged; if ARG is a non-empty vector, convert
-    it to a list; if ARG is a non-empty string, return a list of characters.
+    non-empty list or lazy sequence, return it unchanged; if ARG is a
+    non-empty vector, convert it to a list; if ARG is a non-empty string,
+    return a list of characters.
 
     """
     if arg == mal.NIL:
         return arg
 
+    if type(arg) is mal.LazySeq:
+        if arg.realize() is mal.EMPTY:
+            return mal.NIL
+        return arg
+
     if len(arg) == 0:
         return mal.NIL
 
@@ -398,78 +1104,98 @@ def mal_seq(arg):
         return mal.List(arg)
 
     # if all fails, return an error
-    return mal.Error("ArgError", "'seq': Wrong type argument: "
-                     "expected sequence, received {}".format(type(arg)))
+    raise mal.MalError("ArgError", "'seq': Wrong type argument: "
+                       "expected sequence, received {}".format(type(arg)))
+
+
+# logic
+def is_true(arg):
+    """Return True if ARG counts as true, i.e., if it is not nil or false."""
+    return arg is not mal.NIL and arg is not mal.FALSE
+
+
+def mal_not(arg):
+    if is_true(arg):
+        return mal.FALSE
+    else:
+        return mal.TRUE
 
 
 # type predicates
 def mal_nilp(arg):
     if arg == mal.NIL:
-        return mal.Boolean(True)
+        return mal.TRUE
     else:
-        return mal.Boolean(False)
+        return mal.FALSE
 
 
 def mal_truep(arg):
-    if arg == mal.Boolean(True):
-        return mal.Boolean(True)
+    if arg is mal.TRUE:
+        return mal.TRUE
     else:
-        return mal.Boolean(False)
+        return mal.FALSE
 
 
 def mal_falsep(arg):
-    if arg == mal.Boolean(False):
-        return mal.Boolean(True)
+    if arg is mal.FALSE:
+        return mal.TRUE
     else:
-        return mal.Boolean(False)
+        return mal.FALSE
 
 
 def mal_symbolp(arg):
     if type(arg) is mal.Symbol:
-        return mal.Boolean(True)
+        return mal.TRUE
     else:
-        return mal.Boolean(False)
+        return mal.FALSE
 
 
 def mal_keywordp(arg):
     if type(arg) is mal.Keyword:
-        return mal.Boolean(True)
+        return mal.TRUE
     else:
-        return mal.Boolean(False)
+        return mal.FALSE
 
 
 def mal_vectorp(arg):
     if type(arg) is mal.Vector:
-        return mal.Boolean(True)
+        return mal.TRUE
     else:
-        return mal.Boolean(False)
+        return mal.FALSE
 
 
 def mal_mapp(arg):
     if type(arg) is mal.Hash:
-        return mal.Boolean(True)
+        return mal.TRUE
     else:
-        return mal.Boolean(False)
+        return mal.FALSE
 
 
 def mal_sequentialp(arg):
-    if isinstance(arg, (mal.List, mal.Vector)):
-        return mal.Boolean(True)
+    if isinstance(arg, (mal.List, mal.Vector, mal.LazySeq)):
+        return mal.TRUE
     else:
-        return mal.Boolean(False)
+        return mal.FALSE
 
 
 def mal_stringp(arg):
     if type(arg) is str:
-        return mal.Boolean(True)
+        return mal.TRUE
     else:
-        return mal.Boolean(False)
+        return mal.FALSE
 
 
 def mal_typeof(arg):
     return type(arg)
 
 
+def mal_zerop(arg):
+    if arg == 0:
+        return mal.TRUE
+    else:
+        return mal.FALSE
+
+
 # hash functions
 def mal_hashmap(*args):
     return reader.create_hash(args)
@@ -477,69 +1203,55 @@ def mal_hashmap(*args):
 
 def mal_assoc(hashmap, *args):
     if type(hashmap) is not mal.Hash:
-        return mal.Error("TypeError",
-                         "Wrong type argument: "
-                         "expected hash, received {}".format(type(hashmap)))
-    orig = hashmap.copy()
-
-    new = reader.create_hash(list(args))
-    if type(new) is mal.Error:
-        return new
-
-    orig.update(new)
-    return mal.Hash(orig)
+        raise mal.MalError("TypeError",
+                           "Wrong type argument: "
+                           "expected hash, received {}".format(type(hashmap)))
+    return hashmap.assoc(reader.hash_items(args))
 
 
 def mal_dissoc(hashmap, *keys):
     if type(hashmap) is not mal.Hash:
-        return mal.Error("TypeError",
-                         "Wrong type argument: "
-                         "expected hash, received {}".format(type(hashmap)))
-
-    new = hashmap.copy()
-    for key in keys:
-        new.pop(key, None)
+        raise mal.MalError("TypeError",
+                           "Wrong type argument: "
+                           "expected hash, received {}".format(type(hashmap)))
 
-    return mal.Hash(new)
+    return hashmap.dissoc(keys)
 
 
 def mal_get(hashmap, key):
     if hashmap == mal.NIL:
-        hashmap = mal.Hash({})
-    if type(hashmap) is not mal.Hash:
-        return mal.Error("TypeError",
-                         "Wrong type argument: "
-                         "expected hash, received {}".format(type(hashmap)))
-    if key in hashmap:
-        return hashmap[key]
-    else:
         return mal.NIL
+    if type(hashmap) is not mal.Hash:
+        raise mal.MalError("TypeError",
+                           "Wrong type argument: "
+                           "expected hash, received {}".format(type(hashmap)))
+    return hashmap.get(key, mal.NIL)
 
 
 def mal_containsp(hashmap, key):
     if type(hashmap) is not mal.Hash:
-        return mal.Error("TypeError",
-                         "Wrong type argument: "
-                         "expected hash, received {}".format(type(hashmap)))
+        raise mal.MalError("TypeError",
+                           "Wrong type argument: "
+                           "expected hash, received {}".format(type(hashmap)))
     if key in hashmap:
-        return mal.Boolean(True)
+        return mal.TRUE
     else:
-        return mal.Boolean(False)
+        return mal.FALSE
 
 
 def mal_keys(hashmap):
     if type(hashmap) is not mal.Hash:
-        return mal.Error("TypeError",
-                         "Wrong type argument: "
-                         "expected hash, received {}".format(type(hashmap)))
+        raise mal.MalError("TypeError",
+                           "Wrong type argument: "
+                           "expected hash, received {}".format(type(hashmap)))
     return mal.List(hashmap.keys())
 
 
 def mal_vals(hashmap):
     if type(hashmap) is not mal.Hash:
-        return mal.Error("TypeError",
-                         "Wrong type argument: "
-                         "expected hash, received {}".format(type(hashmap)))
+        raise mal.MalError("TypeError",
+                           "Wrong type argument: "
+                           "expected hash, received {}".format(type(hashmap)))
     return mal.List(hashmap.values())
 
 
@@ -573,16 +1285,20 @@ def mal_time_ms():
 
 
 # core namespace
-ns = {'+':           mal.Builtin(mal_add),
-      '-':           mal.Builtin(mal_substract),
-      '*':           mal.Builtin(mal_multiply),
-      '/':           mal.Builtin(mal_divide),
-
-      '=':           mal.Builtin(mal_equal),
-      '<':           mal.Builtin(mal_less),
-      '<=':          mal.Builtin(mal_less_or_equal),
-      '>':           mal.Builtin(mal_greater),
-      '>=':          mal.Builtin(mal_greater_or_equal),
+ns = {'+':           mal.Builtin(mal_add, fn2=mal_add2),
+      '-':           mal.Builtin(mal_substract, fn1=mal_negate,
+                                 fn2=mal_substract2),
+      '*':           mal.Builtin(mal_multiply, fn2=mal_multiply2),
+      '/':           mal.Builtin(mal_divide, fn2=mal_divide2),
+      'inc':         mal.Builtin(mal_inc),
+      'dec':         mal.Builtin(mal_dec),
+
+      '=':           mal.Builtin(mal_equal, fn2=mal_equal2),
+      '<':           mal.Builtin(mal_less, fn2=mal_less2),
+      '<=':          mal.Builtin(mal_less_or_equal, fn2=mal_less_or_equal2),
+      '>':           mal.Builtin(mal_greater, fn2=mal_greater2),
+      '>=':          mal.Builtin(mal_greater_or_equal,
+                                 fn2=mal_greater_or_equal2),
 
       'cons':        mal.Builtin(mal_cons),
       'concat':      mal.Builtin(mal_concat),
@@ -602,6 +1318,16 @@ ns = {'+':           mal.Builtin(mal_add),
 
       'read-string': mal.Builtin(reader.read_str),
       'slurp':       mal.Builtin(mal_slurp),
+      'spit':        mal.Builtin(mal_spit),
+      'open':        mal.Builtin(mal_open),
+      'close':       mal.Builtin(mal_close),
+      'with-open-call': mal.Builtin(mal_with_open_call),
+      'read-line':   mal.Builtin(mal_read_line),
+      'line-seq':    mal.Builtin(mal_line_seq),
+      'read-bytes':  mal.Builtin(mal_read_bytes),
+      'write':       mal.Builtin(mal_write),
+      'write-line':  mal.Builtin(mal_write_line),
+      'flush':       mal.Builtin(mal_flush),
 
       'readline':    mal.Builtin(mal_readline),
 
@@ -610,10 +1336,31 @@ ns = {'+':           mal.Builtin(mal_add),
       'deref':       mal.Builtin(mal_deref),
       'reset!':      mal.Builtin(mal_reset),
 
+      'future-call': mal.Builtin(mal_future_call),
+      'future?':     mal.Builtin(mal_futurep),
+      'future-done?': mal.Builtin(mal_future_donep),
+
       'throw':       mal.Builtin(mal_throw),
 
       'apply':       mal.Builtin(mal_apply),
       'map':         mal.Builtin(mal_map),
+      'filter':      mal.Builtin(mal_filter),
+      'take':        mal.Builtin(mal_take),
+      'drop':        mal.Builtin(mal_drop),
+      'range':       mal.Builtin(mal_range),
+      'iterate':     mal.Builtin(mal_iterate),
+      'lazy-seq-call': mal.Builtin(mal_lazy_seq_call),
+      'doall':       mal.Builtin(mal_doall),
+      'comp':        mal.Builtin(mal_comp),
+      'transduce':   mal.Builtin(mal_transduce),
+      'into':        mal.Builtin(mal_into),
+      'sequence':    mal.Builtin(mal_sequence),
+      'reduce':      mal.Builtin(mal_reduce),
+      'every?':      mal.Builtin(mal_everyp),
+      'some':        mal.Builtin(mal_some),
+      'identity':    mal.Builtin(mal_identity),
+
+      'not':         mal.Builtin(mal_not),
 
       'symbol':      mal.Builtin(mal_symbol),
       'keyword':     mal.Builtin(mal_keyword),
@@ -621,6 +1368,7 @@ ns = {'+':           mal.Builtin(mal_add),
       'seq':         mal.Builtin(mal_seq),
 
       'nil?':        mal.Builtin(mal_nilp),
+      'zero?':       mal.Builtin(mal_zerop),
       'true?':       mal.Builtin(mal_truep),
       'false?':      mal.Builtin(mal_falsep),
       'symbol?':     mal.Builtin(mal_symbolp),
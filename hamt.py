@@ -0,0 +1,248 @@
+"""Hash array mapped trie.
+
+This is the persistent data structure behind mal_types.Hash. A trie node maps
+five bits of a key's hash to either a key/value pair or a child node for the
+next five bits. Adding or removing a key copies only the nodes on the path
+to it, so all versions of a hash map share the rest of the trie.
+
+Nodes are updated in place if they belong to the same edit, an object that
+assoc() creates for each call. This is used to add many items at once
+without copying each node for each item. Once a trie is returned to the
+caller, its nodes are never modified again.
+
+"""
+
+BITS = 5
+MASK = (1 << BITS) - 1
+
+# Default for find() to tell a missing key from one mapped to None.
+NOT_FOUND = object()
+
+
+def key_hash(key):
+    return hash(key) & 0xffffffff
+
+
+def bit_count(n):
+    return bin(n).count('1')
+
+
+class BitmapNode():
+    """A trie node with an entry for each bit set in BITMAP.
+
+    ARRAY holds two items per entry: a key and its value, or None and a child
+    node.
+
+    """
+
+    def __init__(self, bitmap=0, array=None, edit=None):
+        self.bitmap = bitmap
+        if array is None:
+            array = []
+        self.array = array
+        self.edit = edit
+
+    def editable(self, edit):
+        """Return a node that may be modified for EDIT."""
+        if edit is not None and self.edit is edit:
+            return self
+        return BitmapNode(self.bitmap, self.array[:], edit)
+
+    def find(self, shift, keyhash, key, default):
+        bit = 1 << ((keyhash >> shift) & MASK)
+        if not self.bitmap & bit:
+            return default
+        idx = 2 * bit_count(self.bitmap & (bit - 1))
+        k = self.array[idx]
+        v = self.array[idx + 1]
+        if k is None:
+            return v.find(shift + BITS, keyhash, key, default)
+        if k == key:
+            return v
+        return default
+
+    def assoc(self, shift, keyhash, key, value, edit):
+        """Return a node with KEY mapped to VALUE and whether KEY is new."""
+        bit = 1 << ((keyhash >> shift) & MASK)
+        idx = 2 * bit_count(self.bitmap & (bit - 1))
+
+        if not self.bitmap & bit:
+            node = self.editable(edit)
+            node.bitmap |= bit
+            node.array[idx:idx] = [key, value]
+            return node, True
+
+        k = self.array[idx]
+        v = self.array[idx + 1]
+        if k is None:
+            child, added = v.assoc(shift + BITS, keyhash, key, value, edit)
+            if child is v:
+                return self, added
+            node = self.editable(edit)
+            node.array[idx + 1] = child
+            return node, added
+
+        if k == key:
+            if v is value:
+                return self, False
+            node = self.editable(edit)
+            node.array[idx + 1] = value
+            return node, False
+
+        child = create_node(shift + BITS, k, v, keyhash, key, value, edit)
+        node = self.editable(edit)
+        node.array[idx] = None
+        node.array[idx + 1] = child
+        return node, True
+
+    def without(self, shift, keyhash, key):
+        """Return a node without KEY, or None if the node would be empty."""
+        bit = 1 << ((keyhash >> shift) & MASK)
+        if not self.bitmap & bit:
+            return self
+        idx = 2 * bit_count(self.bitmap & (bit - 1))
+        k = self.array[idx]
+        v = self.array[idx + 1]
+
+        if k is None:
+            child = v.without(shift + BITS, keyhash, key)
+            if child is v:
+                return self
+            if child is not None:
+                array = self.array[:]
+                array[idx + 1] = child
+                return BitmapNode(self.bitmap, array)
+        elif not k == key:
+            return self
+
+        if self.bitmap == bit:
+            return None
+        array = self.array[:idx] + self.array[idx + 2:]
+        return BitmapNode(self.bitmap ^ bit, array)
+
+    def items(self):
+        array = self.array
+        for i in range(0, len(array), 2):
+            if array[i] is None:
+                yield from array[i + 1].items()
+            else:
+                yield (array[i], array[i + 1])
+
+
+class CollisionNode():
+    """A trie node for keys whose hashes are all KEYHASH.
+
+    ARRAY holds the keys and values in turn.
+
+    """
+
+    def __init__(self, keyhash, array, edit=None):
+        self.keyhash = keyhash
+        self.array = array
+        self.edit = edit
+
+    def index(self, key):
+        for i in range(0, len(self.array), 2):
+            if self.array[i] == key:
+                return i
+        return -1
+
+    def find(self, shift, keyhash, key, default):
+        idx = self.index(key)
+        if idx < 0:
+            return default
+        return self.array[idx + 1]
+
+    def assoc(self, shift, keyhash, key, value, edit):
+        if keyhash != self.keyhash:
+            # Put this node below a bitmap node and add KEY there.
+            bit = 1 << ((self.keyhash >> shift) & MASK)
+            node = BitmapNode(bit, [None, self], edit)
+            return node.assoc(shift, keyhash, key, value, edit)
+
+        idx = self.index(key)
+        if idx >= 0 and self.array[idx + 1] is value:
+            return self, False
+        if edit is not None and self.edit is edit:
+            node = self
+        else:
+            node = CollisionNode(self.keyhash, self.array[:], edit)
+        if idx >= 0:
+            node.array[idx + 1] = value
+            return node, False
+        node.array.extend([key, value])
+        return node, True
+
+    def without(self, shift, keyhash, key):
+        idx = self.index(key)
+        if idx < 0:
+            return self
+        if len(self.array) == 2:
+            return None
+        array = self.array[:idx] + self.array[idx + 2:]
+        return CollisionNode(self.keyhash, array)
+
+    def items(self):
+        array = self.array
+        for i in range(0, len(array), 2):
+            yield (array[i], array[i + 1])
+
+
+def create_node(shift, key1, val1, keyhash2, key2, val2, edit):
+    """Return a node holding two keys that agree on the bits below SHIFT."""
+    keyhash1 = key_hash(key1)
+    if keyhash1 == keyhash2:
+        return CollisionNode(keyhash1, [key1, val1, key2, val2], edit)
+    node = BitmapNode(edit=edit)
+    node, added = node.assoc(shift, keyhash1, key1, val1, edit)
+    node, added = node.assoc(shift, keyhash2, key2, val2, edit)
+    return node
+
+
+# Functions on tries. An empty trie is represented by None.
+def find(root, key, default=None):
+    """Return the value of KEY in the trie ROOT, or DEFAULT."""
+    if root is None:
+        return default
+    return root.find(0, key_hash(key), key, default)
+
+
+def assoc(root, items):
+    """Add ITEMS, an iterable of (key, value) pairs, to the trie ROOT.
+
+    Return the new root and the number of keys that were added.
+
+    """
+    edit = object()
+    if root is None:
+        root = BitmapNode(edit=edit)
+    added = 0
+    for key, value in items:
+        root, new = root.assoc(0, key_hash(key), key, value, edit)
+        if new:
+            added += 1
+    return root, added
+
+
+def without(root, keys):
+    """Remove KEYS from the trie ROOT.
+
+    Return the new root and the number of keys that were removed.
+
+    """
+    removed = 0
+    for key in keys:
+        if root is None:
+            break
+        new = root.without(0, key_hash(key), key)
+        if new is not root:
+            removed += 1
+        root = new
+    return root, removed
+
+
+def items(root):
+    """Iterate over the (key, value) pairs in the trie ROOT."""
+    if root is None:
+        return iter(())
+    return root.items()
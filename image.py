@@ -0,0 +1,133 @@
+"""Images of the global environment.
+
+An image is a file holding a pickled global environment, with everything
+defined in it: user functions and macros with their closures, atoms and
+data. Starting from an image restores the environment as it was when the
+image was dumped, without loading the prelude again.
+
+Builtins are stored by their name and looked up in the builtins of the
+interpreter when the image is loaded. User functions are stored without
+their Python closures, which are rebuilt when they are loaded: by the
+evaluator for functions created by EVAL, or by analyzing their body again
+for functions created by the analyzer.
+
+"""
+import pickle
+import sys
+
+import analyzer
+import mal_types as mal
+
+# The version of the image format. Increase it when the Mal types or the
+# frames of the analyzer change, so that existing images are no longer used.
+version = 4
+
+
+class ImageError(Exception):
+    """An image that cannot be loaded."""
+
+
+class Pickler(pickle.Pickler):
+    """Pickler storing builtins by name.
+
+    BUILTINS maps the names of builtins to mal_types.Builtin objects.
+
+    """
+
+    def __init__(self, file, builtins):
+        super().__init__(file, pickle.HIGHEST_PROTOCOL)
+        self.names = {builtin.fn: name for name, builtin in builtins.items()}
+
+    def persistent_id(self, obj):
+        if type(obj) is mal.Builtin:
+            if obj.fn not in self.names:
+                raise pickle.PicklingError("Unknown builtin {}".format(obj))
+            return ("builtin", self.names[obj.fn], obj.meta)
+        if obj is analyzer.UNBOUND:
+            return ("unbound",)
+        return None
+
+
+class Unpickler(pickle.Unpickler):
+    """Unpickler restoring builtins and user functions.
+
+    BUILTINS maps the names of builtins to mal_types.Builtin objects.
+    MAKE_FUNCTION is the evaluator's constructor of user functions; it is
+    called with the environment, the parameters and the body of a function
+    that was not created by the analyzer.
+
+    """
+
+    def __init__(self, file, builtins, make_function):
+        super().__init__(file)
+        self.builtins = builtins
+        self.make_function = make_function
+        # Analyzed code by body and scope, so that closures created from the
+        # same 'fn*' form share their code again.
+        self.code = {}
+
+    def persistent_load(self, pid):
+        if pid[0] == "unbound":
+            return analyzer.UNBOUND
+        name, meta = pid[1:]
+        if name not in self.builtins:
+            raise ImageError("Unknown builtin '{}'".format(name))
+        builtin = self.builtins[name]
+        if meta is not builtin.meta:
+            builtin = mal.Builtin(builtin.fn, meta, builtin.fn1, builtin.fn2)
+        return builtin
+
+    def find_class(self, module, name):
+        if module == "mal_types" and name == "Function":
+            return self.function
+        return super().find_class(module, name)
+
+    def function(self, fn, params, ast, env, is_macro, meta, code, scope):
+        """Rebuild a user function pickled by mal_types.Function."""
+        if scope is None:
+            function = self.make_function(env, params, ast)
+        else:
+            key = (id(ast), id(scope))
+            if key not in self.code:
+                self.code[key] = analyzer.function_code(params, ast,
+                                                        scope.outer)
+            code, body_scope = self.code[key]
+            function = analyzer.make_function(params, ast, env, code,
+                                              body_scope)
+        function.is_macro = is_macro
+        function.meta = meta
+        return function
+
+
+def header(analyzed):
+    return (version, sys.version, analyzed)
+
+
+def dump(env, filename, builtins, analyzed):
+    """Write ENV to the image file FILENAME.
+
+    BUILTINS maps the names of builtins to mal_types.Builtin objects.
+    ANALYZED tells whether the functions in ENV were created by the analyzer.
+
+    """
+    with open(filename, 'wb') as f:
+        pickler = Pickler(f, builtins)
+        pickler.dump(header(analyzed))
+        pickler.dump(env)
+
+
+def load(filename, builtins, make_function):
+    """Read an environment from the image file FILENAME.
+
+    Return the environment and whether its functions were created by the
+    analyzer. BUILTINS and MAKE_FUNCTION are used as described for
+    Unpickler. Raise ImageError if the image was made by another version of
+    the interpreter.
+
+    """
+    with open(filename, 'rb') as f:
+        unpickler = Unpickler(f, builtins, make_function)
+        version, python_version, analyzed = unpickler.load()
+        if (version, python_version) != header(analyzed)[:2]:
+            raise ImageError("Image made by another version")
+        return unpickler.load(), analyzed
@@ -45,17 +45,17 @@ class MalEnv():
             self.data[symbol] = value
             return value
         else:
-            return mal.Error("TypeError", "Cannot bind to non-symbol")
+            raise mal.MalError("TypeError", "Cannot bind to non-symbol")
 
     def find(self, symbol):
         if type(symbol) is mal.Symbol:
             symbol = symbol.name
-        if symbol in self.data:
-            return self
-        elif self.outer is None:
-            return None
-        else:
-            return self.outer.find(symbol)
+        env = self
+        while env is not None:
+            if symbol in env.data:
+                return env
+            env = env.outer
+        return None
 
     def get(self, symbol):
         if type(symbol) is mal.Symbol:
@@ -64,5 +64,5 @@ class MalEnv():
         if env:
             return env.data[symbol]
         else:
-            return mal.Error("SymbolError",
-                             "Symbol value is void: '{}'".format(symbol))
+            raise mal.SymbolError("SymbolError",
+                                  "Symbol value is void: '{}'".format(symbol))
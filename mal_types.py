@@ -1,25 +1,152 @@
+import itertools
+import pickle
+import sys
+import threading
+import weakref
+
+import hamt
+import vector_trie
+
+
+def meta_property():
+    """Return the property 'meta' for a class with the slot 'metadata'.
+
+    The slot is only filled for objects that have metadata, the metadata of
+    the others is nil.
+
+    """
+    def get_meta(self):
+        try:
+            return self.metadata
+        except AttributeError:
+            return NIL
+
+    def set_meta(self, meta):
+        if meta is None or meta is NIL:
+            if hasattr(self, 'metadata'):
+                del self.metadata
+        else:
+            self.metadata = meta
+
+    return property(get_meta, set_meta)
+
+
 class Nil():
     """Mal nil type."""
 
+    __slots__ = ('value',)
+
     def __init__(self):
         self.value = None
 
     def __repr__(self):
         return "nil"
 
+    def __reduce__(self):
+        # Unpickle as the one nil value.
+        return "NIL"
+
 
 # There is only one nil value
 NIL = Nil()
 
 
-class List(list):
-    """Mal list type."""
+class List():
+    """Mal list type.
+
+    Lists are persistent: 'cons' and 'rest' return new lists that share their
+    elements with the original list. The elements are kept in reverse order
+    on a Python list, the stack, of which a List uses the bottom LENGTH items.
+    Taking the rest of a list just uses one item less of the same stack, and a
+    cons onto a list that uses all of its stack pushes onto the stack. Only a
+    cons onto a list whose stack has already been pushed onto by another cons
+    needs to copy.
+
+    """
+
+    __slots__ = ('stack', 'length', 'metadata', 'expansion',
+                 'packed_location')
+
+    meta = meta_property()
 
     def __init__(self, value=[], meta=None):
-        super(List, self).__init__(value)
-        if meta is None:
-            meta = NIL
-        self.meta = meta
+        if type(value) is List:
+            self.stack = value.stack
+            self.length = value.length
+        else:
+            self.stack = list(value)
+            self.stack.reverse()
+            self.length = len(self.stack)
+        if meta is not None:
+            self.meta = meta
+        # If the list is a macro call: the macro and the call's expansion.
+        self.expansion = None
+
+    def first(self):
+        """Return the first element of the list, or nil if it is empty."""
+        if self.length == 0:
+            return NIL
+        return self.stack[self.length - 1]
+
+    def rest(self):
+        """Return a list of all elements but the first."""
+        return list_view(self.stack, max(self.length - 1, 0))
+
+    def cons(self, obj):
+        """Return a list of OBJ followed by the elements of the list."""
+        stack = self.stack
+        length = self.length
+        if len(stack) == length:
+            stack.append(obj)
+            # Another cons may have pushed onto the stack in the meantime.
+            if stack[length] is obj:
+                return list_view(stack, length + 1)
+        stack = stack[:length]
+        stack.append(obj)
+        return list_view(stack, length + 1)
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        return reversed(self.stack[:self.length])
+
+    def __getitem__(self, index):
+        length = self.length
+        if type(index) is slice:
+            start, stop, step = index.indices(length)
+            if step != 1:
+                return List(list(self)[index])
+            if stop <= start:
+                return List()
+            if stop == length:
+                return list_view(self.stack, length - start)
+            return list_view(self.stack[length - stop:length - start],
+                             stop - start)
+        if index < 0:
+            index += length
+        if index < 0 or index >= length:
+            raise IndexError("list index out of range")
+        return self.stack[length - 1 - index]
+
+    def __eq__(self, other):
+        if type(other) is LazySeq:
+            return other == self
+        if not isinstance(other, (List, Vector, list, tuple)):
+            return False
+        if len(self) != len(other):
+            return False
+        return list(self) == list(other)
+
+    __hash__ = None
+
+    def __reduce__(self):
+        # Pickle the elements only, not the rest of a shared stack or the
+        # macro expansion.
+        return reduce_sequence(self, list(self))
+
+    def __copy__(self):
+        return List(self, self.meta)
 
     def __repr__(self):
         items = [s.__repr__() for s in self]
@@ -30,14 +157,177 @@ class List(list):
         return '(' + ' '.join(items) + ')'
 
 
-class Vector(list):
-    """Mal vector type."""
+def list_view(stack, length):
+    """Return a List using the bottom LENGTH items of STACK."""
+    lst = List.__new__(List)
+    lst.stack = stack
+    lst.length = length
+    lst.expansion = None
+    return lst
+
+
+def reduce_sequence(sequence, value):
+    """Return the __reduce__ value of SEQUENCE, a List, Vector or Hash.
+
+    VALUE holds the contents of SEQUENCE, to be passed to its constructor.
+    The metadata and the location of SEQUENCE are only stored if it has them.
+
+    """
+    if sequence.meta is NIL:
+        args = (value,)
+    else:
+        args = (value, sequence.meta)
+    location = form_location(sequence)
+    if location is None:
+        return (type(sequence), args)
+    # Packed locations depend on the order in which files were read, so the
+    # location is stored unpacked.
+    return (located, (type(sequence), args, location))
+
+
+def located(cls, args, location):
+    """Return cls(*ARGS) with LOCATION, as unpickled by reduce_sequence()."""
+    sequence = cls(*args)
+    sequence.packed_location = pack_location(*location)
+    return sequence
+
+
+# The files forms have been read from. A packed location refers to a file by
+# its index in location_files.
+location_files = [None]
+location_file_indexes = {None: 0}
+
+# The number of bits of a packed location holding the column and the line.
+COLUMN_BITS = 20
+LINE_BITS = 32
+
+
+def pack_location(filename, line, column):
+    """Return the location LINE, COLUMN in FILENAME packed into an integer.
+
+    Forms read from files store their location as a single integer, which
+    takes less memory than a tuple.
+
+    """
+    index = location_file_indexes.get(filename)
+    if index is None:
+        index = location_file_indexes[filename] = len(location_files)
+        location_files.append(filename)
+    column = min(column, (1 << COLUMN_BITS) - 1)
+    line = min(line, (1 << LINE_BITS) - 1)
+    return (index << LINE_BITS | line) << COLUMN_BITS | column
+
+
+def unpack_location(packed):
+    """Return the (FILENAME, LINE, COLUMN) tuple packed into PACKED."""
+    column = packed & ((1 << COLUMN_BITS) - 1)
+    packed >>= COLUMN_BITS
+    line = packed & ((1 << LINE_BITS) - 1)
+    return (location_files[packed >> LINE_BITS], line, column)
+
+
+def form_location(form):
+    """Return the location FORM was read from, or None if it is not known.
+
+    The location is a (FILENAME, LINE, COLUMN) tuple, with FILENAME None for
+    forms that were not read from a file.
+
+    """
+    packed = getattr(form, 'packed_location', None)
+    if packed is None:
+        return None
+    return unpack_location(packed)
+
+
+class Vector():
+    """Mal vector type.
+
+    Vectors are persistent: 'conj' returns a new vector that shares all but
+    the last few elements with the original one. The elements are stored in
+    a trie with a tail, see vector_trie.py.
+
+    """
+
+    __slots__ = ('count', 'shift', 'root', 'tail', 'metadata',
+                 'packed_location')
+
+    meta = meta_property()
 
     def __init__(self, value=None, meta=None):
-        super(Vector, self).__init__(value)
-        if meta is None:
-            meta = NIL
-        self.meta = meta
+        if type(value) is Vector:
+            self.count = value.count
+            self.shift = value.shift
+            self.root = value.root
+            self.tail = value.tail
+        else:
+            if value is None:
+                value = []
+            (self.count, self.shift,
+             self.root, self.tail) = vector_trie.from_list(list(value))
+        if meta is not None:
+            self.meta = meta
+
+    def conj(self, items):
+        """Return a vector with ITEMS added at the end."""
+        count = self.count
+        shift = self.shift
+        root = self.root
+        tail = self.tail
+        for item in items:
+            tail_length = count - vector_trie.tail_offset(count)
+            if tail_length == vector_trie.WIDTH:
+                root, shift = vector_trie.push_tail(count, shift, root, tail)
+                tail = [item]
+            elif len(tail) == tail_length:
+                tail.append(item)
+                # Another vector may have added to the tail in the meantime.
+                if tail[tail_length] is not item:
+                    tail = tail[:tail_length] + [item]
+            else:
+                tail = tail[:tail_length] + [item]
+            count += 1
+
+        new = Vector.__new__(Vector)
+        new.count = count
+        new.shift = shift
+        new.root = root
+        new.tail = tail
+        return new
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return vector_trie.elements(self.count, self.shift,
+                                    self.root, self.tail)
+
+    def __getitem__(self, index):
+        if type(index) is slice:
+            return Vector([self[i] for i in range(*index.indices(self.count))])
+        if index < 0:
+            index += self.count
+        if index < 0 or index >= self.count:
+            raise IndexError("vector index out of range")
+        return vector_trie.nth(self.count, self.shift, self.root, self.tail,
+                               index)
+
+    def __eq__(self, other):
+        if type(other) is LazySeq:
+            return other == self
+        if not isinstance(other, (List, Vector, list, tuple)):
+            return False
+        if len(self) != len(other):
+            return False
+        return list(self) == list(other)
+
+    __hash__ = None
+
+    def __reduce__(self):
+        # Pickle the elements only, not the rest of a shared tail.
+        return reduce_sequence(self, list(self))
+
+    def __copy__(self):
+        return Vector(self, self.meta)
 
     def __repr__(self):
         items = [s.__repr__() for s in self]
@@ -48,16 +338,90 @@ class Vector(list):
         return '[' + ' '.join(items) + ']'
 
 
-class Hash(dict):
-    """Mal hash table type."""
+class Hash():
+    """Mal hash table type.
+
+    Hash tables are persistent: 'assoc' and 'dissoc' return new hash tables
+    that share most of their structure with the original one. The keys and
+    values are stored in a hash array mapped trie, see hamt.py.
+
+    """
+
+    __slots__ = ('root', 'count', 'metadata', 'packed_location')
+
+    meta = meta_property()
 
     def __init__(self, value=None, meta=None):
-        if value is None:
-            value = {}
-        super(Hash, self).__init__(value)
-        if meta is None:
-            meta = NIL
-        self.meta = meta
+        if type(value) is Hash:
+            self.root = value.root
+            self.count = value.count
+        elif value:
+            self.root, self.count = hamt.assoc(None, value.items())
+        else:
+            self.root = None
+            self.count = 0
+        if meta is not None:
+            self.meta = meta
+
+    def assoc(self, items):
+        """Return a hash table with the (key, value) pairs in ITEMS added."""
+        new = Hash()
+        new.root, added = hamt.assoc(self.root, items)
+        new.count = self.count + added
+        return new
+
+    def dissoc(self, keys):
+        """Return a hash table without KEYS."""
+        new = Hash()
+        new.root, removed = hamt.without(self.root, keys)
+        new.count = self.count - removed
+        return new
+
+    def get(self, key, default=None):
+        return hamt.find(self.root, key, default)
+
+    def keys(self):
+        return [key for key, value in self.items()]
+
+    def values(self):
+        return [value for key, value in self.items()]
+
+    def items(self):
+        return hamt.items(self.root)
+
+    def __getitem__(self, key):
+        value = hamt.find(self.root, key, hamt.NOT_FOUND)
+        if value is hamt.NOT_FOUND:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return (hamt.find(self.root, key, hamt.NOT_FOUND) is not
+                hamt.NOT_FOUND)
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return (key for key, value in self.items())
+
+    def __eq__(self, other):
+        if not isinstance(other, (Hash, dict)):
+            return False
+        if len(self) != len(other):
+            return False
+        for key, value in self.items():
+            if key not in other or not other[key] == value:
+                return False
+        return True
+
+    __hash__ = None
+
+    def __reduce__(self):
+        return reduce_sequence(self, dict(self.items()))
+
+    def __copy__(self):
+        return Hash(self, self.meta)
 
     def __repr__(self):
         str_list = []
@@ -72,16 +436,21 @@ class Hash(dict):
         return '{' + ' '.join(str_list) + '}'
 
 
-class Error():
+class MalError(Exception):
     """Mal error type.
 
-    Errors are returned as normal values, but they halt evaluation and are
-    immediately returned to the top level.
+    Errors are raised as Python exceptions, which halt evaluation up to the
+    nearest 'try*' or the top level. ERROR names the kind of error, such as
+    "ArgError", and DESCR describes it. LOCATION is the location of the
+    innermost form the error is known to have occurred in, as recorded by the
+    reader, or None.
     """
 
-    def __init__(self, error_type, descr):
+    def __init__(self, error_type, descr, location=None):
+        super().__init__(descr)
         self.error = error_type
         self.descr = descr
+        self.location = location
 
     def __repr__(self):
         return self.descr
@@ -89,21 +458,48 @@ class Error():
     def __eq__(self, other):
         if type(self) != type(other):
             return False
-        return ((self.error_type == other.error_type) and
+        return ((self.error == other.error) and
                 self.descr == other.descr)
 
+    __hash__ = Exception.__hash__
+
+
+def locate(error, form):
+    """Give ERROR the location of FORM, unless it has a location already."""
+    if error.location is None:
+        error.location = form_location(form)
+
+
+class ReaderError(MalError):
+    """Error in the text of a form, raised by the reader."""
+
+
+class SymbolError(MalError):
+    """Error raised when a symbol is looked up that is not defined."""
 
-class HandledError(Error):
+
+class HandledError():
     """Mal handled error type.
 
-    Errors handled by 'try*/catch*' are passed as handled errors, so that they
-    do not halt evaluation.
+    An error caught by 'try*/catch*' is bound to the symbol of the 'catch*'
+    clause as a handled error, a normal value with the fields of the error.
     """
 
+    __slots__ = ('error', 'descr')
+
     def __init__(self, error_object):
         self.error = error_object.error
         self.descr = error_object.descr
 
+    def __repr__(self):
+        return self.descr
+
+    def __eq__(self, other):
+        if type(self) != type(other):
+            return False
+        return ((self.error == other.error) and
+                self.descr == other.descr)
+
 
 # class String():
 #     """Mal string type."""
@@ -127,46 +523,121 @@ class HandledError(Error):
 
 
 class Symbol():
-    """Mal symbol type."""
+    """Mal symbol type.
 
-    def __init__(self, name, meta=None):
-        self.name = name
-        if meta is None:
-            meta = NIL
-        self.meta = meta
+    Symbols without metadata are interned: creating a symbol with the name of
+    an existing one returns the existing symbol, so that symbols can be
+    compared with 'is'. Their names are interned as Python strings as well,
+    which speeds up looking them up in environments. A symbol is only
+    interned as long as it is in use, so that symbols made by gensym do not
+    accumulate.
+
+    """
+
+    __slots__ = ('name', 'name_hash', 'metadata', '__weakref__')
+
+    meta = meta_property()
+
+    # Interned symbols by name.
+    interned = weakref.WeakValueDictionary()
+
+    def __new__(cls, name, meta=None):
+        if meta is None or meta is NIL:
+            symbol = Symbol.interned.get(name)
+            if symbol is None:
+                symbol = Symbol.interned[name] = Symbol.create(name, NIL)
+            return symbol
+        return Symbol.create(name, meta)
+
+    @staticmethod
+    def create(name, meta):
+        symbol = object.__new__(Symbol)
+        symbol.name = sys.intern(name)
+        symbol.name_hash = hash(symbol.name)
+        if meta is not NIL:
+            symbol.metadata = meta
+        return symbol
 
     def __repr__(self):
         return self.name
 
     def __eq__(self, other):
+        if self is other:
+            return True
         if type(self) != type(other):
             return False
         return (self.name == other.name)
 
+    def __hash__(self):
+        return self.name_hash
+
+    def __copy__(self):
+        # A copy is not interned, so that its metadata can be changed.
+        return Symbol.create(self.name, self.meta)
+
+    def __reduce__(self):
+        if self.meta is NIL:
+            return (Symbol, (self.name,))
+        return (Symbol, (self.name, self.meta))
+
 
 class Keyword():
-    """Mal keyword type. """
+    """Mal keyword type.
+
+    Keywords without metadata are interned, like symbols.
+
+    """
 
-    def __init__(self, name, meta=None):
+    __slots__ = ('name', 'name_hash', 'metadata', '__weakref__')
+
+    meta = meta_property()
+
+    # Interned keywords by name.
+    interned = weakref.WeakValueDictionary()
+
+    def __new__(cls, name, meta=None):
         """Create a keyword.
 
         Keywords are strings that start with a colon. If NAME does not start
         with a colon, one is added.
         """
+        if meta is None or meta is NIL:
+            keyword = Keyword.interned.get(name)
+            if keyword is None:
+                keyword = Keyword.create(name, NIL)
+                keyword = Keyword.interned.setdefault(keyword.name, keyword)
+                Keyword.interned[name] = keyword
+            return keyword
+        return Keyword.create(name, meta)
+
+    @staticmethod
+    def create(name, meta):
         if name[0] != ":":
             name = ':' + name
-        self.name = name
-        if meta is None:
-            meta = NIL
-        self.meta = meta
+        keyword = object.__new__(Keyword)
+        keyword.name = sys.intern(name)
+        keyword.name_hash = hash(keyword.name)
+        if meta is not NIL:
+            keyword.metadata = meta
+        return keyword
 
     def __eq__(self, other):
+        if self is other:
+            return True
         if type(self) != type(other):
             return False
         return (self.name == other.name)
 
     def __hash__(self):
-        return hash(self.name)
+        return self.name_hash
+
+    def __copy__(self):
+        return Keyword.create(self.name, self.meta)
+
+    def __reduce__(self):
+        if self.meta is NIL:
+            return (Keyword, (self.name,))
+        return (Keyword, (self.name, self.meta))
 
     def __repr__(self):
         return self.name
@@ -176,13 +647,24 @@ class Keyword():
 
 
 class Builtin():
-    """Mal builtin function type."""
+    """Mal builtin function type.
+
+    FN1 and FN2 are versions of FN for calls with exactly one or two
+    arguments. Callers that know the number of arguments use them to avoid
+    packing the arguments into a tuple. They default to FN.
+
+    """
+
+    __slots__ = ('fn', 'fn1', 'fn2', 'metadata')
+
+    meta = meta_property()
 
-    def __init__(self, fn=None, meta=None):
+    def __init__(self, fn=None, meta=None, fn1=None, fn2=None):
         self.fn = fn
-        if meta is None:
-            meta = NIL
-        self.meta = meta
+        self.fn1 = fn if fn1 is None else fn1
+        self.fn2 = fn if fn2 is None else fn2
+        if meta is not None:
+            self.meta = meta
 
     def __repr__(self):
         return "#<Builtin function at {}>".format(hex(id(self)))
@@ -191,16 +673,24 @@ class Builtin():
 class Function():
     """Mal function type."""
 
+    __slots__ = ('fn', 'params', 'ast', 'env', 'is_macro', 'code', 'scope',
+                 'metadata')
+
+    meta = meta_property()
+
     def __init__(self, fn=None, params=None, ast=None, env=None,
-                 is_macro=False, meta=None):
+                 is_macro=False, meta=None, code=None, scope=None):
         self.fn = fn
         self.params = params
         self.ast = ast
         self.env = env
         self.is_macro = is_macro
-        if meta is None:
-            meta = NIL
-        self.meta = meta
+        # The analyzed body and its scope, if the function was created by the
+        # analyzer.
+        self.code = code
+        self.scope = scope
+        if meta is not None:
+            self.meta = meta
 
     def __repr__(self):
         if self.is_macro:
@@ -209,22 +699,44 @@ class Function():
             fn_type = "function"
         return "#<User {} at {}>".format(fn_type, hex(id(self)))
 
+    def __reduce__(self):
+        # FN and CODE are Python closures, which cannot be pickled. They are
+        # rebuilt by image.Unpickler.
+        return (Function, (None, self.params, self.ast, self.env,
+                           self.is_macro, self.meta, None, self.scope))
+
+    def __copy__(self):
+        return Function(self.fn, self.params, self.ast, self.env,
+                        self.is_macro, self.meta, self.code, self.scope)
+
 
 class Boolean():
-    """Mal boolean type."""
+    """Mal boolean type.
+
+    There are only two booleans, TRUE and FALSE, so they can be compared
+    with 'is'. Boolean(VALUE) returns one of them.
+
+    """
 
-    def __init__(self, value=False):
+    __slots__ = ('value',)
+
+    def __new__(cls, value=False):
+        if value is True:
+            return TRUE
         # We check for False with 'is', because in Python, 0 is equal to, but
         # not identical with, False, while in Mal, 0 counts as true.
-        if value in [[], "", Vector([]), NIL, {}] or value is False:
-            self.value = False
-        else:
-            self.value = True
+        if value is False or value in false_values:
+            return FALSE
+        return TRUE
 
     def __eq__(self, other):
-        if type(self) != type(other):
-            return False
-        return (self.value is other.value)
+        return self is other
+
+    def __reduce__(self):
+        # Unpickle as the same boolean.
+        if self.value:
+            return "TRUE"
+        return "FALSE"
 
     def __repr__(self):
         if self.value is True:
@@ -233,8 +745,31 @@ class Boolean():
             return "false"
 
 
+TRUE = object.__new__(Boolean)
+TRUE.value = True
+FALSE = object.__new__(Boolean)
+FALSE.value = False
+
+# Values other than False that Boolean() turns into FALSE.
+false_values = ([], "", Vector([]), NIL, {})
+
+
+# Held while the value of an atom is changed, so that compare_and_set() is
+# atomic. Changes are quick, so a single lock is shared by all atoms.
+atom_lock = threading.Lock()
+
+
 class Atom():
-    """Mal atom type."""
+    """Mal atom type.
+
+    The value of an atom can be changed safely by several threads: set()
+    and compare_and_set() are atomic.
+
+    """
+
+    __slots__ = ('value', 'metadata')
+
+    meta = meta_property()
 
     def __init__(self, value=None):
         if value is None:
@@ -242,10 +777,263 @@ class Atom():
         self.value = value
 
     def set(self, value):
-        self.value = value
+        with atom_lock:
+            self.value = value
+
+    def compare_and_set(self, old, new):
+        """Set the value to NEW if it is OLD, and return True if it was."""
+        with atom_lock:
+            if self.value is not old:
+                return False
+            self.value = new
+            return True
 
     def __repr__(self):
         return ('(atom ' + self.value.__repr__() + ')')
 
     def __str__(self):
         return ('(atom ' + self.value.__str__() + ')')
+
+
+class Future():
+    """Mal future type.
+
+    FUTURE is the concurrent.futures.Future computing the value of the
+    future in another thread.
+
+    """
+
+    __slots__ = ('future', 'metadata')
+
+    meta = meta_property()
+
+    def __init__(self, future):
+        self.future = future
+
+    def __repr__(self):
+        if self.future.done():
+            return "#<future done>"
+        return "#<future pending>"
+
+    def __copy__(self):
+        future = Future(self.future)
+        future.meta = self.meta
+        return future
+
+    def __reduce__(self):
+        raise pickle.PicklingError("Cannot pickle a future")
+
+
+class LazySeq():
+    """Mal lazy sequence type.
+
+    The elements of a lazy sequence are only computed when they are needed.
+    They come from one of these sources:
+
+    MAKE_ITER is a function returning an iterator over the elements. THUNK
+    is a function returning a list, vector, lazy sequence or nil with the
+    elements of the sequence, as made by 'lazy-seq'. ITERATOR is an iterator
+    the remaining elements are taken from, for the rest of a sequence made
+    by MAKE_ITER.
+
+    realize() computes the first element and the rest of the sequence, the
+    CELL, once and keeps them. Iterating over the sequence realizes its
+    cells as it goes, so that each element is computed only once, however
+    many times the sequence is walked.
+
+    The builtins that reduce a sequence to a value, such as count and
+    reduce, and the lazy sequences built from another one walk it with
+    stream() instead, which keeps none of the cells it realizes, so that
+    they run in constant memory while the sequence is referred to. Elements
+    not realized before are therefore computed again by each such walk.
+
+    """
+
+    __slots__ = ('make_iter', 'thunk', 'iterator', 'cell', 'metadata')
+
+    meta = meta_property()
+
+    def __init__(self, make_iter=None, thunk=None, iterator=None):
+        self.make_iter = make_iter
+        self.thunk = thunk
+        self.iterator = iterator
+        self.cell = None
+
+    def realize(self):
+        """Return the cell of the sequence: EMPTY or a (FIRST, REST) pair.
+
+        REST is a list, a vector or a lazy sequence.
+
+        """
+        if self.cell is None:
+            if self.thunk is not None:
+                cell = sequence_cell(self.thunk())
+            elif self.iterator is not None:
+                cell = iterator_cell(self.iterator)
+            else:
+                cell = iterator_cell(self.make_iter())
+            self.cell = cell
+            self.make_iter = self.thunk = self.iterator = None
+        return self.cell
+
+    def __iter__(self):
+        seq = self
+        while type(seq) is LazySeq:
+            cell = seq.realize()
+            if cell is EMPTY:
+                return
+            yield cell[0]
+            seq = cell[1]
+        yield from seq
+
+    def stream(self):
+        """Iterate over the elements, keeping none of the cells realized.
+
+        Cells that are already realized are walked. The elements after
+        them are computed without being kept, except those taken from an
+        ITERATOR, which cannot be computed again.
+
+        """
+        seq = self
+        while type(seq) is LazySeq:
+            cell = seq.cell
+            if cell is None:
+                if seq.make_iter is not None:
+                    yield from seq.make_iter()
+                    return
+                if seq.thunk is not None:
+                    seq = seq.thunk()
+                    continue
+                cell = seq.realize()
+            if cell is EMPTY:
+                return
+            yield cell[0]
+            seq = cell[1]
+        if seq is NIL:
+            return
+        if not isinstance(seq, (List, Vector)):
+            raise MalError("TypeError",
+                           "Expected sequence, received {}".format(seq))
+        yield from seq
+
+    def __eq__(self, other):
+        if not isinstance(other, (List, Vector, LazySeq, list, tuple)):
+            return False
+        end = object()
+        for a, b in itertools.zip_longest(self, other, fillvalue=end):
+            if a is end or b is end or a != b:
+                return False
+        return True
+
+    __hash__ = None
+
+    def __copy__(self):
+        # The copy shares the cells of the sequence.
+        lazy = LazySeq(thunk=lambda: self)
+        lazy.meta = self.meta
+        return lazy
+
+    def __reduce__(self):
+        raise pickle.PicklingError("Cannot pickle a lazy sequence")
+
+    def __repr__(self):
+        items = [s.__repr__() for s in self]
+        return '(' + ' '.join(items) + ')'
+
+    def __str__(self):
+        items = [str(s) for s in self]
+        return '(' + ' '.join(items) + ')'
+
+
+# The cell of an empty lazy sequence.
+EMPTY = ()
+
+
+def lazy_cons(obj, seq):
+    """Return a lazy sequence of OBJ followed by the elements of SEQ."""
+    lazy = LazySeq()
+    lazy.cell = (obj, seq)
+    return lazy
+
+
+def sequence_cell(seq):
+    """Return the cell of a lazy sequence with the elements of SEQ."""
+    if type(seq) is LazySeq:
+        return seq.realize()
+    if seq is NIL or (isinstance(seq, (List, Vector)) and len(seq) == 0):
+        return EMPTY
+    if type(seq) is List:
+        return (seq.first(), seq.rest())
+    if type(seq) is Vector:
+        return (seq[0], List(seq).rest())
+    raise MalError("TypeError", "Expected sequence, received {}".format(seq))
+
+
+def iterator_cell(iterator):
+    """Return the cell of a lazy sequence taking its elements from ITERATOR."""
+    for obj in iterator:
+        return (obj, LazySeq(iterator=iterator))
+    return EMPTY
+
+
+class Transducer():
+    """Mal transducer type: a transformation of the elements of a sequence.
+
+    XFORM is a Python function taking an iterator over elements and
+    returning an iterator over the transformed elements. The elements are
+    transformed one at a time as they are taken from the returned iterator,
+    so that transducers composed by chaining their functions run in a single
+    pass over the input.
+
+    """
+
+    __slots__ = ('xform', 'metadata')
+
+    meta = meta_property()
+
+    def __init__(self, xform):
+        self.xform = xform
+
+    def __repr__(self):
+        return "#<transducer>"
+
+    def __copy__(self):
+        transducer = Transducer(self.xform)
+        transducer.meta = self.meta
+        return transducer
+
+    def __reduce__(self):
+        raise pickle.PicklingError("Cannot pickle a transducer")
+
+
+class File():
+    """Mal file type: a file opened by 'open'.
+
+    FILE is the Python file object, NAME the name the file was opened with.
+
+    """
+
+    __slots__ = ('file', 'name', 'metadata')
+
+    meta = meta_property()
+
+    def __init__(self, file, name):
+        self.file = file
+        self.name = name
+
+    def is_binary(self):
+        return 'b' in self.file.mode
+
+    def __repr__(self):
+        if self.file.closed:
+            return "#<closed file {}>".format(self.name)
+        return "#<file {}>".format(self.name)
+
+    def __copy__(self):
+        # The copy shares the Python file object.
+        f = File(self.file, self.name)
+        f.meta = self.meta
+        return f
+
+    def __reduce__(self):
+        raise pickle.PicklingError("Cannot pickle a file")
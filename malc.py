@@ -0,0 +1,147 @@
+"""Cache of the forms read from Mal files.
+
+When a Mal file is loaded, the forms read from it are also written to a
+cache file next to it, with the extension .malc. The next time the file is
+loaded, the forms are read from the cache file instead, as long as the file
+has not been changed since and was cached by the same version of the
+interpreter.
+
+A cache file holds a sequence of pickles: first the key of the file it was
+made from, then lists of up to batch_size top-level forms. Only forms are
+cached, not analyzed code: the analyzer turns forms into Python closures,
+which cannot be pickled. Forms may be pickled after they have been evaluated,
+since the macro expansions cached in them are not pickled.
+
+"""
+import os
+import pickle
+import sys
+import tempfile
+
+import core
+import reader
+
+# The version of the cache format. Increase it when the reader or the Mal
+# types change, so that existing cache files are no longer used.
+version = 4
+
+# If False, cache files are neither read nor written.
+enabled = True
+
+# The number of forms pickled together. Pickling forms together stores the
+# names of their types only once, but all of them are in memory at once.
+batch_size = 100
+
+
+def cache_name(filename):
+    """Return the name of the cache file for FILENAME."""
+    return filename + 'c'
+
+
+def file_key(filename):
+    """Return the key identifying the current contents of FILENAME."""
+    stat = os.stat(filename)
+    return (version, sys.version, os.path.abspath(filename),
+            stat.st_mtime_ns, stat.st_size)
+
+
+def read_file(filename):
+    """Return an iterator over the forms in the Mal file FILENAME.
+
+    The forms are read from the cache file if it is up to date, otherwise
+    from FILENAME, in which case the cache file is written as well. Raise
+    FileNotFoundError if FILENAME does not exist.
+
+    """
+    source = open(filename, 'r', encoding=core.file_encoding,
+                  errors=core.file_errors)
+    if not enabled:
+        return read_source(source, None, None)
+
+    key = file_key(filename)
+    cache = open_cache(cache_name(filename), key)
+    if cache is not None:
+        source.close()
+        return read_cache(cache)
+    return read_source(source, cache_name(filename), key)
+
+
+def open_cache(name, key):
+    """Open the cache file NAME and read its key.
+
+    Return the open file if its key is KEY, otherwise None.
+
+    """
+    try:
+        cache = open(name, 'rb')
+    except OSError:
+        return None
+    try:
+        if pickle.load(cache) == key:
+            return cache
+    except Exception:  # Cache files from other versions may fail to load.
+        pass
+    cache.close()
+    return None
+
+
+def read_cache(cache):
+    """Iterate over the forms in the open cache file CACHE."""
+    with cache:
+        while True:
+            try:
+                batch = pickle.load(cache)
+            except EOFError:
+                return
+            yield from batch
+
+
+def read_source(source, name, key):
+    """Iterate over the forms in the open Mal file SOURCE.
+
+    If NAME is not None, also write the forms to the cache file NAME with KEY.
+    The cache file is only created once all of SOURCE has been read without
+    errors.
+
+    """
+    with source:
+        cache = None
+        if name is not None:
+            cache = create_cache(name, key, os.fstat(source.fileno()).st_mode)
+        if cache is None:
+            yield from reader.read_stream(source)
+            return
+
+        try:
+            batch = []
+            for form in reader.read_stream(source):
+                batch.append(form)
+                if len(batch) == batch_size:
+                    pickle.dump(batch, cache, pickle.HIGHEST_PROTOCOL)
+                    batch = []
+                yield form
+            pickle.dump(batch, cache, pickle.HIGHEST_PROTOCOL)
+            cache.close()
+            os.replace(cache.name, name)
+        finally:
+            if not cache.closed:
+                cache.close()
+                os.remove(cache.name)
+
+
+def create_cache(name, key, mode):
+    """Return a temporary file for the cache file NAME, with KEY written to it.
+
+    The file gets the permissions in MODE. Return None if the file cannot be
+    created.
+
+    """
+    try:
+        cache = tempfile.NamedTemporaryFile(
+            'wb', dir=os.path.dirname(name) or '.',
+            prefix=os.path.basename(name), delete=False)
+        os.chmod(cache.name, mode & 0o666)
+    except OSError:
+        return None
+    pickle.dump(key, cache, pickle.HIGHEST_PROTOCOL)
+    return cache
@@ -0,0 +1,224 @@
+"""Parallel evaluation in worker processes.
+
+The builtins pmap and pcall call Mal functions in a pool of worker processes,
+so that CPU-bound work is not limited to one core by the GIL. Functions,
+their environments, their arguments and their values are sent to and from
+the workers pickled as in images, by image.Pickler: builtins by name, and
+user functions without their Python closures, which are rebuilt by the
+worker.
+
+pmap pickles its function once, with its whole environment, and sends the
+arguments in chunks, so that the cost of sending and unpickling the function
+is shared by many calls. Functions run in copies of their environment:
+definitions and changes to atoms made by a worker are not seen by the caller.
+Globals that cannot be pickled, such as lazy sequences and open files, are
+left out of the copy of the global environment, unless the function refers
+to them by name.
+
+"""
+import concurrent.futures
+import io
+import os
+import pickle
+
+import image
+import mal_env as menv
+import mal_types as mal
+
+# The number of worker processes, or None for the number of CPUs.
+workers = None
+
+# The number of chunks per worker pmap splits its arguments into.
+chunks_per_worker = 4
+
+# The pool of worker processes, started by the first parallel call, and the
+# arguments of its initializer.
+pool = None
+pool_args = None
+
+# Set by the interpreter, in the worker processes as well: the builtins by
+# name, the evaluator's constructor of user functions, and a function making
+# an environment the global environment used by 'eval'.
+builtins = {}
+make_function = None
+set_global_env = None
+
+
+def start(initializer, initargs):
+    """Return the pool, starting it if needed.
+
+    Each worker process is set up by calling INITIALIZER with INITARGS. A
+    running pool with other INITARGS is shut down and replaced.
+
+    """
+    global pool
+    global pool_args
+
+    if pool is not None and pool_args != initargs:
+        shutdown()
+    if pool is None:
+        pool = concurrent.futures.ProcessPoolExecutor(
+            workers, initializer=initializer, initargs=initargs)
+        pool_args = initargs
+    return pool
+
+
+def shutdown():
+    """Stop the worker processes."""
+    global pool
+
+    if pool is not None:
+        pool.shutdown()
+        pool = None
+
+
+def pmap(fn, items, pool):
+    """Return the list of the values of FN on ITEMS, computed in POOL."""
+    if len(items) == 0:
+        return mal.List([])
+    payload = dumps(fn)
+    chunks = (workers or os.cpu_count() or 1) * chunks_per_worker
+    size = -(-len(items) // chunks)
+    futures = [pool.submit(run_chunk, payload,
+                           dumps([[item] for item in items[i:i + size]]))
+               for i in range(0, len(items), size)]
+    return mal.List(collect(futures))
+
+
+def pcall(fns, pool):
+    """Return the list of the values of the functions FNS called in POOL.
+
+    The functions are called without arguments, each in its own task.
+
+    """
+    futures = [pool.submit(run_chunk, dumps(fn), dumps([[]])) for fn in fns]
+    return mal.List(collect(futures))
+
+
+def collect(futures):
+    """Return the values computed by FUTURES, in order.
+
+    An error in a worker is raised again, once all FUTURES are done.
+
+    """
+    values = []
+    error = None
+    for future in futures:
+        try:
+            result = loads(future.result())
+        except concurrent.futures.process.BrokenProcessPool as err:
+            shutdown()
+            result = ("error", "ParallelError",
+                      "Worker process died: {}".format(err), None)
+        if result[0] == "error":
+            if error is None:
+                error = mal.MalError(*result[1:])
+        else:
+            values.extend(result[1])
+    if error is not None:
+        raise error
+    return values
+
+
+def run_chunk(payload, args_payload):
+    """Call the function in PAYLOAD with each argument list in ARGS_PAYLOAD.
+
+    Run in a worker process. Return the pickled values, or the pickled
+    error that stopped the calls.
+
+    """
+    fn = loads(payload)
+    arglists = loads(args_payload)
+    if type(fn) is mal.Function:
+        set_global_env(global_env(fn.env))
+    try:
+        return dumps(("values", [fn.fn(*args) for args in arglists]))
+    except mal.MalError as err:
+        return dumps(("error", err.error, err.descr, err.location))
+    except RecursionError:
+        return dumps(("error", "RecursionError",
+                      "Maximum recursion depth exceeded", None))
+
+
+def global_env(env):
+    """Return the global environment ENV is nested in."""
+    if type(env) is list:  # a frame of the analyzer
+        env = env[1]
+    while env.outer is not None:
+        env = env.outer
+    return env
+
+
+class Pickler(image.Pickler):
+    """Pickler of the objects sent to the workers.
+
+    The global environment is pickled without the globals that cannot be
+    pickled, except those named in NEEDED, which raise an error. If ENV is
+    given, it is pickled as a reference, to test whether the globals in ENV
+    can be pickled on their own.
+
+    """
+
+    def __init__(self, file, builtins, needed=(), env=None):
+        super().__init__(file, builtins)
+        self.builtins = builtins
+        self.needed = needed
+        self.env = env
+
+    def persistent_id(self, obj):
+        if obj is self.env and obj is not None:
+            return ("env",)
+        return super().persistent_id(obj)
+
+    def reducer_override(self, obj):
+        if type(obj) is menv.MalEnv and obj.outer is None:
+            # The globals are pickled as the state of the environment, after
+            # it is memoized, since functions in them refer to it.
+            return (menv.MalEnv, (),
+                    {'outer': None, 'data': self.picklable_globals(obj)})
+        return NotImplemented
+
+    def picklable_globals(self, env):
+        """Return the globals of ENV that can be pickled, by name."""
+        data = {}
+        for name, value in env.data.items():
+            try:
+                Pickler(io.BytesIO(), self.builtins, env=env).dump(value)
+            except (pickle.PicklingError, TypeError, AttributeError) as err:
+                if name in self.needed:
+                    raise pickle.PicklingError("'{}': {}".format(name, err))
+                continue
+            data[name] = value
+        return data
+
+
+def referenced_names(obj):
+    """Return the names of the symbols in the body of the function OBJ."""
+    names = set()
+    if type(obj) is mal.Function:
+        forms = [obj.ast]
+        while forms:
+            form = forms.pop()
+            if type(form) is mal.Symbol:
+                names.add(form.name)
+            elif isinstance(form, (mal.List, mal.Vector)):
+                forms.extend(form)
+            elif type(form) is mal.Hash:
+                forms.extend(form.values())
+    return names
+
+
+def dumps(obj):
+    """Return OBJ pickled by Pickler."""
+    f = io.BytesIO()
+    try:
+        Pickler(f, builtins, referenced_names(obj)).dump(obj)
+    except (pickle.PicklingError, TypeError, AttributeError) as err:
+        raise mal.MalError("ParallelError",
+                           "Cannot send to worker: {}".format(err))
+    return f.getvalue()
+
+
+def loads(data):
+    """Return the object pickled in DATA by dumps()."""
+    return image.Unpickler(io.BytesIO(data), builtins, make_function).load()
@@ -1,11 +1,23 @@
 import mal_types as mal
 
 
+def location_str(location):
+    """Return LOCATION, a (FILENAME, LINE, COLUMN) tuple, as a string."""
+    filename, line, column = location
+    if filename is None:
+        filename = "<string>"
+    return "{}:{}:{}".format(filename, line, column)
+
+
 def pr_str(obj, print_readably=False):
     if type(obj) is mal.List:
         str_list = [pr_str(s, print_readably) for s in obj]
         return '(' + ' '.join(str_list) + ')'
 
+    elif type(obj) is mal.LazySeq:
+        str_list = [pr_str(s, print_readably) for s in obj]
+        return '(' + ' '.join(str_list) + ')'
+
     elif type(obj) is mal.Vector:
         str_list = [pr_str(s, print_readably) for s in obj]
         return '[' + ' '.join(str_list) + ']'
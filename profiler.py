@@ -0,0 +1,200 @@
+"""Sampling profiler for Mal programs.
+
+While the profiler runs, a timer interrupts the program at regular intervals
+of CPU time and records which Mal functions and builtins are on the stack.
+The Mal functions are found in the Python stack through the frames of the
+evaluators: each evaluator registers the Python code that runs Mal functions
+in 'frame_functions', together with a function returning the Mal function a
+frame of that code is running.
+
+Builtins are recorded by wrapping them while the profiler runs. The wrappers
+also count the calls of builtins. Calls of Mal functions are counted by the
+evaluators, which call count() when a profiler is running.
+
+In the --stack evaluator Mal functions do not run in Python frames of their
+own, so only the builtins they call appear on the stack. Since apply and map
+are wrapped, they are not run on the stack while the profiler runs.
+
+Functions are reported by the name they were given with 'def!' in the global
+environment, or as anonymous functions by their parameters, followed by the
+location of their body if it was read from a file.
+
+"""
+import collections
+import signal
+
+import mal_types as mal
+import printer
+
+# The running profiler, or None.
+current = None
+
+# Python code objects that run Mal functions, mapped to functions returning
+# the Mal function run by a frame of the code, or None.
+frame_functions = {}
+
+
+class Profiler():
+    """Profiler of the functions in the global environment ENV.
+
+    INTERVAL is the time between samples, in seconds.
+
+    """
+
+    def __init__(self, env, interval=0.001):
+        self.env = env
+        self.interval = interval
+        # The number of samples by stack. A stack is a tuple of keys, the
+        # outermost first: names of builtins, and the ids of the bodies of
+        # Mal functions.
+        self.stacks = collections.Counter()
+        self.calls = collections.Counter()
+        # Mal functions by the id of their body, which is shared by all
+        # closures created from the same 'fn*' form.
+        self.functions = {}
+        self.wrapped = []
+
+    def start(self):
+        global current
+
+        for name, value in self.env.data.items():
+            if type(value) is mal.Builtin:
+                self.wrap(name, value)
+        current = self
+        signal.signal(signal.SIGPROF, self.sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def stop(self):
+        global current
+
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        signal.signal(signal.SIGPROF, signal.SIG_DFL)
+        current = None
+        for builtin, fns in self.wrapped:
+            builtin.fn, builtin.fn1, builtin.fn2 = fns
+        self.wrapped = []
+
+    def wrap(self, name, builtin):
+        """Replace the Python functions of BUILTIN with counting wrappers."""
+        self.wrapped.append((builtin, (builtin.fn, builtin.fn1, builtin.fn2)))
+        builtin.fn = profiled_builtin(self.calls, name, builtin.fn)
+        builtin.fn1 = profiled_builtin(self.calls, name, builtin.fn1)
+        builtin.fn2 = profiled_builtin(self.calls, name, builtin.fn2)
+
+    def count(self, fn):
+        """Count a call of the Mal function FN."""
+        key = id(fn.ast)
+        self.calls[key] += 1
+        if key not in self.functions:
+            self.functions[key] = fn
+
+    def sample(self, signum, frame):
+        """Record the functions on the stack of FRAME."""
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            if code is builtin_wrapper_code:
+                stack.append(frame.f_locals['name'])
+            elif code in frame_functions:
+                fn = frame_functions[code](frame)
+                if type(fn) is mal.Function:
+                    key = id(fn.ast)
+                    if key not in self.functions:
+                        self.functions[key] = fn
+                    stack.append(key)
+            frame = frame.f_back
+        stack.reverse()
+        self.stacks[tuple(stack)] += 1
+
+    def names(self):
+        """Return the names of the keys in the samples and call counts."""
+        names = {}
+        for key, fn in self.functions.items():
+            params = printer.pr_str(fn.params, True)
+            names[key] = "(fn* {})".format(params)
+        for name, value in self.env.data.items():
+            if type(value) is mal.Function and id(value.ast) in names:
+                names[id(value.ast)] = name
+        for key, fn in self.functions.items():
+            location = mal.form_location(fn.ast)
+            if location is not None and location[0] is not None:
+                names[key] += " " + printer.location_str(location)
+        for key in self.calls:
+            if type(key) is str:
+                names[key] = key
+        for stack in self.stacks:
+            for key in stack:
+                if type(key) is str:
+                    names[key] = key
+        return names
+
+    def report(self, file):
+        """Write the functions sorted by the time spent in them to FILE."""
+        names = self.names()
+        total = sum(self.stacks.values())
+        inclusive = collections.Counter()
+        exclusive = collections.Counter()
+        sites = collections.Counter()
+        for stack, samples in self.stacks.items():
+            for key in set(stack):
+                inclusive[key] += samples
+            if stack:
+                exclusive[stack[-1]] += samples
+            for site in set(zip(stack, stack[1:])):
+                sites[site] += samples
+
+        print("{} samples every {:g} ms".format(total, self.interval * 1000),
+              file=file)
+        print(file=file)
+        print("{:>7} {:>7} {:>10}  {}".format("total%", "self%", "calls",
+                                             "function"), file=file)
+        keys = set(inclusive) | set(self.calls)
+        for key in sorted(keys, key=lambda key: (-inclusive[key],
+                                                 -self.calls[key],
+                                                 names[key])):
+            print("{:>7.1f} {:>7.1f} {:>10}  {}".format(
+                percentage(inclusive[key], total),
+                percentage(exclusive[key], total),
+                self.calls[key], names[key]), file=file)
+
+        print(file=file)
+        print("{:>7}  {}".format("total%", "caller -> callee"), file=file)
+        for (caller, callee), samples in sites.most_common():
+            print("{:>7.1f}  {} -> {}".format(percentage(samples, total),
+                                              names[caller], names[callee]),
+                  file=file)
+
+    def write_collapsed(self, filename):
+        """Write the samples to FILENAME in the collapsed stack format.
+
+        Each line holds a stack, its functions separated by semicolons and
+        the outermost first, followed by the number of samples of the stack.
+        This is the input format of flame graph tools.
+
+        """
+        names = self.names()
+        lines = collections.Counter()
+        for stack, samples in self.stacks.items():
+            frames = [names[key].replace(';', ':') for key in stack]
+            lines[';'.join(frames) or "(toplevel)"] += samples
+        with open(filename, 'w') as f:
+            for line, samples in sorted(lines.items()):
+                print("{} {}".format(line, samples), file=f)
+
+
+def profiled_builtin(calls, name, fn):
+    """Return a wrapper of FN counting its calls in CALLS under NAME."""
+    def builtin_wrapper(*args):
+        calls[name] += 1
+        return fn(*args)
+
+    return builtin_wrapper
+
+
+builtin_wrapper_code = profiled_builtin(None, None, None).__code__
+
+
+def percentage(part, total):
+    if total == 0:
+        return 0.0
+    return 100.0 * part / total
@@ -1,151 +1,168 @@
 #!/usr/bin/env python3
 
 # System imports
+import argparse
+import pickle
 import readline  # so input() uses editable input
 import sys
 
 # Local imports
 import reader
 import printer
+import analyzer
+import image
+import malc
+import parallel
+import profiler
+import stack_eval
 import mal_types as mal
 import mal_env as menv
 import core
 
 repl_env = None
 
+# If True, forms are run through the analyzer before they are evaluated.
+use_analyzer = False
+
+# If True, forms are evaluated by stack_eval, which does not use the Python
+# stack for calls to Mal functions.
+use_stack = False
+
 
 def READ(line):
     return reader.read_str(line)
 
 
 def EVAL(ast, env):
-    while True:
-        if ast is None:  # comments
-            return None
-        if type(ast) is mal.Error:
-            return ast
-        elif type(ast) is not mal.List:
-            return eval_ast(ast, env)
-        else:  # if ast is a list
-            if len(ast) == 0:  # if ast is the empty list, just return it
-                return ast
-
-            # perform macro expansion
-            ast = macroexpand(ast, env)
-            if type(ast) is not mal.List:
+    if use_analyzer:
+        return analyzer.run(ast, env)
+    if use_stack:
+        return stack_eval.run(ast, env)
+
+    try:
+        while True:
+            if ast is None:  # comments
+                return None
+            elif type(ast) is not mal.List:
                 return eval_ast(ast, env)
-
-            # apply
-            if type(ast[0]) is mal.Symbol:
-                symbol = ast[0].name
-                # Special forms
-                if symbol == "def!":
-                    return mal_def(env, ast[1:])
-                elif symbol == "defmacro!":
-                    return mal_defmacro(env, ast[1:])
-                elif symbol == "try*":
-                    catch = ast[2]
-                    if not (catch[0].name == "catch*"):
-                        return mal.Error("TryError",
-                                         "Failing 'catch*' clause")
-
-                    A = EVAL(ast[1], env)
-                    if type(A) is mal.Error:
-                        # The error is wrapped in a HandledError instance, so
-                        # that evaluation is not halted.
-                        A = mal.HandledError(A)
-                        B = catch[1]
-                        C = catch[2]
-                        env = menv.mal.Env(outer=env, binds=[B], exprs=[A])
-                        ast = C
+            else:  # if ast is a list
+                if len(ast) == 0:  # if ast is the empty list, just return it
+                    return ast
+
+                # perform macro expansion
+                ast = analyzer.macroexpand(ast, env)
+                if type(ast) is not mal.List:
+                    return eval_ast(ast, env)
+
+                # apply
+                if type(ast[0]) is mal.Symbol:
+                    symbol = ast[0].name
+                    # Special forms
+                    if symbol == "def!":
+                        return mal_def(env, ast[1:])
+                    elif symbol == "defmacro!":
+                        return mal_defmacro(env, ast[1:])
+                    elif symbol == "try*":
+                        catch = ast[2]
+                        if not (catch[0].name == "catch*"):
+                            raise mal.MalError("TryError",
+                                               "Failing 'catch*' clause")
+
+                        try:
+                            return EVAL(ast[1], env)
+                        except mal.MalError as err:
+                            # The error is bound as a HandledError, a normal
+                            # value.
+                            A = mal.HandledError(err)
+                            B = catch[1]
+                            C = catch[2]
+                            env = menv.MalEnv(outer=env, binds=[B], exprs=[A])
+                            ast = C
+                            continue
+                    elif symbol == "let*":
+                        ast, env = mal_let(env, ast[1], ast[2])
                         continue
-                    else:
-                        return A
-                elif symbol == "let*":
-                    ast, env = mal_let(env, ast[1], ast[2])
-                    continue
-                elif symbol == "do":
-                    evalled = eval_ast(mal.List(ast[1:-1]), env)
-                    if type(evalled) is mal.Error:
-                        return evalled
-                    ast = ast[-1]
-                    continue
-                elif symbol == "if":
-                    ast = mal_if(env, ast[1:])
-                    continue
-                elif symbol == "fn*":
-                    return mal_fn(env, ast[1], ast[2])
-                elif symbol == "quote":
-                    return ast[1]
-                elif symbol == "quasiquote":
-                    ast = mal_quasiquote(ast[1])
-                    continue
-                elif symbol == "macroexpand":
-                    return macroexpand(ast[1], env)
-
-        # If the list does not start with a symbol or if the symbol is not a
-        # special form, we evaluate and apply:
-        evalled = eval_ast(ast, env)
-        if type(evalled) is mal.Error:
-            return evalled
-        elif type(evalled[0]) is mal.Builtin:
-            return evalled[0].fn(*evalled[1:])
-        elif type(evalled[0]) is mal.Function:
-            ast = evalled[0].ast
-            env = menv.mal.Env(outer=evalled[0].env,
-                               binds=evalled[0].params,
-                               exprs=evalled[1:])
-            continue
-        else:
-            return mal.Error("ApplyError",
-                             "'{}' is not callable".format(evalled[0]))
+                    elif symbol == "do":
+                        eval_ast(mal.List(ast[1:-1]), env)
+                        ast = ast[-1]
+                        continue
+                    elif symbol == "if":
+                        ast = mal_if(env, ast[1:])
+                        continue
+                    elif symbol == "fn*":
+                        return mal_fn(env, ast[1], ast[2])
+                    elif symbol == "quote":
+                        return ast[1]
+                    elif symbol == "quasiquote":
+                        ast = analyzer.mal_quasiquote(ast[1])
+                        continue
+                    elif symbol == "macroexpand":
+                        return analyzer.macroexpand(ast[1], env)
+
+            # If the list does not start with a symbol or if the symbol is not
+            # a special form, we evaluate and apply:
+            evalled = [EVAL(elem, env) for elem in ast]
+            if type(evalled[0]) is mal.Builtin:
+                if len(evalled) == 2:
+                    return evalled[0].fn1(evalled[1])
+                elif len(evalled) == 3:
+                    return evalled[0].fn2(evalled[1], evalled[2])
+                return evalled[0].fn(*evalled[1:])
+            elif type(evalled[0]) is mal.Function:
+                if profiler.current is not None:
+                    profiler.current.count(evalled[0])
+                ast = evalled[0].ast
+                env = menv.MalEnv(outer=evalled[0].env,
+                                   binds=evalled[0].params,
+                                   exprs=evalled[1:])
+                continue
+            else:
+                raise mal.MalError("ApplyError",
+                                   "'{}' is not callable".format(evalled[0]))
+    except mal.MalError as err:
+        mal.locate(err, ast)
+        raise
 
 
 # Special forms
 def mal_def(environment, ast):
     if len(ast) != 2:
-        return mal.Error("ArgError",
-                         "'def!' requires 2 arguments, "
-                         "received {}".format(len(ast)))
+        raise mal.MalError("ArgError",
+                           "'def!' requires 2 arguments, "
+                           "received {}".format(len(ast)))
     symbol = ast[0]
     value = ast[1]
     evalled = EVAL(value, environment)
-    if type(evalled) is not mal.Error:
-        environment.set(symbol.name, evalled)
+    environment.set(symbol.name, evalled)
     return evalled
 
 
 def mal_defmacro(environment, ast):
     if len(ast) != 2:
-        return mal.Error("ArgError",
-                         "'defmacro!' requires 2 arguments, "
-                         "received {}".format(len(ast)))
+        raise mal.MalError("ArgError",
+                           "'defmacro!' requires 2 arguments, "
+                           "received {}".format(len(ast)))
     symbol = ast[0]
     value = ast[1]
     evalled = EVAL(value, environment)
     if type(evalled) is mal.Function:
         evalled.is_macro = True
-    if type(evalled) is not mal.Error:
-        environment.set(symbol.name, evalled)
+    environment.set(symbol.name, evalled)
     return evalled
 
 
 def mal_let(environment, bindings, body):
     if not isinstance(bindings, (mal.List, mal.Vector)):
-        return (mal.Error("LetError", "Invalid bind form"), None)
+        raise mal.MalError("LetError", "Invalid bind form")
     if (len(bindings) % 2 != 0):
-        return (mal.Error("LetError", "Insufficient bind forms"), None)
+        raise mal.MalError("LetError", "Insufficient bind forms")
 
-    new_env = menv.mal.Env(outer=environment)
+    new_env = menv.MalEnv(outer=environment)
     for i in range(0, len(bindings), 2):
         if type(bindings[i]) is not mal.Symbol:
-            return (mal.Error("LetError", "Attempt to bind to non-symbol"),
-                    None)
+            raise mal.MalError("LetError", "Attempt to bind to non-symbol")
 
         evalled = EVAL(bindings[i + 1], new_env)
-        if type(evalled) is mal.Error:
-            return (evalled, None)
-
         new_env.set(bindings[i].name, evalled)
 
     return (body, new_env)
@@ -153,14 +170,12 @@ def mal_let(environment, bindings, body):
 
 def mal_if(environment, args):
     if len(args) < 2:
-        return mal.Error("ArgError",
-                         "'if' requires 2-3 arguments, "
-                         "received {}".format(len(args)))
+        raise mal.MalError("ArgError",
+                           "'if' requires 2-3 arguments, "
+                           "received {}".format(len(args)))
 
     condition = EVAL(args[0], environment)
-    if type(condition) is mal.Error:
-        return condition
-    if not (condition == mal.NIL or condition == mal.Boolean(False)):
+    if condition is not mal.NIL and condition is not mal.FALSE:
         return args[1]
     else:
         if len(args) == 3:
@@ -170,70 +185,28 @@ def mal_if(environment, args):
 
 
 def mal_fn(environment, syms, body):
-    if '&' in syms:
-        if syms.index('&') != len(syms) - 2:
-            return mal.Error("BindsError", "Illegal binds list")
+    if mal.Symbol('&') in syms:
+        if list(syms).index(mal.Symbol('&')) != len(syms) - 2:
+            raise mal.MalError("BindsError", "Illegal binds list")
+
+    function = mal.Function(None, syms, body, environment)
 
     def mal_closure(*params):
-        new_env = menv.mal.Env(outer=environment, binds=syms, exprs=params)
+        if profiler.current is not None:
+            profiler.current.count(function)
+        new_env = menv.MalEnv(outer=environment, binds=syms, exprs=params)
         return EVAL(body, new_env)
 
-    return mal.Function(mal_closure, syms, body, environment)
-
+    function.fn = mal_closure
+    return function
 
-def is_pair(arg):
-    """Return True if ARG is a non-empty list or vector."""
-
-    if isinstance(arg, list) and len(arg) > 0:
-        return True
-    else:
-        return False
 
-
-def mal_quasiquote(ast):
-    # not a list (or empty list)
-    if not is_pair(ast):
-        return mal.List((mal.Symbol("quote"), ast))
-
-    # unquote
-    elif type(ast[0]) is mal.Symbol and ast[0].name == "unquote":
-        return ast[1]
-
-    # splice-unquote
-    elif (is_pair(ast[0]) and
-          type(ast[0][0]) is mal.Symbol and
-          ast[0][0].name == "splice-unquote"):
-        first = mal.Symbol("concat")
-        second = ast[0][1]
-        rest = mal_quasiquote(mal.List(ast[1:]))
-        return mal.List((first, second, rest))
-
-    # otherwise
-    else:
-        first = mal.Symbol("cons")
-        second = mal_quasiquote(ast[0])
-        rest = mal_quasiquote(mal.List(ast[1:]))
-        return mal.List((first, second, rest))
-
-
-def is_macro_call(ast, env):
-    if type(ast) is not mal.List:
-        return False
-    if type(ast[0]) is not mal.Symbol:
-        return False
-
-    fn = env.get(ast[0].name)
-    if type(fn) is mal.Function:
-        return fn.is_macro
-    else:
-        return False
-
-
-def macroexpand(ast, env):
-    while is_macro_call(ast, env):
-        fn = env.get(ast[0].name)
-        ast = fn.fn(*ast[1:])
-    return ast
+# Frames of EVAL run the function they last applied, while the frames of the
+# closures of functions run that function.
+profiler.frame_functions[EVAL.__code__] = (
+    lambda frame: frame.f_locals.get('evalled', [None])[0])
+profiler.frame_functions[mal_fn(None, [], None).fn.__code__] = (
+    lambda frame: frame.f_locals['function'])
 
 
 def PRINT(data):
@@ -247,28 +220,19 @@ def eval_ast(ast, env):
     elif type(ast) is mal.List:
         res = []
         for elem in ast:
-            val = EVAL(elem, env)
-            if type(val) is mal.Error:
-                return val
-            res.append(val)
+            res.append(EVAL(elem, env))
         return mal.List(res)
 
     elif type(ast) is mal.Vector:
         res = []
         for elem in ast:
-            val = EVAL(elem, env)
-            if type(val) is mal.Error:
-                return val
-            res.append(val)
+            res.append(EVAL(elem, env))
         return mal.Vector(res)
 
     elif type(ast) is mal.Hash:
         res = {}
         for key, val in ast.items():
-            newval = EVAL(val, env)
-            if type(newval) is mal.Error:
-                return newval
-            res[key] = newval
+            res[key] = EVAL(val, env)
         return mal.Hash(res)
 
     else:
@@ -281,50 +245,249 @@ def mal_eval(ast):
     return EVAL(ast, repl_env)
 
 
-def mal_swap(atom, fn, *args):
+def mal_load_file(filename):
+    """Evaluate the forms in FILENAME one at a time.
+
+    The forms are read from the .malc cache file if possible. Return the value
+    of the last form. An error stops loading the rest of the file.
+
+    """
     global repl_env
 
+    try:
+        forms = malc.read_file(filename)
+    except FileNotFoundError:
+        raise mal.MalError("FileError", "File not found")
+
+    result = mal.NIL
+    try:
+        for ast in forms:
+            try:
+                result = EVAL(ast, repl_env)
+            except mal.MalError as err:
+                mal.locate(err, ast)
+                raise
+    finally:
+        forms.close()
+    return result
+
+
+def mal_swap(atom, fn, *args):
+    """Set ATOM to the value of FN on its value and ARGS.
+
+    If another thread changes ATOM while FN runs, FN is called again on the
+    new value, so that no change is lost.
+
+    """
     if type(atom) is not mal.Atom:
-        return mal.Error("TypeError",
-                         "Expected atom, received {}".format(type(atom)))
+        raise mal.MalError("TypeError",
+                           "Expected atom, received {}".format(type(atom)))
+
+    while True:
+        old = atom.value
+        evalled = fn.fn(old, *args)
+        if atom.compare_and_set(old, evalled):
+            return evalled
+
+
+def mal_dump_image(filename):
+    """Write an image of the global environment to FILENAME."""
+    global repl_env
+
+    try:
+        image.dump(repl_env, filename, builtins(), use_analyzer)
+    except (OSError, pickle.PicklingError) as err:
+        raise mal.MalError("ImageError", "Cannot dump image: {}".format(err))
+    return mal.NIL
+
+
+def mal_pmap(fn, lst):
+    """Map FN over LST like map, in worker processes."""
+    if not isinstance(fn, (mal.Builtin, mal.Function)):
+        raise mal.MalError("TypeError", "'pmap': Expected function,"
+                           " received {}".format(fn))
+    if type(lst) is mal.LazySeq:
+        lst = list(lst)
+    elif not isinstance(lst, (mal.List, mal.Vector)):
+        raise mal.MalError("TypeError", "'pmap': Expected list or vector,"
+                           " received {}".format(lst))
+    return parallel.pmap(fn, lst, parallel_pool())
 
-    evalled = fn.fn(atom.value, *args)
-    atom.set(evalled)
-    return evalled
+
+def mal_pcall(*fns):
+    """Call the functions FNS without arguments, each in a worker process.
+
+    Return the list of their values.
+
+    """
+    for fn in fns:
+        if not isinstance(fn, (mal.Builtin, mal.Function)):
+            raise mal.MalError("TypeError", "'pcall': Expected function,"
+                               " received {}".format(fn))
+    return parallel.pcall(fns, parallel_pool())
+
+
+def parallel_pool():
+    """Return the pool of worker processes, evaluating as this process does."""
+    return parallel.start(init_worker, (use_analyzer, use_stack))
+
+
+def init_worker(analyzed, stacked):
+    """Set up a worker process of pmap and pcall."""
+    global use_analyzer
+    global use_stack
+
+    use_analyzer = analyzed
+    use_stack = stacked
+
+
+def set_repl_env(env):
+    global repl_env
+    repl_env = env
+
+
+def builtins():
+    """Return the builtins by name, those in core.ns and those defined here."""
+    ns = dict(core.ns)
+    ns["eval"] = mal.Builtin(mal_eval)
+    ns["swap!"] = mal.Builtin(mal_swap)
+    ns["load-file"] = mal.Builtin(mal_load_file)
+    ns["dump-image"] = mal.Builtin(mal_dump_image)
+    ns["pmap"] = mal.Builtin(mal_pmap)
+    ns["pcall"] = mal.Builtin(mal_pcall)
+    return ns
+
+
+parallel.builtins = builtins()
+parallel.make_function = mal_fn
+parallel.set_global_env = set_repl_env
+
+
+def load_image(filename):
+    """Return the environment in the image FILENAME, or None on errors.
+
+    Set use_analyzer to the mode the image was made in.
+
+    """
+    global use_analyzer
+
+    try:
+        env, use_analyzer = image.load(filename, builtins(), mal_fn)
+    except (OSError, EOFError, pickle.UnpicklingError,
+            image.ImageError) as err:
+        print("Cannot load image: {}".format(err), file=sys.stderr)
+        return None
+    return env
 
 
 def rep(line, env):
-    ast = READ(line)
-    result = EVAL(ast, env)
-    return PRINT(result)
+    # Printing a lazy sequence computes its elements, which can fail as well.
+    try:
+        return PRINT(EVAL(READ(line), env))
+    except mal.MalError as err:
+        return PRINT(err)
+    except RecursionError:
+        return PRINT(recursion_error())
+
+
+def recursion_error():
+    return mal.MalError("RecursionError", "Maximum recursion depth exceeded")
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(prog="pymal",
+                                     description="Mal in Python 3.")
+    parser.add_argument("--analyze", action="store_true",
+                        help="analyze forms before evaluating them")
+    parser.add_argument("--stack", action="store_true",
+                        help="evaluate forms on an explicit stack, "
+                        "allowing deep non-tail recursion")
+    parser.add_argument("--max-depth", type=int,
+                        help="maximum depth of recursion: with --stack, the "
+                        "number of frames on the evaluator's stack, "
+                        "otherwise the Python recursion limit, which counts "
+                        "the several Python frames each Mal call takes")
+    parser.add_argument("--profile", metavar="STACKS",
+                        help="profile the program: print a report to stderr "
+                        "and write the sampled stacks to STACKS in the "
+                        "collapsed format of flame graph tools")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="do not read or write .malc cache files")
+    parser.add_argument("--image",
+                        help="start from an image made with dump-image")
+    parser.add_argument("file", nargs="?",
+                        help="Mal file to run instead of starting the REPL")
+    parser.add_argument("argv", nargs=argparse.REMAINDER,
+                        help="arguments passed to the file in *ARGV*")
+    return parser.parse_args(args)
 
 
 def Mal(args=[]):
     global repl_env
-    repl_env = menv.mal.Env()
+    global use_analyzer
+    global use_stack
+
+    options = parse_args(args)
+    use_analyzer = options.analyze
+    use_stack = options.stack and not options.analyze
+    if options.max_depth is not None:
+        if use_stack:
+            stack_eval.max_depth = options.max_depth
+        else:
+            sys.setrecursionlimit(options.max_depth)
+    malc.enabled = not options.no_cache
+
+    repl_env = None
+    if options.image is not None:
+        repl_env = load_image(options.image)
 
-    for sym in core.ns:
-        repl_env.set(sym, core.ns[sym])
+    if repl_env is None:
+        repl_env = menv.MalEnv()
 
-    # Add eval and swap! to repl_env:
-    repl_env.set("eval", mal.Builtin(mal_eval))
-    repl_env.set("swap!", mal.Builtin(mal_swap))
+        # Add the builtins, including eval, swap! and load-file:
+        ns = builtins()
+        for sym in ns:
+            repl_env.set(sym, ns[sym])
+
+        # Add *host-language*:
+        repl_env.set("*host-language*", "Python3")
+
+        # Load Mal core
+        rep('(load-file "prelude.mal")', repl_env)
 
     # Add the command line arguments to repl_env:
-    repl_env.set("*ARGV*", mal.List(args[1:]))
+    repl_env.set("*ARGV*", mal.List(options.argv))
 
-    # Add *host-language*:
-    repl_env.set("*host-language*", "Python3")
+    if options.profile is None:
+        run_program(options)
+        return
 
-    # Add a 'load-file' function:
-    rep("(def! load-file (fn* (f)"
-        "  (eval (read-string (str \"(do \" (slurp f) \")\")))))", repl_env)
+    profile = profiler.Profiler(repl_env)
+    profile.start()
+    try:
+        run_program(options)
+    finally:
+        profile.stop()
+        profile.report(sys.stderr)
+        profile.write_collapsed(options.profile)
 
-    # Load Mal core
-    rep('(load-file "prelude.mal")', repl_env)
 
-    if len(args) >= 1:
-        rep('(load-file "{}")'.format(args[0]), repl_env)
+def run_program(options):
+    """Run the file in OPTIONS, or the REPL if there is none."""
+    if options.file is not None:
+        try:
+            mal_load_file(options.file)
+        except RecursionError:
+            print("Error: {}".format(recursion_error().descr),
+                  file=sys.stderr)
+            sys.exit(1)
+        except mal.MalError as err:
+            message = "Error: {}".format(err.descr)
+            if err.location is not None:
+                message = "{}: {}".format(printer.location_str(err.location),
+                                          message)
+            print(message, file=sys.stderr)
+            sys.exit(1)
         return
 
     rep("(println (str \"Mal [\" *host-language* \"]\"))", repl_env)
@@ -1,37 +1,33 @@
 # coding=utf-8
+import itertools
 import re
 import mal_types as mal
 
 
 class Reader:
-    """A Reader object for storing a list of tokens and an index into that list.
+    """A Reader object for reading tokens from a stream of tokens.
+
+    Tokens are (KIND, VALUE) pairs as produced by tokenize(). When the stream
+    is exhausted, the Reader returns the token ('', None).
 
     """
 
     def __init__(self, tokens):
-        self.tokens = tokens
-        self.position = 0
+        self.tokens = iter(tokens)
+        self.token = next(self.tokens, END)
 
     def next(self):
-        """Return the current token and increment the index.
-
-        If the list of tokens has been exausted, return the empty string.
-
-        """
-        token = self.peek()
-        self.position += 1
+        """Return the current token and advance to the next one."""
+        token = self.token
+        self.token = next(self.tokens, END)
         return token
 
     def peek(self):
-        """Return the current token.
+        """Return the current token."""
+        return self.token
 
-        If the list of tokens has been exhausted, return the empty string.
-        """
-        if self.position >= len(self.tokens):
-            return ''
-        else:
-            return self.tokens[self.position]
 
+END = ('', None)
 
 reader_macros = {"'": "quote",
                  "`": "quasiquote",
@@ -39,6 +35,10 @@ reader_macros = {"'": "quote",
                  "~@": "splice-unquote",
                  "@": "deref"}
 
+constants = {"true": mal.TRUE,
+             "false": mal.FALSE,
+             "nil": mal.NIL}
+
 
 def read_str(input_str):
     """Convert INPUT_STR into a Mal object."""
@@ -47,145 +47,222 @@ def read_str(input_str):
     return mal_object
 
 
+# Number of characters read_stream() reads from a file at a time.
+chunk_size = 65536
+
+
+def read_stream(stream):
+    """Iterate over the Mal objects read from STREAM, a text file object.
+
+    STREAM is read in chunks of chunk_size characters, and each form is
+    returned as soon as it has been read. If a form cannot be read, a
+    mal.ReaderError is raised. The locations of the forms name the file of
+    STREAM, if it has a name.
+
+    """
+    chunks = iter(lambda: stream.read(chunk_size), '')
+    filename = getattr(stream, 'name', None)
+    form = Reader(tokenize_chunks(chunks, filename))
+    while form.peek() is not END:
+        yield read_form(form)
+
+
+# Each token is matched by exactly one of these alternatives, and the name of
+# the group that matched is its kind. Whitespace, commas and comments are in
+# an unnamed group.
+token_regexp = re.compile(r"""
+    [\s,]+ | ;[^\n]*
+  | (?P<delimiter>~@|[\[\]{}()'`~^@])
+  | "(?P<string>(?:\\.|[^\\"])*)"
+  | (?P<unterminated>")
+  | (?P<int>-?[0-9]+)(?![^\s\[\]{}('"`,;)])
+  | (?P<keyword>:[^\s\[\]{}('"`,;)]*)
+  | (?P<symbol>[^\s\[\]{}('"`,;)]+)
+""", re.VERBOSE)
+
+
 def tokenize(input_str):
     """Tokenize INPUT_STR.
 
-    Return a list of tokens."""
-    token_regexp = (r'[\s,]*'
-                    r'(~@|'
-                    r'[\[\]{}()\'`~^@]|'
-                    r'"(?:\\.|[^\\"])*"'
-                    r'|;.*|'
-                    r'[^\s\[\]{}(\'"`,;)]*)')
+    Return an iterator over (KIND, VALUE) pairs. KIND is 'int', 'string',
+    'keyword' or 'symbol', with VALUE the integer, the string with its escapes
+    decoded, or the name; for delimiters and reader macros, KIND is the token
+    itself. VALUE is None for closing delimiters, and the location of the
+    token for the others, packed by mal.pack_location(), counting lines and
+    columns from 1. An unterminated string yields the token ('error',
+    mal.ReaderError), which is raised when the token is read.
+
+    """
+    return tokenize_chunks([input_str])
+
 
-    tokens = re.findall(token_regexp, input_str)
+def tokenize_chunks(chunks, filename=None):
+    """Tokenize the concatenation of the strings in CHUNKS.
 
-    # The re.findall() call adds an empty match to the end of the list. I'm not
-    # sure how to remove this other than by checking for it explictly. We also
-    # filter out comments at this point.
-    return [token for token in tokens if token != '' and token[0] != ';']
+    Return an iterator over tokens as tokenize() does, with FILENAME in the
+    locations. A token may be split across chunks: the last match in a chunk
+    is put in front of the next one and scanned again, since it may continue
+    there.
+
+    """
+    rest = ''
+    line = 1
+    # The offset in TEXT at which the current line starts.
+    line_start = 0
+    for chunk in itertools.chain(chunks, [None]):
+        if chunk is None:  # Everything left is complete.
+            text = rest
+            end = -1
+        else:
+            text = rest + chunk
+            end = len(text)
+        rest = ''
+        for match in token_regexp.finditer(text):
+            kind = match.lastgroup
+            start = match.start()
+            if match.end() == end or (kind == 'unterminated' and end >= 0):
+                rest = text[start:]
+                line_start -= start
+                break
+            elif kind is None or kind == 'string':
+                newlines = text.count('\n', start, match.end())
+                if newlines:
+                    line += newlines
+                    line_start = text.rindex('\n', start, match.end()) + 1
+                if kind is None:
+                    continue
+
+            if kind == 'delimiter':
+                token = match.group(kind)
+                if token in closing_delimiters:
+                    yield (token, None)
+                else:
+                    yield (token, mal.pack_location(filename, line,
+                                                    start - line_start + 1))
+            elif kind == 'string':
+                yield (kind, unescape(match.group(kind)))
+            elif kind == 'int':
+                yield (kind, int(match.group(kind)))
+            elif kind == 'unterminated':
+                location = (filename, line, start - line_start + 1)
+                yield ('error',
+                       mal.ReaderError("ParseError", "Missing closing quote",
+                                       location))
+            else:
+                yield (kind, match.group(kind))
+        else:
+            line_start -= len(text)
+
+
+closing_delimiters = {')', ']', '}'}
+
+
+def unescape(string):
+    """Decode the escape sequences in STRING."""
+    if '\\' not in string:
+        return string
+    # Escaped backslashes are split off first, so that the backslash in a
+    # sequence such as \\n is not taken to escape the n.
+    return '\\'.join(part.replace('\\n', '\n').replace('\\"', '"')
+                     for part in string.split('\\\\'))
 
 
 def read_form(form):
-    token = form.next()
-    if token in ['(', '[', '{']:
-        return read_sequence(form, token)
-    elif token == '^':  # with-meta reader macro
-        return apply_with_meta_macro(form)
-    elif token in reader_macros:
-        return apply_reader_macro(form, token)
-    elif token == '':
+    kind, value = form.next()
+    if kind == 'symbol':
+        if value in constants:
+            return constants[value]
+        return mal.Symbol(value)
+    elif kind == 'int' or kind == 'string':
+        return value
+    elif kind == 'keyword':
+        return mal.Keyword(value)
+    elif kind in ['(', '[', '{']:
+        return read_sequence(form, kind, value)
+    elif kind == '^':  # with-meta reader macro
+        return apply_with_meta_macro(form, value)
+    elif kind in reader_macros:
+        return apply_reader_macro(form, kind, value)
+    elif kind == 'error':
+        raise value
+    elif kind == '':
         return None
     else:
-        return read_atom(token)
+        raise mal.ReaderError("ParseError", "Unexpected '{}'".format(kind))
 
 
-def read_sequence(form, token):
+def read_sequence(form, token, location):
     """Read a sequence from FORM.
 
-    This function reads list, vectors and hash tables.
+    This function reads list, vectors and hash tables. LOCATION is the
+    location of the opening delimiter TOKEN.
     """
     res = []
 
     end_token = {'(': ')', '[': ']', '{': '}'}[token]
 
     while True:
-        token = form.peek()
+        token = form.peek()[0]
         if token == end_token:  # We've found the end of the list.
             break
         if token == '':  # We've reached the end of FORM.
-            return mal.Error("ParenError", "Missing closing parenthesis")
-        next_form = read_form(form)
-        if type(next_form) is mal.Error:
-            return next_form
-
-        res.append(next_form)
+            raise mal.ReaderError("ParenError", "Missing closing parenthesis",
+                                  mal.unpack_location(location))
+        res.append(read_form(form))
 
     # Now we need to move past the end token
     form.next()
 
     if end_token == ')':
-        return mal.List(res)
+        sequence = mal.List(res)
     elif end_token == '}':
-        return create_hash(res)
+        sequence = create_hash(res)
     else:
-        return mal.Vector(res)
+        sequence = mal.Vector(res)
+    sequence.packed_location = location
+    return sequence
 
 
 def create_hash(items):
     """Create a hash table from ITEMS."""
+    return mal.Hash().assoc(hash_items(items))
+
+
+def hash_items(items):
+    """Return the keys and values in ITEMS as a list of (key, value) pairs."""
 
     # Hash tables in Mal can have strings or keywords as keys. mal.Keyword are
     # hashable, so there's no need to use a rare Unicode character as prefix in
     # order to distinguish them from strings, as suggested in the mal_guide.
 
     if (len(items) % 2) != 0:
-        return mal.Error("HashError", "Insufficient number of items")
+        raise mal.MalError("HashError", "Insufficient number of items")
 
-    res = {}
+    res = []
     for i in range(0, len(items), 2):
         key = items[i]
         if not isinstance(key, (str, mal.Keyword)):
-            return mal.Error("HashError",
-                             "Cannot hash on {}".format(type(key)))
+            raise mal.MalError("HashError",
+                               "Cannot hash on {}".format(type(key)))
         value = items[i + 1]
-        res[key] = value
-    return mal.Hash(res)
+        res.append((key, value))
+    return res
 
 
-def apply_with_meta_macro(form):
+def apply_with_meta_macro(form, location):
     data = read_form(form)
-    if type(data) is mal.Error:
-        return data
     obj = read_form(form)
-    if type(obj) is mal.Error:
-        return obj
-    return mal.List([mal.Symbol('with-meta'), obj, data])
+    result = mal.List([mal.Symbol('with-meta'), obj, data])
+    result.packed_location = location
+    return result
 
 
-def apply_reader_macro(form, token):
+def apply_reader_macro(form, token, location):
     next_form = read_form(form)
-    if type(next_form) is mal.Error:
-        return next_form
     replacement = mal.Symbol(reader_macros[token])
-    return mal.List([replacement, next_form])
-
-
-def read_atom(token):
-    # integers
-    if re.match(r'\A-?[0-9]+\Z', token):
-        return int(token)
-
-    # strings
-    if re.match(r'\A"(.*)"\Z', token):
-        string = token[1:-1]
-        string = string.replace(r'\"', '"')
-        string = string.replace(r'\n', '\n')
-        string = string.replace(r'\\', '\\')
-        return string
-
-    # keywords
-    if re.match(r'\A:.*\Z', token):
-        return mal.Keyword(token)
-
-    # boolean
-    if token == "true":
-        return mal.Boolean(True)
-    if token == "false":
-        return mal.Boolean(False)
-
-    # nil
-    if token == "nil":
-        return mal.NIL
-
-    # symbols
-    if re.match(r"[^\s\[\]{}('\"`,;)]*", token):
-        return mal.Symbol(token)
-
-    # Found nothing parsable. (Shouldn't really happen, since symbols are a
-    # catch-all already.)
-    return mal.Error("ParseError", "Could not parse token: '{}'".
-                     format(token))
+    result = mal.List([replacement, next_form])
+    result.packed_location = location
+    return result
 
 
 def main():
@@ -0,0 +1,370 @@
+"""Evaluator with an explicit stack.
+
+This evaluator computes the same values as pymal.EVAL, but it does not call
+itself to evaluate the parts of a form. Instead, it pushes a frame onto a
+stack, a Python list, describing what remains to be done with the value of
+the part, and goes on evaluating the part. Once a value is found, it is
+returned to the frame on top of the stack. Calls to Mal functions, in tail
+position or not, therefore do not use the Python stack, and the depth of
+recursion in Mal is only limited by memory, or by max_depth.
+
+Macro expansion and the builtins apply and map are run on the stack as well
+when they call Mal functions. Other builtins that call Mal functions, such as
+reduce or swap!, start a new evaluation on the Python stack.
+
+"""
+import sys
+
+import analyzer
+import core
+import mal_types as mal
+import mal_env as menv
+import profiler
+
+# The maximum number of frames on the stack, or None for no limit. A frame
+# is pushed for each form whose parts are being evaluated, so this is not
+# comparable to the Python recursion limit used by the other evaluators.
+max_depth = None
+
+# Kinds of frames. The first item of a frame is its kind, the second the
+# environment its forms are evaluated in, if any.
+ARGS = 0    # [ARGS, env, form, values]: evaluating the elements of a call
+VECTOR = 1  # [VECTOR, env, form, values]
+HASH = 2    # [HASH, env, keys, forms, values]
+DEF = 3     # [DEF, env, name, is_macro]
+LET = 4     # [LET, env, bindings, index, body]
+DO = 5      # [DO, env, form, index]
+IF = 6      # [IF, env, form]
+TRY = 7     # [TRY, env, catch clause]
+EXPAND = 8  # [EXPAND, env, form, macro]: expanding a macro call
+MAP = 9     # [MAP, None, fn, items, values]: running 'map'
+
+# Returned instead of a value when the next form to evaluate has been set up.
+PUSHED = object()
+
+
+def run(ast, env):
+    """Evaluate AST in ENV."""
+    stack = []
+    while True:
+        try:
+            return execute(ast, env, stack)
+        except mal.MalError as err:
+            # The error occurred in the innermost form on the stack.
+            for frame in reversed(stack):
+                if err.location is not None:
+                    break
+                mal.locate(err, frame[2])
+            # Unwind the stack up to the innermost 'try*'.
+            while stack:
+                frame = stack.pop()
+                if frame[0] == TRY:
+                    break
+            else:
+                raise
+            catch = frame[2]
+            env = menv.MalEnv(outer=frame[1], binds=[catch[1]],
+                              exprs=[mal.HandledError(err)])
+            ast = catch[2]
+
+
+def execute(ast, env, stack):
+    """Evaluate AST in ENV and return its value to the frames on STACK.
+
+    Return the value once STACK is empty.
+
+    """
+    limit = sys.maxsize if max_depth is None else max_depth
+    while True:
+        # Evaluate AST in ENV. Either VALUE is computed, or a frame is
+        # pushed and AST is set to the part to evaluate first.
+        if len(stack) > limit:
+            raise mal.MalError("RecursionError",
+                               "Maximum recursion depth exceeded")
+        if type(ast) is mal.Symbol:
+            value = env.get(ast.name)
+        elif type(ast) is mal.List and len(ast) > 0:
+            fn = analyzer.get_macro(ast, env)
+            if fn is not None:
+                if ast.expansion is not None and ast.expansion[0] is fn:
+                    ast = ast.expansion[1]
+                    continue
+                if not is_stack_function(fn):
+                    ast.expansion = (fn, fn.fn(*ast[1:]))
+                    ast = ast.expansion[1]
+                    continue
+                stack.append([EXPAND, env, ast, fn])
+                env = menv.MalEnv(outer=fn.env, binds=fn.params,
+                                  exprs=ast[1:])
+                ast = fn.ast
+                continue
+            ast, env, value = special_form(ast, env, stack)
+            if value is PUSHED:
+                continue
+        elif type(ast) is mal.Vector and len(ast) > 0:
+            stack.append([VECTOR, env, ast, []])
+            ast = ast[0]
+            continue
+        elif type(ast) is mal.Hash and len(ast) > 0:
+            stack.append([HASH, env, ast.keys(), ast.values(), {}])
+            ast = stack[-1][3][0]
+            continue
+        elif ast is None:  # comments
+            if not stack:
+                return None
+            value = mal.NIL
+        else:
+            value = ast
+
+        # Return VALUE to the frames on the stack, until one of them needs
+        # another form to be evaluated.
+        while stack:
+            frame = stack[-1]
+            kind = frame[0]
+            if kind == ARGS:
+                values = frame[3]
+                values.append(value)
+                form = frame[2]
+                if len(values) < len(form):
+                    ast = form[len(values)]
+                    env = frame[1]
+                    break
+                stack.pop()
+                try:
+                    value = call(values[0], values, stack)
+                except mal.MalError as err:
+                    mal.locate(err, form)
+                    raise
+                if value is PUSHED:
+                    ast = stack.pop()
+                    env = stack.pop()
+                    break
+            elif kind == MAP:
+                values = frame[4]
+                values.append(value)
+                items = frame[3]
+                if len(values) < len(items):
+                    fn = frame[2]
+                    env = menv.MalEnv(outer=fn.env, binds=fn.params,
+                                      exprs=[items[len(values)]])
+                    ast = fn.ast
+                    break
+                stack.pop()
+                value = mal.List(values)
+            elif kind == VECTOR:
+                values = frame[3]
+                values.append(value)
+                form = frame[2]
+                if len(values) < len(form):
+                    ast = form[len(values)]
+                    env = frame[1]
+                    break
+                stack.pop()
+                value = mal.Vector(values)
+            elif kind == HASH:
+                keys = frame[2]
+                values = frame[4]
+                values[keys[len(values)]] = value
+                if len(values) < len(keys):
+                    ast = frame[3][len(values)]
+                    env = frame[1]
+                    break
+                stack.pop()
+                value = mal.Hash(values)
+            elif kind == DEF:
+                stack.pop()
+                if frame[3] and type(value) is mal.Function:
+                    value.is_macro = True
+                frame[1].set(frame[2], value)
+            elif kind == LET:
+                bindings = frame[2]
+                i = frame[3]
+                env = frame[1]
+                env.set(bindings[i].name, value)
+                i += 2
+                if i < len(bindings):
+                    check_let_symbol(bindings[i])
+                    frame[3] = i
+                    ast = bindings[i + 1]
+                else:
+                    stack.pop()
+                    ast = frame[4]
+                break
+            elif kind == DO:
+                form = frame[2]
+                i = frame[3] + 1
+                env = frame[1]
+                if i < len(form) - 1:
+                    frame[3] = i
+                else:
+                    stack.pop()
+                ast = form[i]
+                break
+            elif kind == IF:
+                stack.pop()
+                form = frame[2]
+                env = frame[1]
+                if core.is_true(value):
+                    ast = form[2]
+                    break
+                elif len(form) == 4:
+                    ast = form[3]
+                    break
+                value = mal.NIL
+            elif kind == TRY:
+                stack.pop()
+            elif kind == EXPAND:
+                stack.pop()
+                frame[2].expansion = (frame[3], value)
+                ast = value
+                env = frame[1]
+                break
+        else:
+            return value
+
+
+def special_form(ast, env, stack):
+    """Start evaluating AST, a non-empty list, in ENV.
+
+    Return the form to evaluate next, its environment and PUSHED, or the value
+    of AST as the third item.
+
+    """
+    if type(ast[0]) is mal.Symbol:
+        symbol = ast[0].name
+        if symbol == "def!" or symbol == "defmacro!":
+            if len(ast) != 3:
+                raise mal.MalError("ArgError",
+                                   "'{}' requires 2 arguments, "
+                                   "received {}".format(symbol, len(ast) - 1))
+            stack.append([DEF, env, ast[1].name, symbol == "defmacro!"])
+            return ast[2], env, PUSHED
+        elif symbol == "try*":
+            catch = ast[2]
+            if not (catch[0].name == "catch*"):
+                raise mal.MalError("TryError", "Failing 'catch*' clause")
+            stack.append([TRY, env, catch])
+            return ast[1], env, PUSHED
+        elif symbol == "let*":
+            bindings = ast[1]
+            if not isinstance(bindings, (mal.List, mal.Vector)):
+                raise mal.MalError("LetError", "Invalid bind form")
+            if (len(bindings) % 2 != 0):
+                raise mal.MalError("LetError", "Insufficient bind forms")
+            new_env = menv.MalEnv(outer=env)
+            if len(bindings) == 0:
+                return ast[2], new_env, PUSHED
+            check_let_symbol(bindings[0])
+            stack.append([LET, new_env, bindings, 0, ast[2]])
+            return bindings[1], new_env, PUSHED
+        elif symbol == "do":
+            if len(ast) > 2:
+                stack.append([DO, env, ast, 1])
+                return ast[1], env, PUSHED
+            return ast[-1], env, PUSHED
+        elif symbol == "if":
+            if len(ast) < 3:
+                raise mal.MalError("ArgError",
+                                   "'if' requires 2-3 arguments, "
+                                   "received {}".format(len(ast) - 1))
+            stack.append([IF, env, ast])
+            return ast[1], env, PUSHED
+        elif symbol == "fn*":
+            return None, None, make_function(env, ast[1], ast[2])
+        elif symbol == "quote":
+            return None, None, ast[1]
+        elif symbol == "quasiquote":
+            return analyzer.mal_quasiquote(ast[1]), env, PUSHED
+        elif symbol == "macroexpand":
+            return None, None, analyzer.macroexpand(ast[1], env)
+
+    stack.append([ARGS, env, ast, []])
+    return ast[0], env, PUSHED
+
+
+def check_let_symbol(symbol):
+    if type(symbol) is not mal.Symbol:
+        raise mal.MalError("LetError", "Attempt to bind to non-symbol")
+
+
+def call(fn, values, stack):
+    """Call FN with the arguments in VALUES, which start with FN itself.
+
+    Return the value of the call, or PUSHED if the call has been set up on
+    STACK instead: then the environment and the form to evaluate are pushed
+    onto STACK, in that order.
+
+    """
+    if type(fn) is mal.Builtin:
+        if fn.fn is core.mal_apply or fn.fn is core.mal_map:
+            return call_higher_order(fn, values[1:], stack)
+        elif len(values) == 2:
+            return fn.fn1(values[1])
+        elif len(values) == 3:
+            return fn.fn2(values[1], values[2])
+        return fn.fn(*values[1:])
+    elif is_stack_function(fn):
+        if profiler.current is not None:
+            profiler.current.count(fn)
+        stack.append(menv.MalEnv(outer=fn.env, binds=fn.params,
+                                 exprs=values[1:]))
+        stack.append(fn.ast)
+        return PUSHED
+    elif type(fn) is mal.Function:
+        return fn.fn(*values[1:])
+    else:
+        raise mal.MalError("ApplyError", "'{}' is not callable".format(fn))
+
+
+def call_higher_order(fn, args, stack):
+    """Call FN, the builtin apply or map, with ARGS.
+
+    Set up calls to Mal functions on STACK, as described for call().
+
+    """
+    if fn.fn is core.mal_apply and len(args) >= 2:
+        applied = args[0]
+        if (is_stack_function(applied) and
+                isinstance(args[-1], (mal.List, mal.Vector))):
+            stack.append(menv.MalEnv(
+                outer=applied.env, binds=applied.params,
+                exprs=list(args[1:-1]) + list(args[-1])))
+            stack.append(applied.ast)
+            return PUSHED
+    elif fn.fn is core.mal_map and len(args) == 2:
+        mapped, items = args
+        if (is_stack_function(mapped) and
+                isinstance(items, (mal.List, mal.Vector)) and
+                len(items) > 0):
+            stack.append([MAP, None, mapped, items, []])
+            stack.append(menv.MalEnv(outer=mapped.env, binds=mapped.params,
+                                     exprs=[items[0]]))
+            stack.append(mapped.ast)
+            return PUSHED
+    return fn.fn(*args)
+
+
+def is_stack_function(fn):
+    """Return True if FN is a Mal function that can be run on the stack."""
+    return type(fn) is mal.Function and fn.code is None
+
+
+def make_function(environment, syms, body):
+    if mal.Symbol('&') in syms:
+        if list(syms).index(mal.Symbol('&')) != len(syms) - 2:
+            raise mal.MalError("BindsError", "Illegal binds list")
+
+    function = mal.Function(None, syms, body, environment)
+
+    def mal_closure(*params):
+        if profiler.current is not None:
+            profiler.current.count(function)
+        new_env = menv.MalEnv(outer=environment, binds=syms, exprs=params)
+        return run(body, new_env)
+
+    function.fn = mal_closure
+    return function
+
+
+profiler.frame_functions[make_function(None, [], None).fn.__code__] = (
+    lambda frame: frame.f_locals['function'])
@@ -0,0 +1,140 @@
+import unittest
+
+import analyzer
+import pymal
+import mal_types as mal
+import core
+import mal_env as menv
+from eval_assert import EvalAssert
+
+import tests_step2
+import tests_step3
+import tests_step4
+import tests_step5
+import tests_step6
+import tests_step7
+import tests_step8
+import tests_step9
+import tests_stepA
+import tests_core
+import tests_image
+
+
+class Analyzed():
+    """Mixin running a test case with the analyzer enabled."""
+
+    def setUp(self):
+        pymal.use_analyzer = True
+        super().setUp()
+
+    def tearDown(self):
+        pymal.use_analyzer = False
+        super().tearDown()
+
+
+class TestStep2Analyzed(Analyzed, tests_step2.TestStep2):
+    pass
+
+
+class TestStep3Analyzed(Analyzed, tests_step3.TestStep3):
+    pass
+
+
+class TestStep4Analyzed(Analyzed, tests_step4.TestStep4):
+    pass
+
+
+class TestStep5Analyzed(Analyzed, tests_step5.TestStep5):
+    pass
+
+
+class TestStep6Analyzed(Analyzed, tests_step6.TestStep6):
+    pass
+
+
+class TestStep7Analyzed(Analyzed, tests_step7.TestStep7):
+    pass
+
+
+class TestStep8Analyzed(Analyzed, tests_step8.TestStep8):
+    pass
+
+
+class TestStep9Analyzed(Analyzed, tests_step9.TestStep9):
+    pass
+
+
+class TestStepAAnalyzed(Analyzed, tests_stepA.TestStepA):
+    pass
+
+
+class TestCoreAnalyzed(Analyzed, tests_core.TestCore):
+    pass
+
+
+class TestAnalyzer(Analyzed, unittest.TestCase, EvalAssert):
+    def setUp(self):
+        super().setUp()
+        self.env = menv.MalEnv()
+        for sym in core.ns:
+            self.env.set(sym, core.ns[sym])
+        self.env.set("eval", mal.Builtin(pymal.mal_eval))
+        self.env.set("swap!", mal.Builtin(pymal.mal_swap))
+        pymal.repl_env = self.env
+
+    def test_macro_defined_in_same_form(self):
+        self.assertEval('(do (defmacro! one (fn* () 1)) (one))',
+                        self.env, '1')
+
+    def test_tail_call_in_catch(self):
+        pymal.rep('(def! loop (fn* (n)'
+                  '  (if (= n 0)'
+                  '    0'
+                  '    (try* (throw n) (catch* e (loop (- n 1)))))))',
+                  self.env)
+        self.assertEval('(loop 10)', self.env, '0')
+
+    def test_error_in_argument(self):
+        with self.assertRaises(mal.SymbolError):
+            pymal.EVAL(pymal.READ('(+ 1 (abc))'), self.env)
+
+    def test_lexical_addressing(self):
+        pymal.rep('(def! x 1)', self.env)
+        self.assertEval('(let* (x 2) (let* (y 3) ((fn* (z) (+ x y z)) 4)))',
+                        self.env, '9')
+        self.assertEval('(let* (x (+ x 1)) x)', self.env, '2')
+        self.assertEval('(let* (x 5 x (+ x 1)) x)', self.env, '6')
+        self.assertEval('(let* [a (fn* [] b) b 2] (a))', self.env, '2')
+        self.assertEval('(do (def! glob 7) (let* [a (fn* [] glob) glob 3]'
+                        '  (a)))', self.env, '3')
+        self.assertEval('((fn* (a & more) (list a more)) 1 2 3)',
+                        self.env, '(1 (2 3))')
+        self.assertEval('((fn* (a b) (list a b)) 1)', self.env, '(1 nil)')
+
+    def test_bound_locals(self):
+        # Locals read after their binding are read from their slot directly.
+        node = analyzer.analyze(pymal.READ('(let* [x 1 y x] y)'))
+        cells = dict(zip(node.__code__.co_freevars, node.__closure__))
+        body = cells['body'].cell_contents
+        self.assertEqual(body.__name__, 'local_node')
+        self.assertEqual([value.__name__ for slot, value
+                          in cells['bindings'].cell_contents],
+                         ['constant_node', 'local_node'])
+
+    def test_closures_capture_frames(self):
+        pymal.rep('(def! adder (fn* (n) (fn* (m) (+ n m))))', self.env)
+        pymal.rep('(def! add2 (adder 2))', self.env)
+        pymal.rep('(def! add5 (adder 5))', self.env)
+        self.assertEval('(list (add2 1) (add5 1))', self.env, '(3 6)')
+
+    def test_local_recursion(self):
+        self.assertEval('(let* (f (fn* (n) (if (= n 0) 0 (f (- n 1)))))'
+                        '  (f 5))', self.env, '0')
+        self.assertEval('(let* (a 1)'
+                        '  (do (def! g (fn* (n) (if (= n 0) a (g (- n 1)))))'
+                        '      (g 3)))', self.env, '1')
+        self.assertEval('g', self.env, "Symbol value is void: 'g'")
+
+
+class TestImageAnalyzed(Analyzed, tests_image.TestImage):
+    pass
@@ -0,0 +1,251 @@
+import concurrent.futures
+import os
+import sys
+import tempfile
+import tracemalloc
+import unittest
+
+import pymal
+import mal_types as mal
+import core
+import mal_env as menv
+from eval_assert import EvalAssert
+
+
+class TestCore(unittest.TestCase, EvalAssert):
+    def setUp(self):
+        self.env = menv.MalEnv()
+        for sym in core.ns:
+            self.env.set(sym, core.ns[sym])
+
+        # Add 'eval' and 'swap!' functions
+        self.env.set("eval", mal.Builtin(pymal.mal_eval))
+        self.env.set("swap!", mal.Builtin(pymal.mal_swap))
+        # set repl_env for 'eval'
+        pymal.repl_env = self.env
+
+        # Add 'load-file' and use it to load the prelude
+        self.env.set("load-file", mal.Builtin(pymal.mal_load_file))
+        pymal.rep('(load-file "prelude.mal")', self.env)
+
+    def check_prelude_functions(self):
+        self.assertEval('(list (inc 1) (dec 1) (zero? 0) (zero? 1))',
+                        self.env, '(2 0 true false)')
+        self.assertEval('(list (not nil) (not false) (not 0) (identity 5))',
+                        self.env, '(true true false 5)')
+        self.assertEval('(reduce + 0 (list 1 2 3))', self.env, '6')
+        self.assertEval('(reduce (fn* (acc x) (cons x acc)) () [1 2 3])',
+                        self.env, '(3 2 1)')
+        self.assertEval('(reduce + 5 nil)', self.env, '5')
+        self.assertEval('(every? (fn* (x) (> x 0)) [1 2 3])',
+                        self.env, 'true')
+        self.assertEval('(every? (fn* (x) (> x 1)) [1 2 3])',
+                        self.env, 'false')
+        self.assertEval('(every? nil? ())', self.env, 'true')
+        self.assertEval('(some (fn* (x) (if (> x 1) (* 10 x))) [1 2 3])',
+                        self.env, '20')
+        self.assertEval('(some nil? [1 2 3])', self.env, 'nil')
+
+    def test_native_prelude_functions(self):
+        self.assertIs(type(self.env.get('reduce')), mal.Builtin)
+        self.check_prelude_functions()
+        self.assertEval('(reduce + 0 (list 1 "a"))',
+                        self.env, "'+': Wrong type argument")
+
+    def test_fallback_prelude_functions(self):
+        pymal.rep('(load-file "prelude-fallback.mal")', self.env)
+        self.assertIs(type(self.env.get('reduce')), mal.Function)
+        self.check_prelude_functions()
+
+    def test_concurrent_swap(self):
+        # Switch threads often, so that they run swap! at the same time.
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            pymal.rep('(def! n (atom 0))', self.env)
+            pymal.rep('(def! add (fn* [k] (if (> k 0)'
+                      '  (do (swap! n (fn* [x] (+ x 1))) (add (- k 1))))))',
+                      self.env)
+            self.assertEval('(map deref (map (fn* [i] (future (add 200)))'
+                            '  [1 2 3 4 5 6 7 8]))', self.env,
+                            '(nil nil nil nil nil nil nil nil)')
+        finally:
+            sys.setswitchinterval(interval)
+        self.assertEval('@n', self.env, '1600')
+
+    def test_future(self):
+        self.assertEval('(let* [f (future (+ 1 2))] (list @f (future? f)'
+                        '  (future-done? f) (future? 3)))', self.env,
+                        '(3 true true false)')
+        self.assertEval('@(future-call (fn* [] :a))', self.env, ':a')
+        pending = mal.Future(concurrent.futures.Future())
+        self.assertEqual(core.mal_deref(pending, 10, mal.Keyword(':late')),
+                         mal.Keyword(':late'))
+        self.assertEval('(let* [a (atom 0) f (future (swap! a inc) @a)]'
+                        '  (deref f 1000 :late))', self.env, '1')
+        self.assertEval('(try* @(future (throw "boom")) (catch* e e))',
+                        self.env, 'boom')
+        self.assertEval('(deref 1)', self.env,
+                        "Expected atom or future, received <class 'int'>")
+
+    def test_lazy_sequences(self):
+        self.assertEval('(take 5 (range))', self.env, '(0 1 2 3 4)')
+        self.assertEval('(list (range 3) (range 2 10 3) (range 5 0 -2))',
+                        self.env, '((0 1 2) (2 5 8) (5 3 1))')
+        self.assertEval('(take 4 (iterate (fn* [x] (* 2 x)) 1))', self.env,
+                        '(1 2 4 8)')
+        self.assertEval('(list (drop 2 [1 2 3]) (take 2 nil)'
+                        '  (drop 5 (range 3)))', self.env, '((3) () ())')
+        self.assertEval('(filter (fn* [x] (> x 2)) (map inc (range 5)))',
+                        self.env, '(3 4 5)')
+        self.assertEval('(reduce + 0 (take 1000 (map inc (range))))',
+                        self.env, '500500')
+        self.assertEval('(let* [s (range 3)] (list (first s) (rest s)'
+                        '  (nth s 2) (count s) (empty? s) (seq (range 0))))',
+                        self.env, '(0 (1 2) 2 3 false nil)')
+        self.assertEval('(list (= (range 3) (list 0 1 2)) (= [0 1] (range 2))'
+                        '  (= (range 3) (range 4)) (sequential? (range 1)))',
+                        self.env, '(true true false true)')
+        self.assertEval('(list (cons 9 (range 2)) (concat (range 2) [5])'
+                        '  (apply + (range 4)) (doall (range 2)))', self.env,
+                        '((9 0 1) (0 1 5) 6 (0 1))')
+        pymal.rep('(def! nat (fn* [n] (lazy-seq (cons n (nat (+ n 1))))))',
+                  self.env)
+        self.assertEval('(list (take 3 (nat 0)) (nth (nat 0) 5000))',
+                        self.env, '((0 1 2) 5000)')
+        self.assertEval('(list (lazy-seq nil) (rest (lazy-seq [1 2])))',
+                        self.env, '(() (2))')
+        self.assertEval('(nth (range 10) -1)', self.env,
+                        'Index out of range')
+        # Errors raised while the printer realizes a sequence are reported.
+        self.assertEval('(map (fn* [x] (throw "boom")) (range 3))', self.env,
+                        'boom')
+
+    def test_lazy_realization(self):
+        pymal.rep('(def! n (atom 0))', self.env)
+        # The printed value of def! would realize the sequence.
+        pymal.rep('(do (def! s (map (fn* [x] (swap! n inc)) (range 10)))'
+                  '  nil)', self.env)
+        self.assertEval('@n', self.env, '0')
+        self.assertEval('(first (rest s))', self.env, '2')
+        self.assertEval('(first (rest s))', self.env, '2')
+        self.assertEval('@n', self.env, '2')
+        self.assertEval('(list (count s) (count s) (seq s))', self.env,
+                        '(10 10 (1 2 3 4 5 6 7 8 9 10))')
+        self.assertEval('s', self.env, '(1 2 3 4 5 6 7 8 9 10)')
+        self.assertEval('@n', self.env, '10')
+
+    def test_lazy_memory(self):
+        # Reducing a lazy sequence keeps none of its elements, even while
+        # the sequence is referred to.
+        pymal.rep('(do (def! big (map inc (range 50000))) nil)', self.env)
+        for form, value in [('(reduce + 0 (range 50000))', '1249975000'),
+                            ('(count big)', '50000'),
+                            ('(transduce (map inc) + big)', '1250075000'),
+                            ('(nth (filter (fn* [x] true) big) 49999)',
+                             '50000')]:
+            tracemalloc.start()
+            self.assertEval(form, self.env, value)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            self.assertLess(peak, 500000, form)
+
+    def test_meta_shares_state(self):
+        pymal.rep('(do (def! n (atom 0))'
+                  '  (def! s (map (fn* [x] (swap! n inc)) (range 3)))'
+                  '  (def! t (with-meta s {:a 1})) nil)', self.env)
+        self.assertEval('(list (meta t) (meta s) t s)', self.env,
+                        '({:a 1} nil (1 2 3) (1 2 3))')
+        self.assertEval('@n', self.env, '3')
+        self.assertEval('(list (meta (with-meta (map inc) 1))'
+                        '  (into [] (with-meta (map inc) 1) [1])'
+                        '  (meta (with-meta (future 1) 2))'
+                        '  @(with-meta (future 3) 2))', self.env,
+                        '(1 [2] 2 3)')
+
+    def test_transducers(self):
+        pymal.rep('(def! xf (comp (map inc) (filter (fn* [x] (> x 2)))'
+                  '  (take 3)))', self.env)
+        self.assertEval('(list (transduce xf + 0 (range))'
+                        '  (transduce xf + (range 10)))', self.env, '(12 12)')
+        self.assertEval('(list (into [] xf (range 100)) (into (list 9) [1 2])'
+                        '  (into {} (map (fn* [x] [(str x) x])) [1]))',
+                        self.env, '([3 4 5] (2 1 9) {"1" 1})')
+        self.assertEval('(list (sequence xf (range))'
+                        '  (sequence (drop 2) [1 2 3 4]))', self.env,
+                        '((3 4 5) (3 4))')
+        self.assertEval('(list ((comp inc inc) 1) ((comp str +) 1 2)'
+                        '  ((comp) 3))', self.env, '(3 "3" 3)')
+        self.assertEval('(transduce (map inc) 1 [])', self.env,
+                        "'transduce': Expected function, received 1")
+        self.assertEval('(into [] 1 [])', self.env,
+                        "'into': Expected transducer, received 1")
+
+    def test_files(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.env.set("path", os.path.join(directory, "lines.txt"))
+            self.assertEval('(spit path "one\\ntwo\\n")', self.env, 'nil')
+            self.assertEval('(spit path 3 :append true)', self.env, 'nil')
+            self.assertEval('(slurp path)', self.env, '"one\\ntwo\\n3"')
+            self.assertEval('(line-seq path)', self.env,
+                            '("one" "two" "3")')
+            self.assertEval('(with-open [f (open path)]'
+                            '  (list (read-line f) (first (line-seq f))'
+                            '    (read-line f) (read-line f)))', self.env,
+                            '("one" "two" "3" nil)')
+            self.assertEval('(with-open [f (open path)]'
+                            '  (let* [s (line-seq f)]'
+                            '    (list (count s) (first s) (doall s))))',
+                            self.env, '(3 "one" ("one" "two" "3"))')
+            self.assertEval('(with-open [f (open path)] (line-seq f))',
+                            self.env, "'line-seq': File is closed")
+            self.assertEval('(with-open [f (open path)]'
+                            '  (read-line (with-meta f {:a 1})))', self.env,
+                            '"one"')
+            pymal.rep('(def! g (with-open [f (open path "a")]'
+                      '  (write-line f "four") f))', self.env)
+            self.assertEval('g', self.env,
+                            '#<closed file {}>'.format(self.env.get("path")))
+            self.assertEval('(read-line g)', self.env,
+                            "'read-line': File is closed")
+            self.assertEval('(line-seq path)', self.env,
+                            '("one" "two" "3four")')
+            self.assertEval('(open (str path "x"))', self.env,
+                            'File not found')
+
+    def test_large_files(self):
+        # Lines counted or reduced are not kept.
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "large.log")
+            with open(path, 'w') as f:
+                for i in range(20000):
+                    print("line {} of a large log file".format(i), file=f)
+            self.env.set("path", path)
+            for form, value in [
+                    ('(count (line-seq path))', '20000'),
+                    ('(reduce (fn* [n line] (+ n 1)) 0 (line-seq path))',
+                     '20000'),
+                    ('(with-open [f (open path)]'
+                     '  (let* [s (line-seq f)] (+ (count s) (count s))))',
+                     '40000')]:
+                tracemalloc.start()
+                self.assertEval(form, self.env, value)
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                self.assertLess(peak, 500000, form)
+
+    def test_binary_files(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.env.set("path", os.path.join(directory, "data"))
+            self.assertEval('(with-open [f (open path "wb")]'
+                            '  (write f [0 255 10 200]))', self.env, 'nil')
+            self.assertEval('(with-open [f (open path "rb")]'
+                            '  (list (read-bytes f 2) (read-bytes f)'
+                            '    (read-bytes f)))', self.env,
+                            '([0 255] [10 200] nil)')
+            # Text that is not UTF-8 is written back unchanged.
+            pymal.rep('(spit (str path 2) (slurp path))', self.env)
+            with open(self.env.get("path") + "2", 'rb') as f:
+                self.assertEqual(f.read(), bytes([0, 255, 10, 200]))
+            self.assertEval('(with-open [f (open path "rb")] (read-line f))',
+                            self.env, "'read-line': Expected text file")
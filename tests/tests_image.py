@@ -0,0 +1,64 @@
+import os
+import tempfile
+import unittest
+
+import pymal
+import mal_env as menv
+from eval_assert import EvalAssert
+
+
+class TestImage(unittest.TestCase, EvalAssert):
+    def setUp(self):
+        self.env = menv.MalEnv()
+        ns = pymal.builtins()
+        for sym in ns:
+            self.env.set(sym, ns[sym])
+        pymal.repl_env = self.env
+        pymal.rep('(load-file "prelude.mal")', self.env)
+
+        self.dir = tempfile.TemporaryDirectory()
+        self.file = os.path.join(self.dir.name, "test.image")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def reload(self):
+        self.assertEval('(dump-image "{}")'.format(self.file), self.env, 'nil')
+        self.env = pymal.load_image(self.file)
+        pymal.repl_env = self.env
+
+    def test_functions_and_closures(self):
+        pymal.rep('(def! fact (fn* (n) (if (<= n 1) 1 (* n (fact (- n 1))))))',
+                  self.env)
+        pymal.rep('(def! adder (fn* (n) (fn* (m) (+ n m))))', self.env)
+        pymal.rep('(def! add2 (with-meta (adder 2) {:doc "add 2"}))',
+                  self.env)
+        pymal.rep('(def! counter (let* (a (atom 0))'
+                  '                (fn* () (swap! a inc))))', self.env)
+        pymal.rep('(counter)', self.env)
+        self.reload()
+        self.assertEval('(fact 5)', self.env, '120')
+        self.assertEval('(list (add2 1) ((adder 5) 1))', self.env, '(3 6)')
+        self.assertEval('(meta add2)', self.env, '{:doc "add 2"}')
+        self.assertEval('(counter)', self.env, '2')
+        self.assertEval('(counter)', self.env, '3')
+
+    def test_data_and_macros(self):
+        pymal.rep('(def! data {:a [1 2 (list 3 nil true)] "b" (atom "c")})',
+                  self.env)
+        pymal.rep('(defmacro! unless (fn* (c a b) `(if ~c ~b ~a)))', self.env)
+        self.reload()
+        self.assertEval('(get data :a)', self.env, '[1 2 (3 nil true)]')
+        self.assertEval('@(get data "b")', self.env, '"c"')
+        self.assertEval('(nil? (nth (nth (get data :a) 2) 1))',
+                        self.env, 'true')
+        self.assertEval('(unless false 7 8)', self.env, '7')
+        self.assertEval('(cond false 1 :else 2)', self.env, '2')
+        self.assertEval('(reduce + 0 [1 2 3])', self.env, '6')
+        self.assertEval('(eval (read-string "(+ 1 2)"))', self.env, '3')
+
+    def test_load_errors(self):
+        with open(self.file, 'w') as f:
+            f.write('not an image')
+        self.assertIs(pymal.load_image(self.file), None)
+        self.assertIs(pymal.load_image(self.file + "x"), None)
@@ -0,0 +1,99 @@
+import os
+import tempfile
+import unittest
+
+import pymal
+import malc
+import mal_types as mal
+import core
+import mal_env as menv
+from eval_assert import EvalAssert
+
+
+class TestMalc(unittest.TestCase, EvalAssert):
+    def setUp(self):
+        self.env = menv.MalEnv()
+        for sym in core.ns:
+            self.env.set(sym, core.ns[sym])
+        self.env.set("eval", mal.Builtin(pymal.mal_eval))
+        self.env.set("load-file", mal.Builtin(pymal.mal_load_file))
+        pymal.repl_env = self.env
+
+        self.dir = tempfile.TemporaryDirectory()
+        self.file = os.path.join(self.dir.name, "test.mal")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def write(self, source, mtime):
+        with open(self.file, 'w') as f:
+            f.write(source)
+        os.utime(self.file, ns=(mtime, mtime))
+
+    def load(self):
+        return pymal.rep('(load-file "{}")'.format(self.file), self.env)
+
+    def test_cache_is_used(self):
+        self.write('(def! a {:b [1 nil "c"]}) (list a)', 1)
+        self.assertEqual(self.load(), '({:b [1 nil "c"]})')
+        self.assertTrue(os.path.exists(self.file + 'c'))
+        self.assertEqual(list(malc.read_file(self.file)),
+                         [pymal.READ('(def! a {:b [1 nil "c"]})'),
+                          pymal.READ('(list a)')])
+        self.assertEval('(nil? (nth (get a :b) 1))', self.env, 'true')
+
+        # Change the source without changing its size or mtime, to see that
+        # the cache file is read instead.
+        self.write('(def! a {:b [2 nil "c"]}) (list a)', 1)
+        self.assertEqual(self.load(), '({:b [1 nil "c"]})')
+
+    def test_cache_is_updated(self):
+        self.write('(+ 1 2)', 1)
+        self.assertEqual(self.load(), '3')
+        self.write('(+ 1 3)', 2)
+        self.assertEqual(self.load(), '4')
+        self.assertEqual(list(malc.read_file(self.file)),
+                         [pymal.READ('(+ 1 3)')])
+
+    def test_no_cache_on_errors(self):
+        self.write('(+ 1 2) (+ 1', 1)
+        self.assertEqual(self.load(), 'Missing closing parenthesis')
+        self.write('(abc) (+ 1 2)', 2)
+        self.assertEqual(self.load(), "Symbol value is void: 'abc'")
+        self.assertEqual(os.listdir(self.dir.name), ['test.mal'])
+
+    def test_cache_disabled(self):
+        malc.enabled = False
+        try:
+            self.write('(+ 1 2)', 1)
+            self.assertEqual(self.load(), '3')
+        finally:
+            malc.enabled = True
+        self.assertFalse(os.path.exists(self.file + 'c'))
+
+    def test_encoding(self):
+        # Files are read as by slurp, whatever the locale.
+        with open(self.file, 'wb') as f:
+            f.write('(def! s "\u00e9'.encode('utf-8') + b'\xff")')
+        for i in range(2):
+            self.load()
+            self.assertEval('(= (str "(def! s \\"" s "\\")")'
+                            '  (slurp "{}"))'.format(self.file), self.env,
+                            'true')
+
+    def test_error_locations(self):
+        self.write('(def! f (fn* (x)\n  (+ 1\n     (nth x 5))))', 1)
+        # The second time, the forms are read from the cache file.
+        for use_analyzer, use_stack in [(False, False), (False, False),
+                                        (True, False), (False, True)]:
+            pymal.use_analyzer = use_analyzer
+            pymal.use_stack = use_stack
+            try:
+                pymal.mal_load_file(self.file)
+                with self.assertRaises(mal.MalError) as cm:
+                    pymal.EVAL(pymal.READ('(f [1])'), self.env)
+            finally:
+                pymal.use_analyzer = False
+                pymal.use_stack = False
+            self.assertEqual(cm.exception.location, (self.file, 3, 6))
+            self.assertTrue(os.path.exists(self.file + 'c'))
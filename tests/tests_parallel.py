@@ -0,0 +1,67 @@
+import unittest
+
+import pymal
+import parallel
+import mal_env as menv
+from eval_assert import EvalAssert
+
+
+class TestParallel(unittest.TestCase, EvalAssert):
+    def setUp(self):
+        self.env = menv.MalEnv()
+        for name, value in pymal.builtins().items():
+            self.env.set(name, value)
+        pymal.repl_env = self.env
+        pymal.rep('(load-file "prelude.mal")', self.env)
+        pymal.rep('(def! fib (fn* [n]'
+                  '  (if (< n 2) n (+ (fib (- n 1)) (fib (- n 2))))))',
+                  self.env)
+
+    @classmethod
+    def tearDownClass(cls):
+        parallel.shutdown()
+
+    def check_parallel(self):
+        self.assertEval('(pmap fib (list 1 2 3 4 5 6 7 8 9 10))', self.env,
+                        '(1 1 2 3 5 8 13 21 34 55)')
+        self.assertEval('(pmap inc [])', self.env, '()')
+        self.assertEval('(let* [k 10] (pmap (fn* [x] (+ k x)) [1 2]))',
+                        self.env, '(11 12)')
+        self.assertEval('(pcall (fn* [] (fib 10)) (fn* [] (eval \'(fib 5)))'
+                        '  (fn* [] (-> 1 inc)))', self.env, '(55 5 2)')
+        self.assertEval('(map (fn* [f] (f)) (pmap (fn* [x] (fn* [] x)) [1]))',
+                        self.env, '(1)')
+
+    def test_parallel(self):
+        self.check_parallel()
+
+    def test_parallel_analyzer(self):
+        pymal.use_analyzer = True
+        try:
+            self.check_parallel()
+        finally:
+            pymal.use_analyzer = False
+
+    def test_errors(self):
+        self.assertEval('(try* (pmap (fn* [x] (throw {:x x})) [1 2 3])'
+                        '  (catch* e e))', self.env, '{:x 1}')
+        self.assertEval('(pmap (fn* [x] (nth [] x)) [1])', self.env,
+                        'Index out of range')
+        self.assertEval('(pmap 1 [1])', self.env,
+                        "'pmap': Expected function, received 1")
+
+    def test_unpicklable_globals(self):
+        # Globals that cannot be sent to the workers are left out.
+        pymal.rep('(do (def! xs (range 10)) (def! xf (map inc)) nil)',
+                  self.env)
+        self.check_parallel()
+        self.assertEval('(pmap (fn* [i] (nth xs i)) [1])', self.env,
+                        "Cannot send to worker: 'xs': "
+                        "Cannot pickle a lazy sequence")
+
+    def test_worker_copies(self):
+        # Changes made by the workers are not seen by the caller.
+        pymal.rep('(def! a (atom 0))', self.env)
+        self.assertEval('(pmap (fn* [x] (swap! a + x)) [1 2])', self.env,
+                        '(1 2)')
+        self.assertEval('@a', self.env, '0')
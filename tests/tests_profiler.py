@@ -0,0 +1,80 @@
+import io
+import os
+import tempfile
+import unittest
+
+import pymal
+import profiler
+import core
+import mal_env as menv
+
+
+class TestProfiler(unittest.TestCase):
+    def setUp(self):
+        self.env = menv.MalEnv()
+        for sym in core.ns:
+            self.env.set(sym, core.ns[sym])
+        pymal.repl_env = self.env
+
+    def profile(self, line):
+        profile = profiler.Profiler(self.env, interval=0.0005)
+        profile.start()
+        try:
+            result = pymal.rep(line, self.env)
+        finally:
+            profile.stop()
+        return profile, result
+
+    def check_profile(self):
+        pymal.rep('(def! fib (fn* (n)'
+                  '  (if (< n 2) n (+ (fib (- n 1)) (fib (- n 2))))))',
+                  self.env)
+        pymal.rep('(def! twice (fn* (f) (fn* (x) (f (f x)))))', self.env)
+        profile, result = self.profile('(list (fib 15) ((twice inc) 1)'
+                                       '  (map (twice inc) [1]))')
+        self.assertEqual(result, '(610 3 (3))')
+        names = profile.names()
+        calls = {names[key]: count for key, count in profile.calls.items()}
+        self.assertEqual(calls['fib'], 1973)
+        self.assertEqual(calls['<'], 1973)
+        self.assertEqual(calls['twice'], 2)
+        self.assertEqual(calls['(fn* (x))'], 2)
+        self.assertEqual(calls['inc'], 4)
+        self.assertEqual(calls['map'], 1)
+
+        # The builtins are restored.
+        self.assertIs(self.env.get('<').fn2, core.mal_less2)
+        self.assertIsNone(profiler.current)
+
+        report = io.StringIO()
+        profile.report(report)
+        self.assertIn('fib', report.getvalue())
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'stacks')
+            profile.write_collapsed(filename)
+            with open(filename) as f:
+                lines = f.read().splitlines()
+        self.assertTrue(lines)
+        for line in lines:
+            stack, samples = line.rsplit(' ', 1)
+            self.assertGreater(int(samples), 0)
+        return lines
+
+    def test_profile(self):
+        lines = self.check_profile()
+        self.assertTrue(any(line.startswith('fib;fib') for line in lines))
+
+    def test_profile_analyzed(self):
+        pymal.use_analyzer = True
+        try:
+            lines = self.check_profile()
+        finally:
+            pymal.use_analyzer = False
+        self.assertTrue(any(line.startswith('fib;fib') for line in lines))
+
+    def test_profile_stacked(self):
+        pymal.use_stack = True
+        try:
+            self.check_profile()
+        finally:
+            pymal.use_stack = False
@@ -0,0 +1,135 @@
+import unittest
+
+import pymal
+import mal_types as mal
+import core
+import mal_env as menv
+import stack_eval
+from eval_assert import EvalAssert
+
+import tests_step2
+import tests_step3
+import tests_step4
+import tests_step5
+import tests_step6
+import tests_step7
+import tests_step8
+import tests_step9
+import tests_stepA
+import tests_core
+import tests_image
+
+
+class Stacked():
+    """Mixin running a test case with the explicit-stack evaluator."""
+
+    def setUp(self):
+        pymal.use_stack = True
+        super().setUp()
+
+    def tearDown(self):
+        pymal.use_stack = False
+        stack_eval.max_depth = None
+        super().tearDown()
+
+
+class TestStep2Stacked(Stacked, tests_step2.TestStep2):
+    pass
+
+
+class TestStep3Stacked(Stacked, tests_step3.TestStep3):
+    pass
+
+
+class TestStep4Stacked(Stacked, tests_step4.TestStep4):
+    pass
+
+
+class TestStep5Stacked(Stacked, tests_step5.TestStep5):
+    pass
+
+
+class TestStep6Stacked(Stacked, tests_step6.TestStep6):
+    pass
+
+
+class TestStep7Stacked(Stacked, tests_step7.TestStep7):
+    pass
+
+
+class TestStep8Stacked(Stacked, tests_step8.TestStep8):
+    pass
+
+
+class TestStep9Stacked(Stacked, tests_step9.TestStep9):
+    pass
+
+
+class TestStepAStacked(Stacked, tests_stepA.TestStepA):
+    pass
+
+
+class TestCoreStacked(Stacked, tests_core.TestCore):
+    pass
+
+
+class TestImageStacked(Stacked, tests_image.TestImage):
+    pass
+
+
+class TestStackEval(Stacked, unittest.TestCase, EvalAssert):
+    def setUp(self):
+        super().setUp()
+        self.env = menv.MalEnv()
+        for sym in core.ns:
+            self.env.set(sym, core.ns[sym])
+        self.env.set("eval", mal.Builtin(pymal.mal_eval))
+        self.env.set("swap!", mal.Builtin(pymal.mal_swap))
+        pymal.repl_env = self.env
+
+    def test_deep_recursion(self):
+        pymal.rep('(def! sum (fn* (n) (if (= n 0) 0 (+ n (sum (- n 1))))))',
+                  self.env)
+        self.assertEval('(sum 100000)', self.env, '5000050000')
+
+    def test_deep_recursion_through_builtins(self):
+        pymal.rep('(def! depth (fn* (n)'
+                  '  (if (= n 0)'
+                  '    0'
+                  '    (+ 1 (first (map depth (list (- n 1))))))))',
+                  self.env)
+        self.assertEval('(depth 50000)', self.env, '50000')
+        pymal.rep('(def! depth2 (fn* (n)'
+                  '  (if (= n 0) 0 (+ 1 (apply depth2 (list (- n 1)))))))',
+                  self.env)
+        self.assertEval('(depth2 50000)', self.env, '50000')
+
+    def test_deep_catch(self):
+        pymal.rep('(def! down (fn* (n)'
+                  '  (if (= n 0) (throw 0) (+ 1 (down (- n 1))))))',
+                  self.env)
+        self.assertEval('(try* (down 50000) (catch* e (list "caught" e)))',
+                        self.env, '("caught" 0)')
+        self.assertEval('(+ 1 (try* (+ 1 (down 10)) (catch* e 0)))',
+                        self.env, '1')
+
+    def test_max_depth(self):
+        pymal.rep('(def! sum (fn* (n) (if (= n 0) 0 (+ n (sum (- n 1))))))',
+                  self.env)
+        stack_eval.max_depth = 1000
+        self.assertEval('(sum 100)', self.env, '5050')
+        self.assertEval('(sum 1000)', self.env,
+                        'Maximum recursion depth exceeded')
+        self.assertEval('(try* (sum 1000) (catch* e "deep"))',
+                        self.env, '"deep"')
+
+
+class TestRecursionError(unittest.TestCase):
+    def test_recursion_error(self):
+        env = menv.MalEnv()
+        for sym in core.ns:
+            env.set(sym, core.ns[sym])
+        pymal.rep('(def! sum (fn* (n) (if (= n 0) 0 (+ n (sum (- n 1))))))',
+                  env)
+        self.assertEqual(pymal.rep('(sum 100000)', env),
+                         'Maximum recursion depth exceeded')
@@ -1,6 +1,7 @@
 import unittest
 
 import pymal
+import reader
 import mal_types as mal
 from eval_assert import EvalAssert
 
@@ -71,14 +72,15 @@ class TestStep1(unittest.TestCase, EvalAssert):
         self.assertEqual(pymal.READ("~@(1 2 3)"),
                          [mal.Symbol('splice-unquote'), [1, 2, 3]])
 
-    # Currently, the string '"abc' is read as the symbol 'abc', therefore we
-    # skip these tests for the moment.
-    @unittest.skip("Reader errors skipped.")
     def test_read_reader_errors(self):  # 9
-        self.assertIs(type(pymal.READ('(1 2')), mal.Error)
-        self.assertIs(type(pymal.READ('[1 2')), mal.Error)
-        self.assertIs(type(pymal.READ('"abc')), mal.Error)
-        self.assertIs(type(pymal.READ('(1 "abc')), mal.Error)
+        with self.assertRaises(mal.ReaderError):
+            pymal.READ('(1 2')
+        with self.assertRaises(mal.ReaderError):
+            pymal.READ('[1 2')
+        with self.assertRaises(mal.ReaderError):
+            pymal.READ('"abc')
+        with self.assertRaises(mal.ReaderError):
+            pymal.READ('(1 "abc')
 
     def test_read_keywords(self):  # 10
         self.assertEqual(pymal.READ(':kw'), mal.Keyword(':kw'))
@@ -122,3 +124,44 @@ class TestStep1(unittest.TestCase, EvalAssert):
     def test_read_deref(self):  # 14
         self.assertEqual(pymal.READ('@a'),
                          [mal.Symbol('deref'), mal.Symbol('a')])
+
+    def test_tokenize(self):
+        self.assertEqual(list(reader.tokenize('(a -1 "b\\"c" :d) ;; e')),
+                         [('(', mal.pack_location(None, 1, 1)),
+                          ('symbol', 'a'), ('int', -1), ('string', 'b"c'),
+                          ('keyword', ':d'), (')', None)])
+        self.assertEqual(list(reader.tokenize("~@x ~y 1a -")),
+                         [('~@', mal.pack_location(None, 1, 1)),
+                          ('symbol', 'x'),
+                          ('~', mal.pack_location(None, 1, 5)),
+                          ('symbol', 'y'), ('symbol', '1a'), ('symbol', '-')])
+        self.assertEqual(mal.unpack_location(mal.pack_location('f', 7, 3)),
+                         ('f', 7, 3))
+
+    def test_read_string_escapes(self):
+        self.assertEqual(pymal.READ(r'"a\\nb"'), 'a\\nb')
+        self.assertEqual(pymal.READ(r'"a\\\nb"'), 'a\\\nb')
+        self.assertEqual(pymal.READ(r'"\\\""'), '\\"')
+        self.assertEqual(pymal.READ(r'"a\tb"'), r'a\tb')
+
+    def test_tokenize_chunks(self):
+        source = '(def! s "a \\"b\\" ;c\n") ~@(12\n :kw) ; end\n ["x'
+        tokens = list(reader.tokenize(source))
+        for i in range(len(source) + 1):
+            for j in range(i, len(source) + 1):
+                chunks = [source[:i], source[i:j], source[j:]]
+                self.assertEqual(list(reader.tokenize_chunks(chunks)),
+                                 tokens)
+        self.assertIn(('~@', mal.pack_location(None, 2, 4)), tokens)
+        self.assertIn(('[', mal.pack_location(None, 4, 2)), tokens)
+
+    def test_read_locations(self):
+        form = pymal.READ('(a\n  [b {"c" (d)}]\n  \'e)')
+        self.assertEqual(mal.form_location(form), (None, 1, 1))
+        self.assertEqual(mal.form_location(form[1]), (None, 2, 3))
+        self.assertEqual(mal.form_location(form[1][1]), (None, 2, 6))
+        self.assertEqual(mal.form_location(form[1][1]['c']), (None, 2, 11))
+        self.assertEqual(mal.form_location(form[2]), (None, 3, 3))
+        with self.assertRaises(mal.ReaderError) as cm:
+            pymal.READ('(a\n (b)\n (c')
+        self.assertEqual(cm.exception.location, (None, 3, 2))
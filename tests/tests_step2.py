@@ -25,6 +25,24 @@ class TestStep2(unittest.TestCase, EvalAssert):
         self.assertEval('{"a" (+ 7 8)}', self.env, '{"a" 15}')
         self.assertEval('{:a (+ 7 8)}', self.env, '{:a 15}')
 
+    def test_arities(self):
+        self.assertEval('(list (+) (+ 1) (+ 1 2) (+ 1 2 3))',
+                        self.env, '(0 1 3 6)')
+        self.assertEval('(list (- 5) (- 5 2) (- 5 2 1))', self.env,
+                        '(-5 3 2)')
+        self.assertEval('(list (* 2) (* 2 3) (/ 7 2) (/ 12 2 3))', self.env,
+                        '(2 6 3 2)')
+        self.assertEval('(list (< 1 2) (<= 2 1) (> 2 1) (>= 1 1) (< 1 2 0))',
+                        self.env, '(true false true true false)')
+        self.assertEval('(list (= 1) (= 1 1) (= (list 1) [1]) (= 1 1 2))',
+                        self.env, '(true true true false)')
+        self.assertEval('(+ 1 "a")', self.env, "'+': Wrong type argument")
+        self.assertEval('(- "a")', self.env, "'-': Wrong type argument")
+        self.assertEval('(/ 1 0)', self.env, 'Division by zero')
+        self.assertEval('(< "a" 1)', self.env, 'Wrong type argument: '
+                        "expected number, got <class 'str'>")
+
     def test_eval_error(self):  # 16
         ast = pymal.READ('(abc 1 2 3)')
-        self.assertIs(type(pymal.EVAL(ast, self.env)), mal.Error)
+        with self.assertRaises(mal.MalError):
+            pymal.EVAL(ast, self.env)
@@ -107,6 +107,7 @@ class TestStep4(unittest.TestCase, EvalAssert):
                         self.env, '2')
         self.assertEval('( (fn* (a & more) (count more)) 1)', self.env, '0')
         self.assertEval('( (fn* (a & more) (list? more)) 1)', self.env, 'true')
+        self.assertEval('(fn* [& a b] 1)', self.env, 'Illegal binds list')
 
     def test_not(self):  # 30
         pymal.rep("(def! not (fn* (a) (if a false true)))", self.env)
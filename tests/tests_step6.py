@@ -3,6 +3,7 @@ from contextlib import redirect_stdout
 import unittest
 
 import pymal
+import reader
 import mal_types as mal
 import core
 import mal_env as menv
@@ -18,10 +19,7 @@ class TestStep6(unittest.TestCase, EvalAssert):
         self.env.set("eval", mal.Builtin(pymal.mal_eval))
         self.env.set("swap!", mal.Builtin(pymal.mal_swap))
 
-        pymal.rep('(def! load-file (fn* (f)'
-                  '  (eval'
-                  '    (read-string (str "(do " (slurp f) ")")))))',
-                  self.env)
+        self.env.set("load-file", mal.Builtin(pymal.mal_load_file))
         # Set up a mock *ARGV*
         self.env.set("*ARGV*", mal.List([]))
         # set repl_env for 'eval'
@@ -45,6 +43,22 @@ class TestStep6(unittest.TestCase, EvalAssert):
         self.assertEval('(inc2 7)', self.env, '9')
         self.assertEval('(inc3 9)', self.env, '12')
 
+    def test_load_file_in_chunks(self):
+        chunk_size = reader.chunk_size
+        reader.chunk_size = 7
+        try:
+            self.assertEval('(load-file "tests/incD.mal")', self.env,
+                            'Missing closing parenthesis')
+        finally:
+            reader.chunk_size = chunk_size
+        self.assertEval('(incD1 7)', self.env, '8')
+        self.assertEval('long-string', self.env,
+                        '"0123456789 0123456789 0123456789"')
+        self.assertEval('(load-file "tests/incB.mal")', self.env,
+                        '"incB.mal return string"')
+        self.assertEval('(load-file "tests/none.mal")', self.env,
+                        'File not found')
+
     def test_ARGV(self):  # 41
         self.assertEval('(list? *ARGV*)', self.env, 'true')
         self.assertEval('*ARGV*', self.env, '()')
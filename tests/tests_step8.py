@@ -124,3 +124,19 @@ class TestStep8(unittest.TestCase, EvalAssert):
         self.assertEval('(->> [4]'
                         '  (concat [3]) (concat [2]) rest (concat [1]))',
                         self.env, '(1 3 4)')
+
+    def test_macro_expansion_cache(self):
+        pymal.rep('(def! n (atom 0))', self.env)
+        pymal.rep('(defmacro! counted (fn* (x)'
+                  '  (do (swap! n inc) x)))', self.env)
+        pymal.rep('(def! f (fn* (x) (counted x)))', self.env)
+        self.assertEval('(list (f 1) (f 2) (f 3))', self.env, '(1 2 3)')
+        self.assertEval('@n', self.env, '1')
+
+        pymal.rep('(defmacro! counted (fn* (x)'
+                  '  (do (swap! n inc) `(* 10 ~x))))', self.env)
+        self.assertEval('(list (f 1) (f 2))', self.env, '(10 20)')
+        self.assertEval('@n', self.env, '2')
+
+        pymal.rep('(def! counted (fn* (x) (+ x 100)))', self.env)
+        self.assertEval('(f 1)', self.env, '101')
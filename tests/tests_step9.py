@@ -62,6 +62,17 @@ class TestStep9(unittest.TestCase, EvalAssert):
         self.assertEval('(try* (map throw (list 7)) (catch* exc exc))',
                         self.env, '7')
 
+    def test_catch_errors(self):
+        self.assertEval('(try* (nth [1] 5) (catch* e e))',
+                        self.env, 'Index out of range')
+        self.assertEval('(try* (read-string "(1") (catch* e e))',
+                        self.env, 'Missing closing parenthesis')
+        self.assertEval('(try* (let* (a (undefined)) a) (catch* e e))',
+                        self.env, "Symbol value is void: 'undefined'")
+        self.assertEval('(try* (try* (throw 1) (catch* e (throw 2)))'
+                        '  (catch* e (list e)))', self.env, '(2)')
+        self.assertEval('(nth [1] 5)', self.env, 'Index out of range')
+
     def test_builin_functions(self):  # 71
         self.assertEval("(symbol? 'abc)", self.env, 'true')
         self.assertEval('(symbol? "abc")', self.env, 'false')
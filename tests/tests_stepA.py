@@ -23,10 +23,7 @@ class TestStepA(unittest.TestCase, EvalAssert):
         pymal.repl_env = self.env
 
         # Add 'load-file' and use it to load the prelude
-        pymal.rep('(def! load-file (fn* (f)'
-                  '  (eval'
-                  '    (read-string (str "(do " (slurp f) ")")))))',
-                  self.env)
+        self.env.set("load-file", mal.Builtin(pymal.mal_load_file))
         pymal.rep('(load-file "prelude.mal")', self.env)
         # Set up *host-language*
         self.env.set("*host-language*", "Python3")
@@ -0,0 +1,255 @@
+import copy
+import gc
+import pickle
+import unittest
+
+import pymal
+import mal_types as mal
+import core
+import mal_env as menv
+from eval_assert import EvalAssert
+
+
+class TestList(unittest.TestCase, EvalAssert):
+    def setUp(self):
+        self.env = menv.MalEnv()
+        for sym in core.ns:
+            self.env.set(sym, core.ns[sym])
+
+    def test_cons_shares_structure(self):
+        lst = mal.List([2, 3])
+        a = lst.cons(1)
+        b = lst.cons(0)
+        self.assertEqual(a, [1, 2, 3])
+        self.assertEqual(b, [0, 2, 3])
+        self.assertEqual(lst, [2, 3])
+        self.assertIs(a.stack, lst.stack)
+        self.assertIsNot(b.stack, lst.stack)
+
+    def test_rest_shares_structure(self):
+        lst = mal.List([1, 2, 3])
+        self.assertEqual(lst.rest(), [2, 3])
+        self.assertIs(lst.rest().stack, lst.stack)
+        self.assertEqual(lst.rest().rest().rest(), [])
+        self.assertEqual(lst.rest().rest().rest().rest(), [])
+        self.assertEqual(lst.rest().cons(4), [4, 2, 3])
+        self.assertEqual(lst, [1, 2, 3])
+
+    def test_indexing(self):
+        lst = mal.List([1, 2, 3, 4])
+        self.assertEqual(lst[0], 1)
+        self.assertEqual(lst[-1], 4)
+        self.assertEqual(lst[1:], [2, 3, 4])
+        self.assertEqual(lst[1:-1], [2, 3])
+        self.assertEqual(lst[::2], [1, 3])
+        self.assertEqual(lst[3:1], [])
+        self.assertIs(type(lst[1:-1]), mal.List)
+        with self.assertRaises(IndexError):
+            lst[4]
+
+    def test_list_functions(self):
+        pymal.rep("(def! a '(2 3))", self.env)
+        pymal.rep("(def! b (cons 1 a))", self.env)
+        pymal.rep("(def! c (cons 0 a))", self.env)
+        self.assertEval('(list a b c)', self.env, '((2 3) (1 2 3) (0 2 3))')
+        self.assertEval('(conj a 4 5)', self.env, '(5 4 2 3)')
+        self.assertEval('(concat a b [4])', self.env, '(2 3 1 2 3 4)')
+        self.assertEval('(count (rest b))', self.env, '2')
+        self.assertEval('(nth b 2)', self.env, '3')
+        self.assertEval('(= (rest b) [2 3])', self.env, 'true')
+
+
+class TestSlots(unittest.TestCase):
+    def test_no_instance_dict(self):
+        for obj in [mal.List([1]), mal.Vector([1]), mal.Hash({1: 2}),
+                    mal.Symbol("a"), mal.Keyword("a"), mal.NIL,
+                    mal.Boolean(True), mal.Atom(1), mal.Builtin(abs),
+                    mal.Function()]:
+            self.assertFalse(hasattr(obj, '__dict__'), type(obj))
+
+    def test_metadata_only_when_set(self):
+        lst = mal.List([1, 2])
+        self.assertIs(lst.meta, mal.NIL)
+        self.assertFalse(hasattr(lst, 'metadata'))
+        lst.meta = 5
+        self.assertEqual(lst.meta, 5)
+        self.assertIs(lst.rest().meta, mal.NIL)
+        lst.meta = mal.NIL
+        self.assertFalse(hasattr(lst, 'metadata'))
+
+
+class TestBoolean(unittest.TestCase, EvalAssert):
+    def setUp(self):
+        self.env = menv.MalEnv()
+        for sym in core.ns:
+            self.env.set(sym, core.ns[sym])
+
+    def test_singletons(self):
+        self.assertIs(mal.Boolean(True), mal.TRUE)
+        self.assertIs(mal.Boolean(False), mal.FALSE)
+        self.assertIs(mal.Boolean(0), mal.TRUE)
+        self.assertIs(mal.Boolean(mal.NIL), mal.FALSE)
+        self.assertIs(pymal.READ('true'), mal.TRUE)
+        self.assertIs(pymal.EVAL(pymal.READ('(< 1 2)'), self.env), mal.TRUE)
+        self.assertIs(pymal.EVAL(pymal.READ('(= 1 2 3)'), self.env),
+                      mal.FALSE)
+        self.assertIs(pymal.EVAL(pymal.READ('(nil? 1)'), self.env),
+                      mal.FALSE)
+        self.assertIs(pickle.loads(pickle.dumps(mal.FALSE)), mal.FALSE)
+        self.assertIs(copy.copy(mal.TRUE), mal.TRUE)
+
+    def test_meta_on_booleans(self):
+        self.assertEval('(meta (with-meta true 1))', self.env, 'nil')
+        self.assertEval('(meta true)', self.env, 'nil')
+
+
+class CollidingKey():
+    """A key whose hash collides with all other CollidingKeys."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __eq__(self, other):
+        return type(other) is CollidingKey and self.name == other.name
+
+    def __hash__(self):
+        return 42
+
+
+class TestHash(unittest.TestCase, EvalAssert):
+    def setUp(self):
+        self.env = menv.MalEnv()
+        for sym in core.ns:
+            self.env.set(sym, core.ns[sym])
+
+    def check(self, hashmap, expected):
+        self.assertEqual(len(hashmap), len(expected))
+        self.assertEqual(dict(hashmap.items()), expected)
+        for key, value in expected.items():
+            self.assertIn(key, hashmap)
+            self.assertIs(hashmap[key], value)
+
+    def test_assoc_and_dissoc(self):
+        expected = {}
+        hashmap = mal.Hash()
+        versions = []
+        for i in range(2000):
+            key = "k{}".format(i % 1500)
+            expected[key] = i
+            hashmap = hashmap.assoc([(key, i)])
+            if i % 3 == 0:
+                key = "k{}".format(i // 2)
+                expected.pop(key, None)
+                hashmap = hashmap.dissoc([key])
+            if i % 500 == 0:
+                versions.append((hashmap, dict(expected)))
+        self.check(hashmap, expected)
+        for version, version_expected in versions:
+            self.check(version, version_expected)
+
+    def test_collisions(self):
+        keys = [CollidingKey(i) for i in range(5)]
+        hashmap = mal.Hash().assoc([(key, 1) for key in keys])
+        hashmap = hashmap.assoc([("x", 2), (keys[0], 3)])
+        self.check(hashmap, {keys[0]: 3, keys[1]: 1, keys[2]: 1, keys[3]: 1,
+                             keys[4]: 1, "x": 2})
+        smaller = hashmap.dissoc(keys[1:])
+        self.check(smaller, {keys[0]: 3, "x": 2})
+        self.check(smaller.dissoc([keys[0], "x"]), {})
+        self.assertEqual(len(hashmap), 6)
+
+    def test_hash_functions(self):
+        pymal.rep('(def! a {"x" 1 :y 2})', self.env)
+        pymal.rep('(def! b (assoc a "z" 3 "x" 4))', self.env)
+        self.assertEval('(list (get a "x") (get b "x") (get b "z"))',
+                        self.env, '(1 4 3)')
+        self.assertEval('(count (keys b))', self.env, '3')
+        self.assertEval('(= a (dissoc b "z" "x" "w") {"x" 1 :y 2})',
+                        self.env, 'false')
+        self.assertEval('(= (assoc (dissoc b "z") "x" 1) a)',
+                        self.env, 'true')
+        self.assertEval('(contains? (dissoc a :y) :y)', self.env, 'false')
+
+
+class TestVector(unittest.TestCase, EvalAssert):
+    def setUp(self):
+        self.env = menv.MalEnv()
+        for sym in core.ns:
+            self.env.set(sym, core.ns[sym])
+
+    def test_conj(self):
+        vector = mal.Vector()
+        versions = []
+        for i in range(40000):
+            vector = vector.conj([i])
+            if i % 1111 == 0:
+                versions.append(vector)
+        self.assertEqual(len(vector), 40000)
+        self.assertEqual(list(vector), list(range(40000)))
+        self.assertEqual(vector[32767], 32767)
+        self.assertEqual(vector[-1], 39999)
+        for version in versions:
+            self.assertEqual(list(version), list(range(len(version))))
+
+    def test_from_list(self):
+        for n in [0, 1, 32, 33, 1056, 1057, 33000]:
+            vector = mal.Vector(range(n))
+            self.assertEqual(list(vector), list(range(n)))
+            self.assertEqual([vector[i] for i in range(n)], list(range(n)))
+            self.assertEqual(list(vector.conj([n, n + 1])),
+                             list(range(n + 2)))
+
+    def test_shared_tail(self):
+        vector = mal.Vector([1, 2])
+        a = vector.conj([3])
+        b = vector.conj([4])
+        self.assertEqual(a, [1, 2, 3])
+        self.assertEqual(b, [1, 2, 4])
+        self.assertEqual(vector, [1, 2])
+        self.assertEqual(a.conj([5]), [1, 2, 3, 5])
+
+    def test_slices(self):
+        vector = mal.Vector(range(100))
+        self.assertEqual(vector[40:60], list(range(40, 60)))
+        self.assertEqual(vector[::10], list(range(0, 100, 10)))
+        self.assertIs(type(vector[1:]), mal.Vector)
+
+    def test_vector_functions(self):
+        pymal.rep('(def! v [1 2 3])', self.env)
+        self.assertEval('(conj v 4 5)', self.env, '[1 2 3 4 5]')
+        self.assertEval('(list (conj v 4) (conj v 6) v)',
+                        self.env, '([1 2 3 4] [1 2 3 6] [1 2 3])')
+        self.assertEval('(nth (conj v 4) 3)', self.env, '4')
+        self.assertEval('(rest v)', self.env, '(2 3)')
+        self.assertEval('(= v (list 1 2 3))', self.env, 'true')
+
+
+class TestSymbol(unittest.TestCase, EvalAssert):
+    def setUp(self):
+        self.env = menv.MalEnv()
+        for sym in core.ns:
+            self.env.set(sym, core.ns[sym])
+
+    def test_interned(self):
+        self.assertIs(mal.Symbol("abc"), mal.Symbol("abc"))
+        self.assertIs(pymal.READ("abc"), mal.Symbol("abc"))
+        self.assertIs(mal.Keyword("k"), mal.Keyword(":k"))
+        self.assertIs(pymal.READ(":k"), mal.Keyword("k"))
+        self.assertEqual(hash(mal.Symbol("abc")), hash("abc"))
+
+    def test_unused_not_interned(self):
+        pymal.rep('(count (map (fn* [i] (symbol (str "unused-" i)))'
+                  '  (range 1000)))', self.env)
+        pymal.rep('(count (map (fn* [i] (keyword (str "unused-" i)))'
+                  '  (range 1000)))', self.env)
+        gc.collect()
+        self.assertNotIn("unused-1", mal.Symbol.interned)
+        self.assertNotIn(":unused-1", mal.Keyword.interned)
+
+    def test_meta_not_interned(self):
+        pymal.rep('(def! s (with-meta (quote abc) {"a" 1}))', self.env)
+        self.assertEval('(meta (quote abc))', self.env, 'nil')
+        self.assertEval('(meta s)', self.env, '{"a" 1}')
+        self.assertEval('(= s (quote abc))', self.env, 'true')
+        self.assertEval('(meta (with-meta :k 1))', self.env, '1')
+        self.assertEval('(meta :k)', self.env, 'nil')
@@ -0,0 +1,105 @@
+"""Persistent vector trie.
+
+This is the data structure behind mal_types.Vector. All elements but the
+last few are stored in the leaves of a trie of Python lists with 32 items
+each; the last 1 to 32 elements are kept in a separate list, the tail.
+Element I is found by using five bits of I per level, starting with the
+highest level at SHIFT. Adding an element usually only touches the tail; a
+full tail is pushed into the trie as a new leaf, copying only the nodes on
+the path to it.
+
+A vector is described by its COUNT, SHIFT, ROOT and TAIL. The nodes of a trie
+are never modified once built. A tail may be shared by several vectors and
+grows at its end, so a vector uses only the first COUNT - tail_offset(COUNT)
+items of its tail.
+
+"""
+import itertools
+
+BITS = 5
+WIDTH = 1 << BITS
+MASK = WIDTH - 1
+
+
+def tail_offset(count):
+    """Return the index of the first element in the tail."""
+    if count < WIDTH:
+        return 0
+    return ((count - 1) >> BITS) << BITS
+
+
+def from_list(items):
+    """Return (count, shift, root, tail) of a vector holding ITEMS."""
+    count = len(items)
+    offset = tail_offset(count)
+    nodes = [items[i:i + WIDTH] for i in range(0, offset, WIDTH)]
+    shift = BITS
+    while len(nodes) > WIDTH:
+        nodes = [nodes[i:i + WIDTH] for i in range(0, len(nodes), WIDTH)]
+        shift += BITS
+    return count, shift, nodes, items[offset:]
+
+
+def nth(count, shift, root, tail, index):
+    """Return element INDEX, which must be in range."""
+    offset = tail_offset(count)
+    if index >= offset:
+        return tail[index - offset]
+    node = root
+    level = shift
+    while level > 0:
+        node = node[(index >> level) & MASK]
+        level -= BITS
+    return node[index & MASK]
+
+
+def push_tail(count, shift, root, tail):
+    """Add TAIL, a full tail, to the trie as a new leaf.
+
+    COUNT is the number of elements including those in TAIL. Return the new
+    root and shift.
+
+    """
+    if (count >> BITS) > (1 << shift):  # the root is full
+        return [root, new_path(shift, tail)], shift + BITS
+    return push_leaf(count, shift, root, tail), shift
+
+
+def push_leaf(count, level, parent, tail):
+    subidx = ((count - 1) >> level) & MASK
+    node = parent[:]
+    if level == BITS:
+        child = tail
+    elif subidx < len(parent):
+        child = push_leaf(count, level - BITS, parent[subidx], tail)
+    else:
+        child = new_path(level - BITS, tail)
+    if subidx < len(node):
+        node[subidx] = child
+    else:
+        node.append(child)
+    return node
+
+
+def new_path(level, leaf):
+    """Return a node at LEVEL holding only LEAF, at the bottom of its path."""
+    node = leaf
+    while level > 0:
+        node = [node]
+        level -= BITS
+    return node
+
+
+def leaves(node, level):
+    """Iterate over the leaves below NODE at LEVEL."""
+    if level == BITS:
+        return iter(node)
+    return itertools.chain.from_iterable(leaves(child, level - BITS)
+                                         for child in node)
+
+
+def elements(count, shift, root, tail):
+    """Iterate over the elements of a vector."""
+    offset = tail_offset(count)
+    return itertools.chain(itertools.chain.from_iterable(leaves(root, shift)),
+                           tail[:count - offset])